@@ -16,11 +16,14 @@
         'security/ir.model.access.csv',
         'data/window_calculation_formula_data.xml',
         'data/material_config_data.xml',
+        'data/ir_cron_data.xml',
         'views/window_calculation_formula_views.xml',
         'views/assets.xml',
         'views/action_views.xml',
         'views/production_views.xml',
         'views/menu_views.xml',
+        'views/invoice_assign_wizard_views.xml',
+        'views/combined_export_views.xml',
         'views/cutting_list_report_view.xml',
         'views/material_config_views.xml',
     ],
@@ -32,10 +35,68 @@
         'web.assets_backend': [
             'rich_production/static/src/js/rich_production_calendar.js',
             'rich_production/static/src/js/window_calculations/xo_ox_window.js',
+            'rich_production/static/src/js/style_registry.js',
+            'rich_production/static/src/js/calculation_worker_pool.js',
             'rich_production/static/src/js/cutting_list_preview.js',
+            'rich_production/static/src/js/artifact_wait.js',
             'rich_production/static/src/xml/cutting_list_preview.xml',
             'rich_production/static/src/css/rich_production.css'
         ],
+        # 样式计算器按需加载 (style_registry.js)，不进入 web.assets_backend
+        'rich_production.window_calculator_common': [
+            'rich_production/static/src/js/window_calculations/abstract_window.js',
+        ],
+        'rich_production.window_calculator_xox_window': [
+            'rich_production/static/src/js/window_calculations/xox_window.js',
+        ],
+        'rich_production.window_calculator_picture_window': [
+            'rich_production/static/src/js/window_calculations/picture_window.js',
+        ],
+        'rich_production.window_calculator_sh_window': [
+            'rich_production/static/src/js/window_calculations/sh_window.js',
+        ],
+        'rich_production.window_calculator_sh_p_window': [
+            'rich_production/static/src/js/window_calculations/sh_p_window.js',
+        ],
+        'rich_production.window_calculator_h_pp_window': [
+            'rich_production/static/src/js/window_calculations/h_pp_window.js',
+        ],
+        'rich_production.window_calculator_h_ppp_windows': [
+            'rich_production/static/src/js/window_calculations/h_ppp_windows.js',
+        ],
+        'rich_production.window_calculator_v_pp_window': [
+            'rich_production/static/src/js/window_calculations/v_pp_window.js',
+        ],
+        'rich_production.window_calculator_p_xo_ox_window': [
+            'rich_production/static/src/js/window_calculations/p_xo_ox_window.js',
+        ],
+        'rich_production.window_calculator_xo_p_ox_p_window': [
+            'rich_production/static/src/js/window_calculations/xo_p_ox_p_window.js',
+        ],
+        'rich_production.window_calculator_p_pp_window': [
+            'rich_production/static/src/js/window_calculations/p_pp_window.js',
+        ],
+        'rich_production.window_calculator_pp_xo_ox_window': [
+            'rich_production/static/src/js/window_calculations/pp_xo_ox_window.js',
+        ],
+        'rich_production.window_calculator_pp_xox_window': [
+            'rich_production/static/src/js/window_calculations/pp_xox_window.js',
+        ],
+        'rich_production.window_calculator_ppp_xox_window': [
+            'rich_production/static/src/js/window_calculations/ppp_xox_window.js',
+        ],
+        'rich_production.window_calculator_xox_pp_window': [
+            'rich_production/static/src/js/window_calculations/xox_pp_window.js',
+        ],
+        'rich_production.window_calculator_xox_ppp_window': [
+            'rich_production/static/src/js/window_calculations/xox_ppp_window.js',
+        ],
+        'rich_production.window_calculator_xo_pp_window': [
+            'rich_production/static/src/js/window_calculations/xo_pp_window.js',
+        ],
+        'rich_production.window_calculator_xo_pp_ox_pp_window': [
+            'rich_production/static/src/js/window_calculations/xo_pp_ox_pp_window.js',
+        ],
     },
 }
 
@@ -8,6 +8,11 @@ import logging
 from datetime import datetime
 import json
 
+from ..reports.cutting_list_report import DECA_SOURCES
+from ..reports.deca_writer import DECA_FORMATS
+from ..reports.label_engine import DEFAULT_ZPL_TEMPLATE, compile_zpl, iter_labels, iter_zpl, render_labels_pdf
+from ..reports.table_export import TABLE_EXPORTS, iter_table_csv
+
 class RichProduction(http.Controller):
     
     @http.route('/rich_production/cutting_list_preview/<int:report_id>', type='http', auth='user')
@@ -104,6 +109,34 @@ class RichProduction(http.Controller):
             'report': report,
         })
     
+    def _not_modified(self, etag):
+        """客户端的缓存仍然有效"""
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    def _stream_attachment(self, attachment, filename, etag=None):
+        """以文件流的方式返回附件，带ETag时客户端可以用 If-None-Match 重新验证"""
+        stream = request.env['ir.binary']._get_stream_from(attachment.sudo(), filename=filename)
+        response = stream.get_response(as_attachment=True)
+        if etag:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+        else:
+            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        return response
+    
+    def _serve_report(self, report, kind, filename=None):
+        """从报表缓存返回文件，内容未变化时返回304"""
+        cache = request.env['rich_production.report.cache'].sudo()
+        fingerprint = cache._get_fingerprint(report.production_id)
+        etag = cache._get_etag(report.production_id, kind, fingerprint)
+        if request.httprequest.if_none_match.contains(etag):
+            return self._not_modified(etag)
+        attachment = report._get_report_attachment(kind, fingerprint=fingerprint)
+        return self._stream_attachment(attachment, filename or attachment.name, etag)
+    
     @http.route('/rich_production/download_excel/<int:report_id>', type='http', auth='user', methods=['GET', 'POST'])
     def download_excel(self, report_id, **kw):
         """下载Excel文件"""
@@ -114,9 +147,9 @@ class RichProduction(http.Controller):
             # 先尝试获取报表记录
             report = request.env['rich_production.cutting.list.report'].sudo().browse(report_id)
             
-            # 如果找不到报表或报表文件为空，可能是报表ID实际上是生产ID
-            if not report.exists() or not report.report_file:
-                _logger.info(f"报表 {report_id} 不存在或为空，尝试获取生产记录")
+            # 如果找不到报表，可能是报表ID实际上是生产ID
+            if not report.exists():
+                _logger.info(f"报表 {report_id} 不存在，尝试获取生产记录")
                 # 尝试通过生产ID查找或创建报表
                 production = request.env['rich_production.production'].sudo().browse(report_id)
                 if production.exists():
@@ -130,41 +163,12 @@ class RichProduction(http.Controller):
                         report = request.env['rich_production.cutting.list.report'].sudo().create({
                             'production_id': production.id
                         })
-                    
-                    # 确保报表已生成
-                    if report.state != 'done' or not report.report_file:
-                        _logger.info(f"生成报表 (ID: {report.id})")
-                        report.sudo().generate_report()
                 else:
                     _logger.warning(f"找不到生产记录 ID: {report_id}")
                     return request.not_found()
                     
-            # 重新检查报表文件是否存在
-            if not report.report_file:
-                _logger.error(f"报表文件生成失败 (ID: {report.id})")
-                return Response(
-                    "报表文件生成失败，请重试", 
-                    status=500,
-                    headers=[('Content-Type', 'text/plain')]
-                )
-                
-            # 解码Excel文件内容
-            file_content = base64.b64decode(report.report_file)
-            filename = report.report_filename or f'cutting_list_{report_id}.xlsx'
-            _logger.info(f"成功获取Excel文件，大小: {len(file_content)} 字节, 文件名: {filename}")
-            
-            # 设置下载响应头
-            headers = [
-                ('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
-                ('Content-Disposition', f'attachment; filename="{filename}"'),
-                ('Content-Length', str(len(file_content))),
-                ('Cache-Control', 'no-cache, no-store, must-revalidate'),
-                ('Pragma', 'no-cache'),
-                ('Expires', '0'),
-            ]
-            
-            # 返回文件下载响应
-            return request.make_response(file_content, headers=headers)
+            # 从报表缓存流式返回，不读入内存
+            return self._serve_report(report, 'xlsx')
         except Exception as e:
             _logger.exception(f"下载Excel文件时出错: {str(e)}")
             return Response(
@@ -175,7 +179,7 @@ class RichProduction(http.Controller):
     
     @http.route('/rich_production/download_sheet/<int:report_id>/<string:sheet_name>', type='http', auth='user')
     def download_sheet(self, report_id, sheet_name, **kw):
-        """下载单个工作表的Excel文件"""
+        """下载单个工作表的Excel文件，sheet_name为all时下载所有工作表的zip包"""
         _logger = logging.getLogger(__name__)
         _logger.info(f"下载单个工作表请求，报表ID: {report_id}, 工作表: {sheet_name}")
         
@@ -187,30 +191,10 @@ class RichProduction(http.Controller):
                 _logger.warning(f"报表 {report_id} 不存在")
                 return request.not_found()
             
+            if sheet_name == 'all':
+                return self._serve_report(report.sudo(), 'zip')
             # 生成单个工作表报表
-            result = report.sudo().generate_single_sheet_report(sheet_name)
-            
-            if not result or not result.get('file_content'):
-                raise Exception(f"生成工作表 {sheet_name} 失败")
-            
-            # 解码Excel文件内容
-            file_content = base64.b64decode(result['file_content'])
-            filename = result['filename']
-            
-            _logger.info(f"成功生成工作表 {sheet_name}，大小: {len(file_content)} 字节, 文件名: {filename}")
-            
-            # 设置下载响应头
-            headers = [
-                ('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
-                ('Content-Disposition', f'attachment; filename="{filename}"'),
-                ('Content-Length', str(len(file_content))),
-                ('Cache-Control', 'no-cache, no-store, must-revalidate'),
-                ('Pragma', 'no-cache'),
-                ('Expires', '0'),
-            ]
-            
-            # 返回文件下载响应
-            return request.make_response(file_content, headers=headers)
+            return self._serve_report(report.sudo(), f'sheet:{sheet_name}')
         except Exception as e:
             _logger.exception(f"下载工作表 {sheet_name} 时出错: {str(e)}")
             return Response(
@@ -219,6 +203,121 @@ class RichProduction(http.Controller):
                 headers=[('Content-Type', 'text/plain')]
             )
     
+    @http.route('/rich_production/download_deca/<int:report_id>', type='http', auth='user')
+    def download_deca(self, report_id, fmt='deca_csv', source='stored', checksum=None, **kw):
+        """下载锯床(DECA)导入文件
+
+        响应头 X-Checksum-SHA256 带文件的sha256，checksum=1 时只返回 sha256sum 格式的校验行，
+        操作员可以在锯床电脑上核对传输是否完整
+        """
+        _logger = logging.getLogger(__name__)
+        report = request.env['rich_production.cutting.list.report'].sudo().browse(report_id)
+        if not report.exists() or fmt not in DECA_FORMATS or source not in DECA_SOURCES:
+            return request.not_found()
+        
+        kind = f'deca:{fmt}:{source}'
+        try:
+            cache = request.env['rich_production.report.cache'].sudo()
+            fingerprint = cache._get_fingerprint(report.production_id)
+            etag = cache._get_etag(report.production_id, kind, fingerprint)
+            if not checksum and request.httprequest.if_none_match.contains(etag):
+                return self._not_modified(etag)
+            attachment = report._get_report_attachment(kind, fingerprint=fingerprint)
+            if checksum:
+                return Response(f"{attachment.description}  {attachment.name}\n",
+                                headers=[('Content-Type', 'text/plain; charset=utf-8')])
+            response = self._stream_attachment(attachment, attachment.name, etag)
+            response.headers['X-Checksum-SHA256'] = attachment.description or ''
+            return response
+        except Exception as e:
+            _logger.exception(f"生成DECA文件时出错: {str(e)}")
+            return Response(
+                f"生成DECA文件时出错: {str(e)}", 
+                status=500,
+                headers=[('Content-Type', 'text/plain')]
+            )
+    
+    @http.route('/rich_production/export_csv/<int:production_id>/<string:table>', type='http', auth='user')
+    def export_table_csv(self, production_id, table, **kw):
+        """从已保存的计算数据导出下料单数据表CSV
+
+        table 为 frame、sash、screen、parts、glass 或 grid。
+        数据用服务端游标逐批读取，分块传输，不依赖浏览器中的预览计算结果。
+        """
+        production = request.env['rich_production.production'].browse(production_id)
+        if table not in TABLE_EXPORTS or not production.exists():
+            return request.not_found()
+        production.check_access('read')
+        
+        registry = request.env.registry
+        
+        def generate():
+            # 响应内容在请求的游标关闭后才读取，需要单独打开游标
+            with registry.cursor() as cr:
+                yield from iter_table_csv(cr, table, [production_id])
+        
+        filename = f"{TABLE_EXPORTS[table].title}_{production.batch_number or production.id}.csv"
+        return Response(
+            generate(),
+            headers=[
+                ('Content-Type', 'text/csv; charset=utf-8'),
+                ('Content-Disposition', content_disposition(filename)),
+                ('Cache-Control', 'no-cache'),
+            ],
+            direct_passthrough=True,
+        )
+    
+    @http.route('/rich_production/print_labels', type='http', auth='user')
+    def print_labels(self, ids='', fmt='pdf', **kw):
+        """批量打印订单的窗户标签
+
+        fmt=zpl 时逐块输出ZPL，直接发送到热敏打印机；fmt=pdf 时生成A4多联标签。
+        条码与DECA文件的 barcodeNo 相同。
+        """
+        _logger = logging.getLogger(__name__)
+        try:
+            production_ids = [int(pid) for pid in ids.split(',') if pid]
+        except ValueError:
+            return request.not_found()
+        productions = request.env['rich_production.production'].browse(production_ids).exists()
+        if not productions or fmt not in ('zpl', 'pdf'):
+            return request.not_found()
+        productions.check_access('read')
+        
+        barcodes = request.env['rich_production.cutting.list.report'].sudo()._get_label_barcodes(productions)
+        name = (productions.batch_number or productions.id) if len(productions) == 1 else 'batch'
+        
+        if fmt == 'pdf':
+            request.env.flush_all()
+            content, count = render_labels_pdf(iter_labels(request.env.cr, productions.ids, barcodes))
+            _logger.info(f"打印标签: 订单={len(productions)}, 标签={count}")
+            return request.make_response(content, headers=[
+                ('Content-Type', 'application/pdf'),
+                ('Content-Length', len(content)),
+                ('Content-Disposition', content_disposition(f"Labels_{name}.pdf")),
+            ])
+        
+        template = request.env['ir.config_parameter'].sudo().get_param(
+            'rich_production.label_zpl_template') or DEFAULT_ZPL_TEMPLATE
+        # 模板在开始输出前编译，模板有错误时不会返回半个文件
+        compile_zpl(template)
+        registry = request.env.registry
+        
+        def generate():
+            # 响应内容在请求的游标关闭后才读取，需要单独打开游标
+            with registry.cursor() as cr:
+                yield from iter_zpl(iter_labels(cr, productions.ids, barcodes), template)
+        
+        return Response(
+            generate(),
+            headers=[
+                ('Content-Type', 'application/vnd.zebra.zpl; charset=utf-8'),
+                ('Content-Disposition', content_disposition(f"Labels_{name}.zpl")),
+                ('Cache-Control', 'no-cache'),
+            ],
+            direct_passthrough=True,
+        )
+    
     @http.route('/rich_production/print_pdf/<int:report_id>', type='http', auth='user', methods=['GET', 'POST'])
     def print_pdf(self, report_id, **kw):
         """打印PDF版本"""
@@ -257,32 +356,9 @@ class RichProduction(http.Controller):
             production = report.production_id
             _logger.info(f"开始生成PDF，生产记录: {production.name or '无名称'}, ID: {production.id}")
             
-            try:
-                # 直接根据报表中的数据生成PDF
-                pdf_content = self._generate_pdf_from_production(production)
-                filename = f'Cutting_List_{production.batch_number or production.id}.pdf'
-                _logger.info(f"成功生成PDF，大小: {len(pdf_content)} 字节，文件名: {filename}")
-                
-                # 设置PDF下载响应头
-                pdf_http_headers = [
-                    ('Content-Type', 'application/pdf'),
-                    ('Content-Disposition', f'attachment; filename="{filename}"'),
-                    ('Content-Length', str(len(pdf_content))),
-                    ('Cache-Control', 'no-cache, no-store, must-revalidate'),
-                    ('Pragma', 'no-cache'),
-                    ('Expires', '0'),
-                ]
-                
-                return request.make_response(pdf_content, headers=pdf_http_headers)
-            except Exception as e:
-                # 记录错误并返回错误响应
-                _logger.exception(f"生成PDF时出错: {str(e)}")
-                
-                return Response(
-                    f"生成PDF失败: {str(e)}", 
-                    status=500,
-                    headers=[('Content-Type', 'text/plain')]
-                )
+            # 内容未变化时直接返回缓存的PDF
+            kind = 'pdf:grouped' if kw.get('grouped') in ('1', 'true') else 'pdf'
+            return self._serve_report(report, kind, f'Cutting_List_{production.batch_number or production.id}.pdf')
         except Exception as e:
             _logger.exception(f"处理PDF请求时出错: {str(e)}")
             return Response(
@@ -291,177 +367,6 @@ class RichProduction(http.Controller):
                 headers=[('Content-Type', 'text/plain')]
             )
             
-    def _generate_pdf_from_production(self, production):
-        """从生产记录生成PDF内容"""
-        _logger = logging.getLogger(__name__)
-        
-        try:
-            # 首先尝试使用Odoo的QWeb报表引擎
-            if hasattr(request.env, 'ref') and request.env.ref('rich_production.action_cutting_list_pdf_report', False):
-                _logger.info("使用Odoo QWeb引擎生成PDF")
-                pdf_content, _ = request.env.ref('rich_production.action_cutting_list_pdf_report').sudo()._render_qweb_pdf([production.id])
-                return pdf_content
-        except Exception as e:
-            _logger.warning(f"使用QWeb生成PDF失败，尝试使用ReportLab: {str(e)}")
-            # 如果QWeb失败，继续使用ReportLab
-            
-        # 使用ReportLab手动生成PDF
-        _logger.info("使用ReportLab生成PDF")
-        try:
-            import io
-            from reportlab.lib.pagesizes import letter, A4
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib import colors
-            from reportlab.lib.units import inch, cm
-            
-            # 创建PDF文档 - 使用A4尺寸
-            buffer = io.BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                                  leftMargin=1*cm, rightMargin=1*cm,
-                                  topMargin=1*cm, bottomMargin=1*cm)
-            elements = []
-            
-            # 创建样式
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'TitleStyle',
-                parent=styles['Title'],
-                fontSize=16,
-                alignment=1,  # 居中
-                spaceAfter=12
-            )
-            
-            # 添加标题
-            elements.append(Paragraph(f"Cutting List - {production.batch_number or ''}", title_style))
-            elements.append(Spacer(1, 0.5*cm))
-            
-            # 获取产品行数据
-            data = [['Customer', 'ID', 'Style', 'W', 'H', 'FH', 'Frame', 'Glass', 'Argon', 'Grid', 'Color', 'Note', 'ID']]
-            
-            item_id = 1
-            for line in production.product_line_ids:
-                # 尝试使用不同的字段名获取产品数量
-                quantity = 1  # 默认为1
-                
-                # 首先尝试quantity字段
-                if hasattr(line, 'quantity') and line.quantity:
-                    try:
-                        quantity = int(float(line.quantity))
-                    except (ValueError, TypeError):
-                        _logger.warning(f"无法转换数量值: {line.quantity}")
-                
-                # 然后尝试product_qty字段
-                elif hasattr(line, 'product_qty') and line.product_qty:
-                    try:
-                        quantity = int(float(line.product_qty))
-                    except (ValueError, TypeError):
-                        _logger.warning(f"无法转换数量值: {line.product_qty}")
-                
-                # 确保最小数量为1
-                quantity = max(1, quantity)
-                _logger.info(f"产品行 {line.id} 数量: {quantity}")
-                
-                # 提取产品类型
-                product_name = line.product_id.name if line.product_id else ''
-                style = ''
-                
-                # 尝试从产品名称中提取风格类型
-                if 'XOX' in product_name:
-                    style = 'XOX'
-                elif 'XO' in product_name:
-                    style = 'XO'
-                elif 'OX' in product_name:
-                    style = 'OX'
-                elif 'Picture' in product_name:
-                    style = 'P'
-                elif 'Casement' in product_name:
-                    style = 'C'
-                else:
-                    style = product_name
-                
-                # 获取客户名
-                customer = line.invoice_id.partner_id.name if line.invoice_id and line.invoice_id.partner_id else ''
-                # 如果客户名称太长，截取前10个字符加编号
-                if customer and len(customer) > 10:
-                    customer_code = customer[:8] + str(line.invoice_id.id % 100000)
-                else:
-                    customer_code = customer
-                
-                # 为每个数量创建一行
-                for i in range(quantity):
-                    # 添加行数据
-                    row = [
-                        customer_code,
-                        item_id,  # ID
-                        style,
-                        line.width or '',
-                        line.height or '',
-                        '',  # FH
-                        line.frame or '',
-                        line.glass or '',
-                        'Yes' if line.argon else '',
-                        line.grid or '',
-                        line.color or '',
-                        line.notes or '',
-                        item_id,  # ID again
-                    ]
-                    data.append(row)
-                    item_id += 1
-            
-            # 创建表格
-            if len(data) == 1:  # 只有标题行
-                data.append(['No data'] + [''] * 12)  # 添加一个空行
-                
-            # 设置列宽
-            col_widths = [2*cm, 0.8*cm, 1*cm, 1*cm, 1*cm, 0.8*cm, 1.5*cm, 1.5*cm, 1*cm, 1*cm, 1*cm, 2*cm, 0.8*cm]
-            table = Table(data, colWidths=col_widths)
-            
-            # 设置表格样式
-            style = TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ])
-            table.setStyle(style)
-            
-            # 添加表格到文档
-            elements.append(table)
-            
-            # 构建PDF
-            doc.build(elements)
-            
-            # 获取生成的PDF内容
-            pdf_content = buffer.getvalue()
-            buffer.close()
-            
-            _logger.info(f"ReportLab成功生成PDF，大小: {len(pdf_content)} 字节")
-            return pdf_content
-            
-        except Exception as e:
-            _logger.exception(f"使用ReportLab生成PDF时出错: {str(e)}")
-            # 如果ReportLab也失败，创建一个简单的错误PDF
-            try:
-                from reportlab.pdfgen import canvas
-                buffer = io.BytesIO()
-                c = canvas.Canvas(buffer)
-                c.drawString(100, 750, f"Error generating PDF: {str(e)}")
-                c.showPage()
-                c.save()
-                return buffer.getvalue()
-            except:
-                # 最后的后备方案 - 返回一个空PDF（至少可以下载）
-                return b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj 2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj 3 0 obj<</Type/Page/MediaBox[0 0 595 842]/Resources<<>>/Parent 2 0 R>>endobj\ntrailer<</Size 4/Root 1 0 R>>\n%%EOF"
-    
     @http.route('/rich_production/cutting_list_preview_embed/<int:production_id>', type='http', auth='user')
     def cutting_list_preview_embed(self, production_id, **kw):
         """用于嵌入式显示的下料单预览"""
@@ -32,6 +32,17 @@ class RichProductionController(http.Controller):
             
         return result 
 
+    @http.route('/rich_production/calendar/feed', type='json', auth='user')
+    def calendar_feed(self, start, end):
+        """日历可见范围内的批次，紧凑的列/行格式"""
+        return request.env['rich_production.production'].get_calendar_feed(start, end)
+
+    @http.route('/rich_production/calendar/heatmap', type='json', auth='user')
+    def calendar_heatmap(self, start, end):
+        """日历可见范围内每天的数量和容量"""
+        return request.env['rich_production.production'].get_capacity_heatmap(start, end)
+
+
 class MaterialConfigController(http.Controller):
     
     @http.route('/api/material/length', type='http', auth='user', methods=['GET'], csrf=False)
@@ -7,7 +7,13 @@ from . import res_lang
 from . import models
 from . import account_move
 from . import production
+from . import production_line_change
+from . import invoice_assign_wizard
+from . import production_scheduler
+from . import report_cache
 from . import window_calculation_formula
+from . import window_calculation_memo
+from . import window_calculation_engine
 from . import window_data
 from . import cutting_list_report
 from . import material_config
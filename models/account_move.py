@@ -1,6 +1,48 @@
-from odoo import models, fields
+from odoo import models, fields, api
 
 class AccountMove(models.Model):
     _inherit = 'account.move'
     
-    production_id = fields.Many2one('rich_production.production', string='Production') 
\ No newline at end of file
+    production_id = fields.Many2one('rich_production.production', string='Production')
+
+    def _get_production_due_date(self):
+        """排产用的交付日期，没有时使用到期日或发票日期"""
+        self.ensure_one()
+        delivery_date = self['delivery_date'] if 'delivery_date' in self._fields else False
+        return delivery_date or self.invoice_date_due or self.invoice_date
+
+
+class AccountMoveLine(models.Model):
+    _inherit = 'account.move.line'
+
+    # 除映射字段外，影响产品行的发票行字段
+    PRODUCTION_SYNC_FIELDS = {'product_id', 'quantity', 'product_uom_id', 'display_type', 'move_id'}
+
+    def _get_production_sync_fields(self):
+        line_plan, product_plan = self.env['rich_production.production']._get_invoice_field_plan()
+        return self.PRODUCTION_SYNC_FIELDS.union(*(names for target, names in line_plan))
+
+    def _register_production_changes(self, deleted=False):
+        keys = [(line.move_id.id, line.id) for line in self if line.move_id]
+        if keys:
+            self.env['rich_production.line.change'].sudo()._register_changes(keys, deleted=deleted)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines._register_production_changes()
+        return lines
+
+    def write(self, vals):
+        if not self._get_production_sync_fields().intersection(vals):
+            return super().write(vals)
+        # 移到其他发票时旧发票的键也要登记
+        if 'move_id' in vals:
+            self._register_production_changes()
+        result = super().write(vals)
+        self._register_production_changes()
+        return result
+
+    def unlink(self):
+        self._register_production_changes(deleted=True)
+        return super().unlink()
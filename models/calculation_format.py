@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""计算结果格式化，对应 cutting_list_preview.js 的 format*Data
+
+服务端计算的结果按预览相同的格式整理后，经过与 save_calculation 相同的保存方法写入明细表
+"""
+
+import re
+
+FRAME_MATERIALS = {'82-02': '82-02B', '82-02B': '82-02B', '82-10': '82-10', '82-01': '82-01'}
+SASH_MATERIALS = dict(FRAME_MATERIALS, **{'82-03': '82-03', '82-04': '82-04', '82-05': '82-05'})
+
+
+def _columns(window, batch, calculations, materials, pieces):
+    """按材料和位置把片段填入表格列，对应 formatFrameData/formatSashData"""
+    table = {
+        'batch': batch,
+        'style': window.get('style') or '',
+        'id': window.get('id'),
+        'color': window.get('color') or '',
+        'frameType': calculations.get('frameType') or window.get('frame') or '',
+    }
+    for material in dict.fromkeys(materials.values()):
+        table.update({f'{material}--': '', f'{material}Pcs': '', f'{material}|': '', f'{material}|Pcs': ''})
+    for item in pieces:
+        material, position, length = item.get('material'), item.get('position'), item.get('length')
+        if not material or not position or not length:
+            continue
+        mapped = materials.get(material, material)
+        if position == '|':
+            length_column, qty_column = f'{mapped}|', f'{mapped}|Pcs'
+        else:
+            length_column, qty_column = f'{mapped}--', f'{mapped}Pcs'
+        if length_column in table:
+            table[length_column] = length
+            table[qty_column] = item.get('qty')
+    return table
+
+
+def format_frame(window, batch, calculations):
+    frames = calculations.get('frame') or []
+    return _columns(window, batch, calculations, FRAME_MATERIALS, frames) if frames else None
+
+
+def format_sash(window, batch, calculations):
+    sashes = calculations.get('sash') or []
+    return _columns(window, batch, calculations, SASH_MATERIALS, sashes) if sashes else None
+
+
+def format_screen(window, calculations):
+    screenw = screenh = ''
+    screenw_pcs = screenh_pcs = 0
+    for item in calculations.get('screen') or []:
+        if item.get('material') == 'screenw' and item.get('position') == '--':
+            screenw, screenw_pcs = item.get('length'), item.get('qty')
+        if item.get('material') == 'screenh' and item.get('position') == '|':
+            screenh, screenh_pcs = item.get('length'), item.get('qty')
+    if not screenw and not screenh:
+        return None
+    return {
+        'id': window.get('id'),
+        'lineId': window.get('id'),
+        'customer': window.get('customer') or '',
+        'style': window.get('style') or '',
+        # _save_screen_data 读取 screenW/screenWPcs
+        'screenW': screenw,
+        'screenWPcs': screenw_pcs,
+        'screenH': screenh,
+        'screenHPcs': screenh_pcs,
+        'color': window.get('color') or '',
+    }
+
+
+def format_parts(window, batch, calculations):
+    parts = {
+        'id': window.get('id'),
+        'lineId': window.get('id'),
+        'batch': batch,
+        'style': window.get('style') or '',
+        'frameType': calculations.get('frameType') or '',
+        'color': window.get('color') or '',
+        'mullion': '', 'centerAlu': '', 'handleAlu': '', 'handlePcs': '', 'track': '',
+        'coverH': '', 'coverV': '', 'largeMullion': '', 'largeMullionPcs': '',
+        'largeMullion2': '', 'largeMullion2Pcs': '', 'slop': '',
+    }
+    for part in calculations.get('parts') or []:
+        material, position, length = part.get('material'), part.get('position'), part.get('length')
+        if material == 'mullion' and position == '|':
+            parts['mullion'] = length
+        elif material == 'mullion aluminum' and position == '|':
+            parts['centerAlu'] = length
+        elif material == 'handle aluminum' and position == '|':
+            parts['handleAlu'] = length
+            parts['handlePcs'] = part.get('qty') or 1
+        elif material == 'track' and position == '--':
+            parts['track'] = length
+        elif material == 'big mullion':
+            parts['largeMullion'] = length
+            parts['largeMullionPcs'] = part.get('qty') or 1
+        elif material == 'big mullion2':
+            parts['largeMullion2'] = length
+            parts['largeMullion2Pcs'] = part.get('qty') or 1
+        elif material == 'cover' and position == '--':
+            parts['coverH'] = length
+        elif material == 'cover' and position == '|':
+            parts['coverV'] = length
+        elif material == 'slop':
+            parts['slop'] = length
+    keys = ('mullion', 'centerAlu', 'handleAlu', 'track', 'coverH', 'coverV', 'largeMullion', 'largeMullion2', 'slop')
+    return parts if any(parts[key] for key in keys) else None
+
+
+def format_glass(window, calculations):
+    if not window.get('width') or not window.get('height'):
+        return []
+    # _save_glass_data 读取 line/qty/glassType/tempered/thickness/width/height
+    return [{
+        'line': glass.get('line') or '',
+        'qty': glass.get('qty') or 1,
+        'quantity': glass.get('qty') or 1,
+        'glassType': glass.get('glassType') or window.get('glass') or '',
+        'tempered': glass.get('Tmprd') or '',
+        'thickness': glass.get('Thickness') or '3',
+        'width': glass.get('width') or '',
+        'height': glass.get('height') or '',
+    } for glass in calculations.get('glassList') or []]
+
+
+def format_grid(window, batch, calculations):
+    grid = window.get('grid') or ''
+    if not grid or grid.lower() in ('no', 'none') or not calculations.get('gridList'):
+        return None
+    data = calculations['gridList'][0] or {}
+
+    # _save_grid_data 读取 gridW1/gridW1Pcs/gridW1Cut 等，有格条时记为一刀，与预览相同
+    return {
+        'batch': batch,
+        'style': window.get('style') or '',
+        'id': window.get('id'),
+        'lineId': window.get('id'),
+        'color': window.get('color') or '',
+        'note': window.get('note') or '',
+        'gridW1': data.get('sashgridw') or 0,
+        'gridW1Pcs': data.get('SashWq') or 0,
+        'gridW1Cut': bool(data.get('SashWq')),
+        'gridH1': data.get('sashgridh') or 0,
+        'gridH1Pcs': data.get('SashHq') or 0,
+        'gridH1Cut': bool(data.get('SashHq')),
+        'gridW2': data.get('fixedgridw') or 0,
+        'gridW2Pcs': data.get('FixWq') or 0,
+        'gridW2Cut': bool(data.get('FixWq')),
+        'gridH2': data.get('fixedgridh') or 0,
+        'gridH2Pcs': data.get('FixHq') or 0,
+        'gridH2Cut': bool(data.get('FixHq')),
+        'sashGridW': data.get('sashgridw') or 0,
+        'sashWQty': data.get('SashWq') or 0,
+        'holeW1': data.get('holeW1') or 0,
+        'sashGridH': data.get('sashgridh') or 0,
+        'sashHQty': data.get('SashHq') or 0,
+        'holeH1': data.get('holeH1') or 0,
+        'fixedGridW': data.get('fixedgridw') or 0,
+        'fixedWQty': data.get('FixWq') or 0,
+        'holeW2': data.get('holeW2') or 0,
+        'fixedGridH': data.get('fixedgridh') or 0,
+        'fixedHQty': data.get('FixHq') or 0,
+        'holeH2': data.get('holeH2') or 0,
+    }
+
+
+def format_welder(window, calculations):
+    if not window.get('width') or not window.get('height'):
+        return None
+    width = height = ''
+    for item in calculations.get('sash') or []:
+        if item.get('material') not in ('82-03', '82-04'):
+            continue
+        if item.get('position') == '--' and not width:
+            width = item.get('length')
+        elif item.get('position') == '|' and not height:
+            height = item.get('length')
+    width = width or calculations.get('sashWidth') or ''
+    height = height or calculations.get('sashHeight') or ''
+    if not width and not height:
+        return None
+
+    def adjusted(value):
+        # 嵌扇尺寸减6mm后换回英寸
+        return round((float(value) * 25.4 - 6) / 25.4, 2) if value else ''
+
+    style = window.get('style') or ''
+    return {
+        'id': window.get('id'),
+        'customer': window.get('customer') or '',
+        'style': style,
+        'width': width,
+        'height': height,
+        'sashWidth': adjusted(width),
+        'sashHeight': adjusted(height),
+        'pieces': len(re.findall('x', style, re.IGNORECASE)) or 1,
+        'color': window.get('color') or '',
+    }
+
+
+def format_window_info(window, batch):
+    return {
+        'batch': batch,
+        'customer': window.get('customer') or '',
+        'style': window.get('style') or '',
+        'width': window.get('width') or 0,
+        'height': window.get('height') or 0,
+        'fh': window.get('fh') or '',
+        'id': window.get('id'),
+        'frame': window.get('frame') or '',
+        'glass': window.get('glass') or '',
+        'argon': window.get('argon') or False,
+        'grid': window.get('grid') or '',
+        'grid_size': window.get('grid_size') or '',
+        'color': window.get('color') or '',
+        'note': window.get('note') or '',
+    }
+
+
+def format_label(window, batch):
+    return {
+        'batch': batch,
+        'lineId': str(window.get('line_id') or ''),
+        'id': str(window.get('id') or ''),
+        'style': window.get('style') or '',
+        'color': window.get('color') or '',
+        'customer': window.get('customer') or '',
+        'width': window.get('width') or 0.0,
+        'height': window.get('height') or 0.0,
+        'frame': window.get('frame') or '',
+        'glass': window.get('glass') or '',
+        'argon': bool(window.get('argon')),
+        'grid': window.get('grid') or '',
+        'gridSize': window.get('grid_size') or '',
+        'po': '',
+    }
+
+
+def format_calculations(window, batch, calculations):
+    """把一个窗户的计算结果整理为 save_calculation 接收的格式
+
+    Args:
+        window (dict): 计算器输入，另带 customer、note、line_id，id 为预览中的窗户序号
+        batch (str): 批次号
+        calculations (dict): 计算器输出
+
+    Returns:
+        dict: calculation_data
+    """
+    return {
+        'formattedFrame': format_frame(window, batch, calculations) or {},
+        'formattedSash': format_sash(window, batch, calculations) or {},
+        'formattedScreen': format_screen(window, calculations) or {},
+        'formattedParts': format_parts(window, batch, calculations) or {},
+        'formattedGlass': format_glass(window, calculations),
+        'formattedGrid': format_grid(window, batch, calculations) or {},
+        'formattedWelder': format_welder(window, calculations) or {},
+        'formattedWindowInfo': format_window_info(window, batch),
+        'label': format_label(window, batch),
+        'frameType': calculations.get('frameType') or '',
+    }
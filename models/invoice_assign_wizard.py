@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, Command
+from odoo.exceptions import UserError
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class InvoiceAssignWizard(models.TransientModel):
+    """批量把发票分配到生产批次
+
+    按发票的行项目数量做首次适应递减装箱: 数量大的发票先放，
+    每张发票放入日期最早、剩余容量足够的批次，放不下时新建批次。
+    """
+    _name = 'rich_production.invoice.assign.wizard'
+    _description = 'Assign Invoices to Production Batches'
+
+    invoice_ids = fields.Many2many('account.move', string='Invoices',
+                                   domain="[('move_type', '=', 'out_invoice')]")
+    date_from = fields.Date(string='From', required=True, default=fields.Date.context_today)
+    date_to = fields.Date(string='To', required=True,
+                          default=lambda self: fields.Date.context_today(self) + timedelta(days=6))
+    default_capacity = fields.Integer(string='New Batch Capacity', default=100,
+                                      help="新建批次的容量")
+    create_batches = fields.Boolean(string='Create Batches', default=True,
+                                    help="已有批次放不下时新建批次")
+    line_ids = fields.One2many('rich_production.invoice.assign.wizard.line', 'wizard_id', string='Assignments')
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('proposed', 'Proposed'),
+    ], default='draft')
+
+    @api.model
+    def default_get(self, fields_list):
+        values = super().default_get(fields_list)
+        if self.env.context.get('active_model') == 'account.move' and 'invoice_ids' in fields_list:
+            invoices = self.env['account.move'].browse(self.env.context.get('active_ids', []))
+            values['invoice_ids'] = [Command.set(invoices.filtered(lambda m: m.move_type == 'out_invoice').ids)]
+        return values
+
+    def _get_invoice_date(self, invoice):
+        return invoice._get_production_due_date() or self.date_to
+
+    def _get_open_batches(self):
+        """日期范围内可以继续加单的批次，按开始日期排序"""
+        return self.env['rich_production.production'].search([
+            ('start_date', '>=', self.date_from),
+            ('start_date', '<=', self.date_to),
+            ('state', 'in', ('draft', 'progress')),
+            ('capacity', '>', 0),
+        ], order='start_date, id')
+
+    def _pack(self, invoices, items, batches):
+        """首次适应递减装箱
+
+        Args:
+            invoices: 待分配的发票
+            items (dict): {发票ID: 数量}
+            batches: 已有批次
+
+        Returns:
+            list: 分配行的值，新批次的行带有该批次的容量
+        """
+        # 每个箱子: [开始日期, 剩余容量, 批次ID或None, 新批次序号, 容量]
+        bins = [[batch.start_date, batch.capacity - batch.total_items, batch.id, 0, batch.capacity]
+                for batch in batches]
+        next_date = max((batch.start_date for batch in batches), default=self.date_from - timedelta(days=1))
+        new_count = 0
+
+        ordered = invoices.sorted(lambda invoice: (-items.get(invoice.id, 0), self._get_invoice_date(invoice), invoice.id))
+        assignments = []
+        for invoice in ordered:
+            count = items.get(invoice.id, 0)
+            target = next((b for b in bins if b[1] >= count), None)
+            if target is None and self.create_batches:
+                next_date = min(next_date + timedelta(days=1), self.date_to) if bins else self.date_from
+                new_count += 1
+                # 超过默认容量的发票单独开一个能放下它的批次
+                capacity = max(self.default_capacity, count)
+                target = [next_date, capacity, None, new_count, capacity]
+                bins.append(target)
+                bins.sort(key=lambda b: (b[0], b[2] or 0, b[3]))
+            vals = {'invoice_id': invoice.id, 'items': count}
+            if target is not None:
+                target[1] -= count
+                vals.update(production_id=target[2], new_batch=target[3], start_date=target[0],
+                            batch_capacity=target[4])
+            assignments.append(vals)
+        return assignments
+
+    def action_propose(self):
+        self.ensure_one()
+        if self.date_to < self.date_from:
+            raise UserError("结束日期不能早于开始日期")
+        invoices = self.invoice_ids.filtered(lambda m: m.move_type == 'out_invoice')
+        # 已经在批次中的发票不再分配
+        assigned = self.env['rich_production.production'].search([('invoice_ids', 'in', invoices.ids)])
+        invoices -= assigned.invoice_ids
+        if not invoices:
+            raise UserError("没有需要分配的发票")
+
+        items = self.env['rich_production.production']._get_invoice_items(invoices.ids)
+        assignments = self._pack(invoices, items, self._get_open_batches())
+        self.write({
+            'line_ids': [Command.clear()] + [Command.create(vals) for vals in assignments],
+            'state': 'proposed',
+        })
+        return self._reopen()
+
+    def action_apply(self):
+        """一次事务内创建新批次、关联发票并同步产品行"""
+        self.ensure_one()
+        Production = self.env['rich_production.production']
+        lines = self.line_ids.filtered(lambda line: line.production_id or line.new_batch)
+
+        new_batches = {}
+        for line in lines.filtered('new_batch').sorted('new_batch'):
+            if line.new_batch not in new_batches:
+                new_batches[line.new_batch] = Production.create({
+                    'start_date': line.start_date,
+                    'stop_date': line.start_date + timedelta(days=1),
+                    'capacity': line.batch_capacity or self.default_capacity,
+                })
+
+        invoices_by_batch = {}
+        for line in lines:
+            production = line.production_id or new_batches[line.new_batch]
+            invoices_by_batch.setdefault(production, []).append(line.invoice_id.id)
+
+        productions = Production
+        for production, invoice_ids in invoices_by_batch.items():
+            production.write({'invoice_ids': [Command.link(invoice_id) for invoice_id in invoice_ids]})
+            productions |= production
+        # 产品行在同一事务内同步，不等待后台队列
+        productions._refresh_product_lines()
+        _logger.info(f"发票分配完成: 发票={len(lines)}, 批次={len(productions)}, 新建={len(new_batches)}")
+
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Production Batches',
+            'res_model': 'rich_production.production',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', productions.ids)],
+            'target': 'current',
+        }
+
+    def _reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+
+class InvoiceAssignWizardLine(models.TransientModel):
+    _name = 'rich_production.invoice.assign.wizard.line'
+    _description = 'Invoice Assignment'
+    _order = 'start_date, new_batch, id'
+
+    wizard_id = fields.Many2one('rich_production.invoice.assign.wizard', required=True, ondelete='cascade')
+    invoice_id = fields.Many2one('account.move', string='Invoice', required=True)
+    partner_id = fields.Many2one(related='invoice_id.partner_id', string='Customer')
+    items = fields.Float(string='Items')
+    production_id = fields.Many2one('rich_production.production', string='Batch')
+    new_batch = fields.Integer(string='New Batch #', help="0表示分配到已有批次")
+    start_date = fields.Date(string='Start Date')
+    batch_capacity = fields.Integer(string='Batch Capacity', help="新批次创建时使用的容量")
@@ -104,6 +104,45 @@ class ProductionLine(models.Model):
          'Product line must be unique per production and invoice line!')
     ]
     
+    # 下料单和服务端计算用到的产品行字段，只有这些字段变化时重新生成文件和重新计算
+    ARTIFACT_FIELDS = {
+        'production_id', 'product_id', 'invoice_id', 'quantity', 'notes',
+        'window_width', 'window_height', 'frame_type', 'glass_type', 'argon', 'grid_type', 'color',
+        'width', 'height', 'frame', 'glass', 'grid',
+    }
+    
+    def _artifacts_deferred(self):
+        """批量同步和计算时由调用方在结束后统一加入文件生成队列"""
+        return self.env.context.get('rich_production_defer_artifacts')
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines.production_id._touch_lines_changed()
+        if not self._artifacts_deferred():
+            lines.production_id._enqueue_artifacts()
+        return lines
+    
+    def write(self, vals):
+        if not self.ARTIFACT_FIELDS.intersection(vals):
+            return super().write(vals)
+        productions = self.production_id
+        result = super().write(vals)
+        productions |= self.production_id
+        productions._touch_lines_changed()
+        if not self._artifacts_deferred():
+            productions._enqueue_artifacts()
+        return result
+    
+    def unlink(self):
+        productions = self.production_id
+        result = super().unlink()
+        productions = productions.exists()
+        productions._touch_lines_changed()
+        if not self._artifacts_deferred():
+            productions._enqueue_artifacts()
+        return result
+    
     def name_get(self):
         """自定义记录显示名称"""
         result = []
@@ -1,9 +1,50 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+from odoo.tools import SQL
 from datetime import date, timedelta
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# 产品行字段 -> 发票行上的候选字段，按顺序取第一个有值的字段
+INVOICE_LINE_FIELD_CANDIDATES = {
+    'window_width': ['window_width', 'x_window_width', 'x_width', 'width'],
+    'window_height': ['window_height', 'x_window_height', 'x_height', 'height'],
+    'frame_type': ['frame_type', 'x_frame_type', 'x_frame', 'frame'],
+    'glass_type': ['glass_type', 'x_glass_type', 'x_glass', 'glass'],
+    'color': ['color', 'x_color', 'color_type'],
+    'grid_type': ['grid_type', 'x_grid_type', 'x_grid', 'grid'],
+    'grid_size': ['grid_size', 'x_grid_size', 'grid_details'],
+    'argon': ['argon', 'x_argon', 'has_argon'],
+    'fixed_height_position': ['fixed_height_position', 'x_fixed_height_position', 'fh_position', 'handle_position'],
+    'fixed_height': ['fixed_height', 'x_fixed_height', 'fixed_type', 'fixation'],
+    'trim': ['trim', 'x_trim', 'trim_type'],
+    'note': ['note', 'x_note', 'comments', 'description'],
+    'unit_price': ['price_unit', 'unit_price'],
+    'amount': ['price_subtotal', 'amount_untaxed', 'amount'],
+}
+
+# 产品行字段 -> 产品上的候选字段，只在发票行没有对应值时使用
+PRODUCT_FIELD_CANDIDATES = {
+    'width': ['x_width', 'width', 'default_width'],
+    'height': ['x_height', 'height', 'default_height'],
+    'frame': ['x_frame', 'frame', 'frame_type'],
+    'glass': ['x_glass', 'glass', 'glass_type'],
+    'color': ['x_color', 'color', 'color_type'],
+}
+
+# 每批同步产品行的订单数，选择的订单超过时手动刷新转入后台
+DEFAULT_LINE_SYNC_BATCH_SIZE = 50
+
+# 后台预生成的下料单文件类型和下载地址
+ARTIFACT_URLS = {
+    'xlsx': '/rich_production/download_excel/%s',
+    'pdf': '/rich_production/print_pdf/%s',
+}
+
+# 每次cron运行生成文件的订单数
+DEFAULT_ARTIFACT_BATCH_SIZE = 5
+
 class Production(models.Model):
     _name = 'rich_production.production'
     _description = 'Production Records'
@@ -52,56 +93,204 @@ class Production(models.Model):
     description = fields.Text(string='Description')
     
     # 批次信息显示
-    batch_info = fields.Char(string='Batch Info', compute='_compute_batch_info', store=True)
-    calendar_display = fields.Char(string='Calendar Display', compute='_compute_calendar_display', store=True)
+    batch_info = fields.Char(string='Batch Info', compute='_compute_display_fields', store=True)
+    calendar_display = fields.Char(string='Calendar Display', compute='_compute_display_fields', store=True)
     
     # 日历显示字段
-    calendar_capacity_display = fields.Char(string='Capacity Display', compute='_compute_calendar_capacity_display', store=True)
+    calendar_capacity_display = fields.Char(string='Capacity Display', compute='_compute_display_fields', store=True)
     
     # 产品明细行
     product_line_ids = fields.One2many('rich_production.line', 'production_id', 
                                        string='Product Lines', copy=True)
     
+    # 产品行同步队列: 发票变更后由cron在后台同步产品行
+    needs_line_sync = fields.Boolean(string='Needs Line Sync', default=False, copy=False, index=True, readonly=True,
+                                     help="发票已变更，产品行等待后台同步")
+    line_sync_failed = fields.Boolean(string='Line Sync Failed', default=False, copy=False, readonly=True,
+                                      help="后台同步产品行失败，不再自动重试；手动刷新或修改发票后重新加入队列")
+    
+    # 下料单文件在后台生成，下载时直接返回
+    artifact_state = fields.Selection([
+        ('none', 'Not Generated'),
+        ('pending', 'Generating'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ], string='Cutting List Files', default='none', copy=False, index=True, readonly=True)
+    
+    # 服务端批量计算结果
+    result_ids = fields.One2many('window.calculation.result', 'production_id', string='Calculation Results')
+    last_calculation_date = fields.Datetime(string='Last Calculation', readonly=True, copy=False,
+                                            help="服务端最近一次计算窗户的时间")
+    lines_changed_date = fields.Datetime(string='Lines Changed', readonly=True, copy=False,
+                                         help="产品行最近一次增删改的时间，删除产品行也会更新")
+    calculation_skipped_date = fields.Datetime(string='Calculation Skipped', readonly=True, copy=False,
+                                               help="批量计算因服务端不支持的样式跳过的时间，产品行再次变化前不再检查")
+    
     # 添加进度百分比字段
-    progress_percentage = fields.Integer(string='Progress', compute='_compute_progress_percentage', store=True)
-    completion_color = fields.Char(string='Completion Color', compute='_compute_completion_color', store=True)
+    progress_percentage = fields.Integer(string='Progress', compute='_compute_display_fields', store=True)
+    completion_color = fields.Char(string='Completion Color', compute='_compute_display_fields', store=True)
+    
+    # 日历接口返回的列，顺序与 rows 中的值一致
+    CALENDAR_FEED_COLUMNS = ['id', 'batch', 'batch_number', 'start_date', 'stop_date',
+                             'state', 'total_items', 'customer', 'responsible']
+    
+    def init(self):
+        # 日历按可见日期范围查询
+        tools.create_index(self._cr, 'rich_production_production_dates_index',
+                           self._table, ['start_date', 'stop_date'])
+        # 已有订单的产品行变更时间取产品行最后修改时间
+        self._cr.execute("""
+            UPDATE rich_production_production p
+               SET lines_changed_date = l.last_write
+              FROM (SELECT production_id, MAX(write_date) AS last_write
+                      FROM rich_production_line GROUP BY production_id) l
+             WHERE l.production_id = p.id AND p.lines_changed_date IS NULL
+        """)
+    
+    @api.model
+    def get_calendar_feed(self, start, end):
+        """日历可见范围内的批次，只返回日历上显示的字段
+        
+        Args:
+            start (str): 范围开始日期(含)
+            end (str): 范围结束日期(不含)
+        
+        Returns:
+            dict: {'columns': [...], 'rows': [[...], ...]}
+        """
+        self.check_access('read')
+        self.flush_model(['start_date', 'stop_date', 'batch', 'batch_number', 'state',
+                          'total_items', 'customer_id', 'user_id'])
+        # _search 带上记录规则
+        query = self._search([('start_date', '<', end), ('stop_date', '>=', start)])
+        self.env.cr.execute(SQL("""
+            SELECT p.id, p.batch, p.batch_number,
+                   to_char(p.start_date, 'YYYY-MM-DD'), to_char(p.stop_date, 'YYYY-MM-DD'),
+                   p.state, p.total_items, customer.name, responsible.name
+              FROM rich_production_production p
+              LEFT JOIN res_partner customer ON customer.id = p.customer_id
+              LEFT JOIN res_users u ON u.id = p.user_id
+              LEFT JOIN res_partner responsible ON responsible.id = u.partner_id
+             WHERE p.id IN %s
+             ORDER BY p.start_date, p.id
+        """, query.subselect()))
+        return {'columns': self.CALENDAR_FEED_COLUMNS, 'rows': self.env.cr.fetchall()}
     
-    @api.depends('batch', 'batch_number', 'customer_id', 'total_items', 'capacity')
-    def _compute_batch_info(self):
+    @api.model
+    def get_capacity_heatmap(self, start, end):
+        """日期范围内每天的数量和容量合计，多天的批次按天数平均分摊
+        
+        结果按范围缓存，范围内的批次有增删改、数量或容量变化时失效；
+        total_items 由发票行重新计算时不更新 write_date，所以戳记包含各批次的数量和容量
+        
+        Args:
+            start (str): 范围开始日期(含)
+            end (str): 范围结束日期(不含)
+        
+        Returns:
+            dict: {日期: [数量, 容量]}
+        """
+        self.check_access('read')
+        self.flush_model(['start_date', 'stop_date', 'duration', 'state', 'total_items', 'capacity'])
+        query = self._search([('start_date', '<', end), ('stop_date', '>=', start), ('state', '!=', 'cancel')])
+        self.env.cr.execute(SQL("""
+            SELECT COUNT(*), MAX(write_date),
+                   md5(string_agg(concat_ws(':', id, total_items, capacity), ',' ORDER BY id))
+              FROM rich_production_production
+             WHERE id IN %s
+        """, query.subselect()))
+        count, last_write, loads = self.env.cr.fetchone()
+        rows = self._get_capacity_heatmap(start, end, (count, str(last_write), loads))
+        return {day: [items, capacity] for day, items, capacity in rows}
+    
+    @api.model
+    @tools.ormcache('self.env.uid', 'start', 'end', 'stamp')
+    def _get_capacity_heatmap(self, start, end, stamp):
+        query = self._search([('start_date', '<', end), ('stop_date', '>=', start), ('state', '!=', 'cancel')])
+        self.env.cr.execute(SQL("""
+            SELECT to_char(d.day, 'YYYY-MM-DD'),
+                   ROUND(SUM(p.total_items::numeric / GREATEST(p.duration, 1)), 2)::float,
+                   ROUND(SUM(p.capacity::numeric / GREATEST(p.duration, 1)), 2)::float
+              FROM generate_series(%s::date, %s::date - 1, interval '1 day') AS d(day)
+              JOIN rich_production_production p
+                ON p.start_date <= d.day
+               AND d.day < p.start_date + GREATEST(p.duration, 1)
+             WHERE p.id IN %s
+             GROUP BY d.day
+             ORDER BY d.day
+        """, start, end, query.subselect()))
+        return tuple(self.env.cr.fetchall())
+    
+    @api.depends('batch', 'batch_number', 'customer_id.name', 'total_items', 'capacity')
+    def _compute_display_fields(self):
+        """一次计算所有显示字段，刷新时每个字段只写一次"""
+        # 整个记录集的客户名称一次读取
+        self.customer_id._origin.fetch(['name'])
         for record in self:
+            total_items = record.total_items or 0
+            percentage = min(100, int((total_items * 100) / record.capacity)) if record.capacity else 0
+            customer_name = record.customer_id.name
+            
+            # 批次信息
             info = []
             if record.batch_number:
                 info.append(f"{record.batch_number}")
+            if record.capacity:
+                info.append(f"Items: {total_items}/{record.capacity} ({percentage}%)")
+            if customer_name:
+                info.append(f"Customer: {customer_name}")
+            record.batch_info = "\n".join(info) or "未指定批次"
             
-            # 添加总数/容量信息
-            if record.total_items is not None and record.capacity:
-                percentage = min(100, int((record.total_items * 100) / (record.capacity or 1)))
-                info.append(f"Items: {record.total_items}/{record.capacity} ({percentage}%)")
+            # 日历显示
+            parts = []
+            if record.batch_number:
+                parts.append(f"批次号: {record.batch_number}")
+            if record.batch:
+                parts.append(f"批次: {record.batch}")
+            if customer_name:
+                parts.append(f"客户: {customer_name}")
+            if total_items:
+                parts.append(f"数量: {total_items}")
+            record.calendar_display = "\n".join(parts) or "未指定批次"
             
-            # 添加客户信息
-            if record.customer_id:
-                info.append(f"Customer: {record.customer_id.name}")
-                
-            record.batch_info = "\n".join(info) or "未指定批次"
+            # 容量与完成度
+            if record.capacity:
+                record.calendar_capacity_display = f"{total_items}/{record.capacity} ({percentage}%)"
+            else:
+                record.calendar_capacity_display = f"{total_items} items"
+            record.progress_percentage = percentage if record.capacity > 0 else 0
+            if record.progress_percentage >= 100:
+                record.completion_color = 'success'  # 绿色
+            elif record.progress_percentage >= 75:
+                record.completion_color = 'warning'  # 黄色
+            elif record.progress_percentage >= 50:
+                record.completion_color = 'info'     # 蓝色
+            else:
+                record.completion_color = 'danger'   # 红色
     
-    @api.depends('invoice_ids')
+    @api.model
+    def _get_invoice_items(self, invoice_ids):
+        """一次分组查询得到每张发票的行项目数量
+        
+        Returns:
+            dict: {发票ID: 数量}
+        """
+        if not invoice_ids:
+            return {}
+        groups = self.env['account.move.line']._read_group(
+            [('move_id', 'in', list(invoice_ids)),
+             ('display_type', 'in', ('product', 'line_section', 'line_note'))],
+            ['move_id'],
+            ['quantity:sum'],
+        )
+        return {move.id: quantity for move, quantity in groups}
+    
+    @api.depends('invoice_ids', 'invoice_ids.invoice_line_ids.quantity')
     def _compute_total_items(self):
+        """一次分组查询汇总所有批次的发票行数量"""
+        quantities = self._get_invoice_items(set(self.invoice_ids._origin.ids))
         for record in self:
-            if record.invoice_ids:
-                # 计算所有发票行项目的总数
-                total = 0
-                for invoice in record.invoice_ids:
-                    # 遍历每个发票的行项目
-                    for line in invoice.invoice_line_ids:
-                        if hasattr(line, 'quantity'):
-                            total += line.quantity
-                        elif hasattr(line, 'product_uom_qty'):
-                            total += line.product_uom_qty
-                        else:
-                            total += 1  # 如果没有数量字段，默认为1
-                record.total_items = total
-            else:
-                record.total_items = 0
+            record.total_items = sum(quantities.get(invoice_id, 0) for invoice_id in record.invoice_ids._origin.ids)
     
     @api.depends('start_date', 'stop_date')
     def _compute_duration(self):
@@ -112,20 +301,6 @@ class Production(models.Model):
             else:
                 record.duration = 0
     
-    @api.depends('batch', 'batch_number', 'customer_id', 'total_items')
-    def _compute_calendar_display(self):
-        for record in self:
-            parts = []
-            if record.batch_number:
-                parts.append(f"批次号: {record.batch_number}")
-            if record.batch:
-                parts.append(f"批次: {record.batch}")
-            if record.customer_id:
-                parts.append(f"客户: {record.customer_id.name}")
-            if record.total_items:
-                parts.append(f"数量: {record.total_items}")
-            record.calendar_display = "\n".join(parts) or "未指定批次"
-    
     @api.onchange('invoice_ids')
     def _onchange_invoice_ids(self):
         """当发票变更时更新相关字段和产品行"""
@@ -137,36 +312,146 @@ class Production(models.Model):
                 
                 # 更新产品行 - 传递onchange上下文避免在onchange中执行SQL
                 record.with_context(onchange_self=True)._update_product_lines_from_invoices()
-                
-                # 更新名称 - 使用更详细的格式
-                self._update_display_name()
+        
+        # 更新名称 - 使用更详细的格式，整个记录集处理一次
+        self.filtered('invoice_ids')._update_display_name()
+    
+    def _get_display_name_value(self):
+        """生成日历上显示的完整名称，没有可用信息时返回None"""
+        self.ensure_one()
+        parts = []
+        # 添加批次号
+        if self.batch_number:
+            parts.append(f"{self.batch_number}")
+        
+        # 添加容量信息
+        if self.capacity:
+            percentage = min(100, int((self.total_items * 100) / self.capacity))
+            parts.append(f"{self.total_items}/{self.capacity} ({percentage}%)")
+        
+        # 添加客户信息
+        if self.customer_id:
+            parts.append(f"{self.customer_id.name}")
+            
+        if parts:
+            return " | ".join(parts)
+        if self.batch:
+            # 使用批次作为备选
+            return f"批次: {self.batch}"
+        if self.invoice_ids:
+            # 如果只有发票，使用发票数量
+            return f"生产批次 ({len(self.invoice_ids)} 个订单)"
+        return None
     
     def _update_display_name(self):
-        """更新显示名称，确保在日历视图上显示完整信息"""
+        """更新显示名称，确保在日历视图上显示完整信息
+        
+        只写入有变化的记录，名称相同的记录合并为一次写入。
+        name 是必填且可手动修改的字段，不放入 _compute_display_fields
+        """
+        self.customer_id._origin.fetch(['name'])
+        changed = {}
         for record in self:
-            parts = []
-            # 添加批次号
-            if record.batch_number:
-                parts.append(f"{record.batch_number}")
+            name = record._get_display_name_value()
+            if not name or name == record.name:
+                continue
+            if isinstance(record.id, models.NewId):
+                # onchange中的记录直接赋值
+                record.name = name
+            else:
+                changed.setdefault(name, []).append(record.id)
+        for name, ids in changed.items():
+            self.browse(ids).write({'name': name})
+    
+    @api.model
+    @tools.ormcache()
+    def _get_invoice_field_plan(self):
+        """把候选字段解析为 account.move.line / product.product 上真实存在的字段
+
+        每次加载注册表只解析一次，结果为 (发票行计划, 产品计划)，
+        每个计划是 ((产品行字段, (源字段, ...)), ...)
+        """
+        def resolve(model_name, candidates):
+            model_fields = self.env[model_name]._fields
+            plan = []
+            for target, names in candidates.items():
+                names = tuple(name for name in names
+                              if name in model_fields and model_fields[name].type not in ('one2many', 'many2many'))
+                if names:
+                    plan.append((target, names))
+            return tuple(plan)
+
+        return (
+            resolve('account.move.line', INVOICE_LINE_FIELD_CANDIDATES),
+            resolve('product.product', PRODUCT_FIELD_CANDIDATES),
+        )
+
+    @api.model
+    def _read_mapped_values(self, records, plan):
+        """一次read()读取计划中的所有字段，返回 {id: {产品行字段: 值}}"""
+        field_names = sorted({name for target, names in plan for name in names})
+        if not records or not field_names:
+            return {}
+        mapped = {}
+        for row in records.read(field_names):
+            values = {}
+            for target, names in plan:
+                for name in names:
+                    value = row[name]
+                    # many2one 读出来是 (id, 名称)
+                    if isinstance(value, tuple):
+                        value = value[1]
+                    if value:
+                        values[target] = value
+                        break
+            mapped[row['id']] = values
+        return mapped
+
+    @api.model
+    def _prepare_product_line_vals(self, inv_lines):
+        """批量生成发票行对应的产品行值
+
+        Args:
+            inv_lines: account.move.line 记录集
+
+        Returns:
+            dict: {发票行ID: 产品行值}，没有产品的发票行不包含在内
+        """
+        line_plan, product_plan = self._get_invoice_field_plan()
+        rows = inv_lines.read(['product_id', 'quantity', 'product_uom_id'], load=None)
+        rows = [row for row in rows if row['product_id']]
+        if not rows:
+            return {}
+
+        line_values = self._read_mapped_values(inv_lines.browse([row['id'] for row in rows]), line_plan)
+        products = self.env['product.product'].browse({row['product_id'] for row in rows})
+        product_values = self._read_mapped_values(products, product_plan)
+
+        vals_by_line = {}
+        for row in rows:
+            line_vals = {
+                'product_id': row['product_id'],
+                'quantity': row['quantity'],
+                'invoice_line_id': row['id'],
+                'state': 'draft',  # 默认为草稿状态
+            }
+            line_vals.update(line_values.get(row['id'], {}))
             
-            # 添加容量信息
-            if record.total_items is not None and record.capacity:
-                percentage = min(100, int((record.total_items * 100) / (record.capacity or 1)))
-                parts.append(f"{record.total_items}/{record.capacity} ({percentage}%)")
+            # 对于argon字段，确保值是布尔型
+            argon = line_vals.get('argon')
+            if argon and not isinstance(argon, bool):
+                line_vals['argon'] = argon.lower() in ['true', 'yes', 'y', '1'] if isinstance(argon, str) else bool(argon)
             
-            # 添加客户信息
-            if record.customer_id:
-                parts.append(f"{record.customer_id.name}")
-                
-            if parts:
-                record.name = " | ".join(parts)
-            elif record.batch:
-                # 使用批次作为备选
-                record.name = f"批次: {record.batch}"
-            elif record.invoice_ids:
-                # 如果只有发票，使用发票数量
-                record.name = f"生产批次 ({len(record.invoice_ids)} 个订单)"
-    
+            # 只有在行项目没有对应字段时才从产品获取
+            for target, value in product_values.get(row['product_id'], {}).items():
+                line_vals.setdefault(target, value)
+            
+            # 如果有UOM信息，复制
+            if row['product_uom_id']:
+                line_vals['uom_id'] = row['product_uom_id']
+            vals_by_line[row['id']] = line_vals
+        return vals_by_line
+
     def _update_product_lines_from_invoices(self):
         """从发票更新产品行数据 - 不清空现有行，采用更新或创建方式"""
         self.ensure_one()
@@ -183,80 +468,17 @@ class Production(models.Model):
         lines_to_update = []
         lines_to_create = []
         
+        # 一次读取所有发票行的映射字段
+        line_vals_by_id = self._prepare_product_line_vals(self.invoice_ids.invoice_line_ids)
+        
         # 遍历每个发票和行项目
         for invoice in self.invoice_ids:
             for inv_line in invoice.invoice_line_ids:
-                if not inv_line.product_id:
+                if inv_line.id not in line_vals_by_id:
                     continue
                     
                 key = (invoice.id, inv_line.id)
-                
-                # 基本字段
-                line_vals = {
-                    'product_id': inv_line.product_id.id,
-                    'quantity': inv_line.quantity if hasattr(inv_line, 'quantity') else 1.0,
-                    'invoice_id': invoice.id,
-                    'invoice_line_id': inv_line.id,
-                    'production_id': self.id,
-                    'state': 'draft',  # 默认为草稿状态
-                }
-                
-                # 记录所有可能的字段映射 - 包含常见命名模式
-                field_mappings = {
-                    # 主字段 - 直接与invoice line匹配的字段
-                    'window_width': ['window_width', 'x_window_width', 'x_width', 'width'],
-                    'window_height': ['window_height', 'x_window_height', 'x_height', 'height'],
-                    'frame_type': ['frame_type', 'x_frame_type', 'x_frame', 'frame'],
-                    'glass_type': ['glass_type', 'x_glass_type', 'x_glass', 'glass'],
-                    'color': ['color', 'x_color', 'color_type'],
-                    'grid_type': ['grid_type', 'x_grid_type', 'x_grid', 'grid'],
-                    'grid_size': ['grid_size', 'x_grid_size', 'grid_details'],
-                    'argon': ['argon', 'x_argon', 'has_argon'],
-                    'fixed_height_position': ['fixed_height_position', 'x_fixed_height_position', 'fh_position', 'handle_position'],
-                    'fixed_height': ['fixed_height', 'x_fixed_height', 'fixed_type', 'fixation'],
-                    'trim': ['trim', 'x_trim', 'trim_type'],
-                    'note': ['note', 'x_note', 'comments', 'description'],
-                    'unit_price': ['price_unit', 'unit_price'],
-                    'amount': ['price_subtotal', 'amount_untaxed', 'amount'],
-                }
-                
-                # 尝试从所有可能的字段名中获取值
-                for prod_field, inv_fields in field_mappings.items():
-                    for inv_field in inv_fields:
-                        if hasattr(inv_line, inv_field) and getattr(inv_line, inv_field):
-                            value = getattr(inv_line, inv_field)
-                            # 对于argon字段，确保值是布尔型
-                            if prod_field == 'argon' and not isinstance(value, bool):
-                                if isinstance(value, str):
-                                    value = value.lower() in ['true', 'yes', 'y', '1']
-                                else:
-                                    value = bool(value)
-                            line_vals[prod_field] = value
-                            break  # 找到第一个匹配项后停止
-                
-                # 另外检查产品的属性字段
-                if inv_line.product_id:
-                    prod = inv_line.product_id
-                    # 检查产品属性
-                    product_field_mappings = {
-                        'width': ['x_width', 'width', 'default_width'],
-                        'height': ['x_height', 'height', 'default_height'],
-                        'frame': ['x_frame', 'frame', 'frame_type'],
-                        'glass': ['x_glass', 'glass', 'glass_type'],
-                        'color': ['x_color', 'color', 'color_type'],
-                    }
-                    
-                    for prod_field, prod_fields in product_field_mappings.items():
-                        # 只有在行项目没有对应字段时才从产品获取
-                        if prod_field not in line_vals:
-                            for field_name in prod_fields:
-                                if hasattr(prod, field_name) and getattr(prod, field_name):
-                                    line_vals[prod_field] = getattr(prod, field_name)
-                                    break
-                
-                # 如果有UOM信息，复制
-                if hasattr(inv_line, 'product_uom_id') and inv_line.product_uom_id:
-                    line_vals['uom_id'] = inv_line.product_uom_id.id
+                line_vals = dict(line_vals_by_id[inv_line.id], invoice_id=invoice.id, production_id=self.id)
                 
                 # 检查是更新还是创建
                 if key in existing_lines:
@@ -287,31 +509,132 @@ class Production(models.Model):
             total_deleted = len([cmd for cmd in lines_to_update if cmd[0] == 2])
             total_created = len(lines_to_create)
             _logger.info(f"已处理产品行: 更新={total_updated}, 删除={total_deleted}, 创建={total_created}")
-            
-            # 验证处理结果 - 仅在非onchange环境中执行SQL查询
-            if not self._context.get('onchange_self'):  # 检查上下文避免在onchange中执行SQL
-                try:
-                    # 仅当ID是实际数据库ID时执行SQL
-                    if isinstance(self.id, int):
-                        self.env.cr.execute("""
-                            SELECT COUNT(*) FROM rich_production_line 
-                            WHERE production_id = %s
-                        """, (self.id,))
-                        count = self.env.cr.fetchone()[0]
-                        _logger.info(f"验证结果: production_id={self.id} 有 {count} 条产品行")
-                except Exception as e:
-                    _logger.warning(f"无法验证产品行数量: {str(e)}")
+    
+    def _bulk_update_product_lines_from_invoices(self):
+        """批量从发票更新多个生产订单的产品行
+        
+        所有发票行和现有产品行一次读取，由 _apply_product_line_diff 在内存中比较差异
+        
+        Returns:
+            tuple: (更新数, 创建数, 删除数)
+        """
+        ProductLine = self.env['rich_production.line']
+        productions = self.exists()
+        if not productions:
+            return 0, 0, 0
+        
+        # 预取所有发票和发票行
+        invoices = productions.invoice_ids
+        inv_lines = invoices.invoice_line_ids
+        line_vals_by_id = self._prepare_product_line_vals(inv_lines)
+        
+        # 现有产品行按 (生产订单, 发票, 发票行) 建索引
+        existing = ProductLine.search([('production_id', 'in', productions.ids)])
+        existing.fetch(['production_id', 'invoice_id', 'invoice_line_id'])
+        existing_lines = {}
+        for line in existing:
+            if line.invoice_id and line.invoice_line_id:
+                existing_lines[(line.production_id.id, line.invoice_id.id, line.invoice_line_id.id)] = line
+        
+        vals_by_key = {}
+        for production in productions:
+            for invoice in production.invoice_ids:
+                for inv_line in invoice.invoice_line_ids:
+                    line_vals = line_vals_by_id.get(inv_line.id)
+                    if line_vals:
+                        vals_by_key[(production.id, invoice.id, inv_line.id)] = dict(
+                            line_vals, invoice_id=invoice.id, production_id=production.id)
+        
+        # 没有发票行的产品行不属于任何发票，整体同步时删除
+        unmatched = existing.filtered(lambda line: not (line.invoice_id and line.invoice_line_id))
+        updated, created, deleted = self._apply_product_line_diff(existing_lines, vals_by_key, unmatched)
+        _logger.info(f"批量处理产品行: 订单={len(productions)}, 更新={updated}, "
+                     f"删除={deleted}, 创建={created}")
+        return updated, created, deleted
+    
+    @api.model
+    def _apply_product_line_diff(self, existing_lines, vals_by_key, to_unlink=None):
+        """按键比较现有产品行和新的值，整体同步和增量同步共用
+        
+        只有新值的键创建产品行，只有现有行的键删除产品行；两边都有时只写入有变化的字段，
+        相同的修改合并为一次write
+        
+        Args:
+            existing_lines (dict): {键: 现有产品行}
+            vals_by_key (dict): {键: 产品行值}，包含 invoice_id 和 production_id
+            to_unlink: 另外需要删除的产品行
+        
+        Returns:
+            tuple: (更新数, 创建数, 删除数)
+        """
+        # 产品行的写入钩子不逐次加入文件生成队列，结束后受影响的订单只加入一次
+        ProductLine = self.env['rich_production.line'].with_context(rich_production_defer_artifacts=True)
+        to_unlink = (to_unlink or ProductLine).with_context(rich_production_defer_artifacts=True)
+        existing = ProductLine.union(*existing_lines.values())
+        compare_fields = sorted({name for vals in vals_by_key.values() for name in vals
+                                 if name in ProductLine._fields})
+        existing.fetch(compare_fields)
+        
+        to_create = []
+        to_write = {}
+        for key, line in existing_lines.items():
+            if key not in vals_by_key:
+                to_unlink |= line
+        for key, line_vals in vals_by_key.items():
+            line = existing_lines.get(key)
+            if not line:
+                to_create.append(line_vals)
+                continue
+            changes = {}
+            for name, value in line_vals.items():
+                field = line._fields.get(name)
+                if field and field.convert_to_write(line[name], line) != value:
+                    changes[name] = value
+            if changes:
+                to_write.setdefault(tuple(sorted(changes.items())), []).append(line.id)
+        
+        affected = to_unlink.production_id | self.browse({vals['production_id'] for vals in to_create})
+        for changes, line_ids in to_write.items():
+            lines = ProductLine.browse(line_ids)
+            affected |= lines.production_id
+            lines.write(dict(changes))
+        if to_unlink:
+            to_unlink.unlink()
+        if to_create:
+            ProductLine.create(to_create)
+        affected.exists()._enqueue_artifacts()
+        updated = sum(len(line_ids) for line_ids in to_write.values())
+        return updated, len(to_create), len(to_unlink)
+    
+    def _refresh_product_lines(self):
+        """在当前事务内同步产品行并清除同步标记"""
+        result = self._bulk_update_product_lines_from_invoices()
+        self.filtered(lambda p: p.needs_line_sync or p.line_sync_failed).write(
+            {'needs_line_sync': False, 'line_sync_failed': False})
+        return result
     
     def action_refresh_product_lines(self):
-        """手动刷新产品行按钮操作"""
-        for record in self:
-            record._update_product_lines_from_invoices()
+        """手动刷新产品行按钮操作，选择的订单较多时转入后台分批处理"""
+        if len(self) > self._get_line_sync_batch_size():
+            self.write({'needs_line_sync': True, 'line_sync_failed': False})
+            self._trigger_line_sync()
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': '已转入后台',
+                    'message': f'{len(self)} 个生产订单将在后台分批刷新，列表中的"Syncing"列显示进度',
+                    'sticky': False,
+                    'type': 'info'
+                }
+            }
+        updated, created, deleted = self._refresh_product_lines()
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': '刷新完成',
-                'message': f'已从发票更新产品明细',
+                'message': f'已从发票更新产品明细: 更新 {updated}, 创建 {created}, 删除 {deleted}',
                 'sticky': False,
                 'type': 'success'
             }
@@ -406,59 +729,98 @@ class Production(models.Model):
         }
 
     def write(self, vals):
-        """覆盖写入方法，确保产品行数据正确保存和名称更新"""
+        """覆盖写入方法，发票变更时把产品行同步加入队列"""
+        if 'invoice_ids' in vals:
+            vals = dict(vals, needs_line_sync=True, line_sync_failed=False)
         result = super(Production, self).write(vals)
         
         # 如果相关字段变化，更新name字段
         if any(field in vals for field in ['batch_number', 'total_items', 'capacity', 'customer_id']):
             self._update_display_name()
         
-        # 在写入完成后，如果更新了发票，则同步更新产品行
-        if 'invoice_ids' in vals and self.invoice_ids:
-            # 使用事务新建游标确保完全提交
-            self.env.cr.commit()
-            
-            # 强制刷新产品行
-            for record in self:
-                _logger.info(f"在write后强制更新产品行数据: production_id = {record.id}")
-                record._update_product_lines_from_invoices()
-                
-                # 验证数据是否正确保存
-                self.env.cr.execute("""
-                    SELECT COUNT(*) FROM rich_production_line 
-                    WHERE production_id = %s
-                """, (record.id,))
-                count = self.env.cr.fetchone()[0]
-                _logger.info(f"验证: production_id={record.id} 有 {count} 条产品行")
+        if 'invoice_ids' in vals:
+            self._trigger_line_sync()
         
         return result
         
     @api.model
     def create(self, vals):
         """覆盖创建方法，确保产品行数据正确保存和名称设置"""
+        # 如果有发票，产品行在后台同步
+        if vals.get('invoice_ids'):
+            vals = dict(vals, needs_line_sync=True)
         record = super(Production, self).create(vals)
         
         # 确保新记录有正确的显示名称
         record._update_display_name()
         
-        # 使用事务新建游标确保完全提交
-        self.env.cr.commit()
-        
-        # 如果有发票，不管是否有产品行，都强制更新产品行
-        if 'invoice_ids' in vals and vals['invoice_ids']:
-            _logger.info(f"在create后强制更新产品行数据: production_id = {record.id}")
-            record._update_product_lines_from_invoices()
-            
-            # 验证数据是否正确保存
-            self.env.cr.execute("""
-                SELECT COUNT(*) FROM rich_production_line 
-                WHERE production_id = %s
-            """, (record.id,))
-            count = self.env.cr.fetchone()[0]
-            _logger.info(f"验证: production_id={record.id} 有 {count} 条产品行")
+        if record.needs_line_sync:
+            record._trigger_line_sync()
         
         return record
     
+    def _trigger_line_sync(self):
+        """提交后尽快运行产品行同步cron"""
+        cron = self.env.ref('rich_production.ir_cron_sync_product_lines', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+    
+    @api.model
+    def _get_line_sync_batch_size(self):
+        """每批同步的订单数，可通过系统参数 rich_production.line_sync_batch_size 调整"""
+        size = self.env['ir.config_parameter'].sudo().get_param(
+            'rich_production.line_sync_batch_size', DEFAULT_LINE_SYNC_BATCH_SIZE)
+        try:
+            return max(int(size), 1)
+        except (TypeError, ValueError):
+            return DEFAULT_LINE_SYNC_BATCH_SIZE
+    
+    @api.model
+    def _sync_pending_product_lines(self, limit=None):
+        """批量同步队列中的生产订单产品行
+        
+        整批在一个保存点内处理，出错时改为逐个订单处理，只回滚出错的订单
+        
+        Args:
+            limit (int): 本次最多同步的订单数，默认读取系统参数
+        
+        Returns:
+            tuple: (已同步订单数, 剩余订单数)
+        """
+        limit = limit or self._get_line_sync_batch_size()
+        domain = [('needs_line_sync', '=', True), ('line_sync_failed', '=', False)]
+        batch = self.search(domain, order='write_date, id', limit=limit)
+        done = 0
+        failed = self.browse()
+        try:
+            with self.env.cr.savepoint():
+                batch._refresh_product_lines()
+                self.env.flush_all()
+            done = len(batch)
+        except Exception as e:
+            _logger.warning(f"批量同步产品行失败，改为逐个同步: {str(e)}")
+            self.env.invalidate_all()
+            for record in batch:
+                try:
+                    with self.env.cr.savepoint():
+                        record._refresh_product_lines()
+                        self.env.flush_all()
+                    done += 1
+                except Exception as e:
+                    _logger.error(f"同步产品行失败: production_id={record.id}, 错误: {str(e)}")
+                    failed |= record
+        # 失败的订单移出队列，不会每次运行都重试同一批订单
+        if failed:
+            failed.write({'line_sync_failed': True})
+        remaining = self.search_count(domain)
+        _logger.info(f"产品行同步: 完成={done}, 失败={len(failed)}, 剩余={remaining}")
+        return done, remaining
+    
+    @api.model
+    def _cron_sync_product_lines(self):
+        done, remaining = self._sync_pending_product_lines()
+        self.env['ir.cron']._notify_progress(done=done, remaining=remaining)
+    
     def action_inspect_invoice_fields(self):
         """辅助方法：检查发票行项目中的可用字段，帮助诊断字段映射问题"""
         self.ensure_one()
@@ -556,46 +918,207 @@ class Production(models.Model):
             }
         }
 
+    def _get_cutting_report(self):
+        """获取或创建下料单报表记录"""
+        self.ensure_one()
+        Report = self.env['rich_production.cutting.list.report']
+        return Report.search([('production_id', '=', self.id)], limit=1) or Report.create({'production_id': self.id})
+    
+    def _get_artifact_url(self, kind):
+        """文件已按当前内容生成时返回下载地址，否则返回False"""
+        self.ensure_one()
+        if not self.env['rich_production.report.cache'].sudo()._get_cached(self, kind):
+            return False
+        return ARTIFACT_URLS[kind] % self._get_cutting_report().id
+    
+    def _artifact_download_action(self, kind):
+        """文件已生成时直接下载，否则加入后台队列并打开等待界面"""
+        self.ensure_one()
+        url = self._get_artifact_url(kind)
+        if url:
+            return {
+                'type': 'ir.actions.act_url',
+                'url': url,
+                'target': 'self',
+            }
+        if self.artifact_state != 'pending':
+            self._enqueue_artifacts(force=True)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'rich_production.artifact_wait',
+            'name': '正在生成下料单',
+            'target': 'new',
+            'params': {
+                'productionId': self.id,
+                'kind': kind,
+            },
+        }
+    
+    def get_artifact_status(self, kind):
+        """等待界面轮询文件是否已生成
+        
+        Returns:
+            dict: {'state': 生成状态, 'url': 下载地址或False}
+        """
+        self.ensure_one()
+        if kind not in ARTIFACT_URLS:
+            raise UserError("不支持的文件类型")
+        url = self._get_artifact_url(kind)
+        if not url and self.artifact_state in ('none', 'ready'):
+            # 文件已被缓存淘汰或内容刚变化，重新排队
+            self._enqueue_artifacts(force=True)
+        return {'state': 'ready' if url else self.artifact_state, 'url': url}
+    
     def action_download_pdf(self):
         """下载PDF版本的下料单"""
-        self.ensure_one()
+        return self._artifact_download_action('pdf')
         
-        # 获取或创建报表记录
-        report = self.env['rich_production.cutting.list.report'].search(
-            [('production_id', '=', self.id)], limit=1)
-        if not report:
-            report = self.env['rich_production.cutting.list.report'].create({
-                'production_id': self.id
-            })
-            report.generate_report()
-            
-        # 返回PDF下载URL
-        pdf_url = f"/rich_production/print_pdf/{report.id}"
+    def action_download_excel(self):
+        """下载Excel版本的下料单"""
+        return self._artifact_download_action('xlsx')
+    
+    def action_print_labels(self, fmt='pdf'):
+        """批量打印所选订单的窗户标签，fmt 为 zpl(热敏打印机) 或 pdf(多联)"""
+        if not self:
+            raise UserError("请选择生产订单")
         return {
             'type': 'ir.actions.act_url',
-            'url': pdf_url,
-            'target': 'self',
+            'url': f"/rich_production/print_labels?ids={','.join(map(str, self.ids))}&fmt={fmt}",
+            'target': 'self' if fmt == 'zpl' else 'new',
         }
+    
+    def _enqueue_artifacts(self, force=False):
+        """把订单加入下料单文件生成队列
         
-    def action_download_excel(self):
-        """下载Excel版本的下料单"""
-        self.ensure_one()
+        默认只处理进行中的订单，force为True时不检查状态
+        """
+        productions = self if force else self.filtered(lambda p: p.state == 'progress')
+        productions = productions.filtered(lambda p: p.artifact_state != 'pending')
+        if not productions:
+            return
+        productions._set_artifact_state('pending')
+        cron = self.env.ref('rich_production.ir_cron_generate_artifacts', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+    
+    def _touch_lines_changed(self):
+        """记录产品行变更时间，直接更新不修改write_date"""
+        if not self:
+            return
+        self.env.cr.execute(
+            "UPDATE rich_production_production SET lines_changed_date = now() AT TIME ZONE 'UTC' WHERE id IN %s",
+            [tuple(self.ids)])
+        self.invalidate_recordset(['lines_changed_date'])
+    
+    def _set_artifact_state(self, state):
+        """直接更新生成状态，不修改write_date，避免报表缓存指纹失效"""
+        if not self:
+            return
+        self.env.cr.execute(
+            "UPDATE rich_production_production SET artifact_state = %s WHERE id IN %s",
+            [state, tuple(self.ids)])
+        self.invalidate_recordset(['artifact_state'])
+    
+    @api.model
+    def _get_artifact_batch_size(self):
+        """每次生成文件的订单数，可通过系统参数 rich_production.artifact_batch_size 调整"""
+        size = self.env['ir.config_parameter'].sudo().get_param(
+            'rich_production.artifact_batch_size', DEFAULT_ARTIFACT_BATCH_SIZE)
+        try:
+            return max(int(size), 1)
+        except (TypeError, ValueError):
+            return DEFAULT_ARTIFACT_BATCH_SIZE
+    
+    @api.model
+    def _generate_pending_artifacts(self, limit=None):
+        """生成队列中订单的Excel和PDF文件，每个订单在单独的保存点内处理
         
-        # 获取或创建报表记录
-        report = self.env['rich_production.cutting.list.report'].search(
-            [('production_id', '=', self.id)], limit=1)
-        if not report:
-            report = self.env['rich_production.cutting.list.report'].create({
-                'production_id': self.id
-            })
-            report.generate_report()
-            
-        # 返回Excel下载URL
-        excel_url = f"/rich_production/download_excel/{report.id}"
+        Returns:
+            tuple: (已生成订单数, 剩余订单数)
+        """
+        limit = limit or self._get_artifact_batch_size()
+        pending = self.search([('artifact_state', '=', 'pending')], order='write_date, id')
+        batch = pending[:limit]
+        done = 0
+        for production in batch:
+            try:
+                with self.env.cr.savepoint():
+                    report = production._get_cutting_report()
+                    for kind in ARTIFACT_URLS:
+                        report._get_report_attachment(kind)
+                    self.env.flush_all()
+                production._set_artifact_state('ready')
+                done += 1
+            except Exception as e:
+                _logger.error(f"生成下料单文件失败: production_id={production.id}, 错误: {str(e)}")
+                self.env.invalidate_all()
+                production._set_artifact_state('failed')
+        remaining = max(len(pending) - len(batch), 0)
+        _logger.info(f"下料单文件生成: 完成={done}, 剩余={remaining}")
+        return done, remaining
+    
+    @api.model
+    def _cron_generate_artifacts(self):
+        done, remaining = self._generate_pending_artifacts()
+        self.env['ir.cron']._notify_progress(done=done, remaining=remaining)
+
+    def _calculate_windows(self):
+        """用服务端引擎计算产品行并批量保存结果
+
+        只替换服务端算出的产品行的结果，服务端不支持的样式保留预览保存的结果；
+        所有产品行都有服务端计算器的订单才记录计算时间
+        """
+        # 结果的增删不逐条加入文件生成队列，计算结束后统一加入
+        engine = self.env['window.calculation.engine'].with_context(rich_production_defer_artifacts=True)
+        lines = self.env['rich_production.line']
+        windows = []
+        for production in self:
+            # 窗户序号与预览相同: 按产品行顺序，每行占数量个序号
+            item_id = 1
+            for line in production.product_line_ids:
+                lines |= line
+                windows.append(engine._line_info(line, item_id))
+                try:
+                    item_id += max(int(float(line.quantity or 0)), 1)
+                except (TypeError, ValueError):
+                    item_id += 1
+        payloads = engine.calculate_windows(windows)
+
+        entries = []
+        skipped = lines.browse()
+        for line, window, payload in zip(lines, windows, payloads):
+            if not payload or payload.get('error'):
+                skipped |= line
+                continue
+            entries.append((line.production_id, line, window, payload))
+
+        computed_lines = lines - skipped
+        # 已删除的产品行的结果也一并清除
+        engine.env['window.calculation.result'].sudo().search([
+            ('production_id', 'in', self.ids),
+            '|', ('window_line_id', 'in', computed_lines.ids), ('window_line_id', 'not in', lines.ids),
+        ]).unlink()
+        if entries:
+            engine._save_results(entries)
+        if computed_lines:
+            computed_lines.production_id._enqueue_artifacts()
+        complete = self.filtered(lambda production: all(engine._is_supported(line) for line in production.product_line_ids))
+        complete.write({'last_calculation_date': fields.Datetime.now(), 'calculation_skipped_date': False})
+        _logger.info(f"服务端计算完成: 订单={len(self)}, 结果={len(entries)}, 跳过={len(skipped)}")
+        return len(entries)
+
+    def action_calculate_windows(self):
+        """手动运行服务端计算"""
+        count = self._calculate_windows()
         return {
-            'type': 'ir.actions.act_url',
-            'url': excel_url,
-            'target': 'self',
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': '计算完成',
+                'message': f'已计算 {count} 个窗户',
+                'sticky': False,
+                'type': 'success'
+            }
         }
 
     def action_set_draft(self):
@@ -603,8 +1126,10 @@ class Production(models.Model):
         return self.write({'state': 'draft'})
     
     def action_set_progress(self):
-        """设置为进行中状态"""
-        return self.write({'state': 'progress'})
+        """设置为进行中状态，并在后台生成下料单文件"""
+        result = self.write({'state': 'progress'})
+        self._enqueue_artifacts()
+        return result
 
     def action_set_done(self):
         """设置为完成状态"""
@@ -613,35 +1138,3 @@ class Production(models.Model):
     def action_set_cancel(self):
         """设置为取消状态"""
         return self.write({'state': 'cancel'})
-
-    @api.depends('total_items', 'capacity')
-    def _compute_progress_percentage(self):
-        """计算完成百分比"""
-        for record in self:
-            if record.capacity and record.capacity > 0:
-                record.progress_percentage = min(100, int((record.total_items * 100) / record.capacity))
-            else:
-                record.progress_percentage = 0
-            
-    @api.depends('progress_percentage')
-    def _compute_completion_color(self):
-        """根据完成度设置颜色"""
-        for record in self:
-            if record.progress_percentage >= 100:
-                record.completion_color = 'success'  # 绿色
-            elif record.progress_percentage >= 75:
-                record.completion_color = 'warning'  # 黄色
-            elif record.progress_percentage >= 50:
-                record.completion_color = 'info'     # 蓝色
-            else:
-                record.completion_color = 'danger'   # 红色 
-
-    @api.depends('total_items', 'capacity')
-    def _compute_calendar_capacity_display(self):
-        """计算用于日历显示的capacity信息"""
-        for record in self:
-            if record.capacity and record.total_items is not None:
-                percentage = min(100, int((record.total_items * 100) / (record.capacity or 1)))
-                record.calendar_capacity_display = f"{record.total_items}/{record.capacity} ({percentage}%)"
-            else:
-                record.calendar_capacity_display = f"{record.total_items or 0} items" 
\ No newline at end of file
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# 发票行变更后延迟运行同步，合并短时间内的连续修改
+SYNC_DELAY_SECONDS = 60
+
+
+class ProductionLineChange(models.Model):
+    """发票行变更队列
+
+    account.move.line 的 create/write/unlink 只登记变更的 (发票, 发票行) 键，
+    由cron合并后只更新对应的产品行，不重建整个生产订单。
+    发票行删除后产品行的外键被置空，所以删除时同时登记关联的产品行ID。
+    """
+    _name = 'rich_production.line.change'
+    _description = 'Invoice Line Change Queue'
+    _order = 'id'
+
+    move_id = fields.Integer('Invoice', required=True, index=True, readonly=True)
+    move_line_id = fields.Integer('Invoice Line', required=True, readonly=True)
+    product_line_id = fields.Integer('Deleted Product Line', required=True, default=0, readonly=True,
+                                     help="发票行删除时关联的产品行，0表示发票行的普通变更")
+
+    # 发票行移到其他发票时新旧发票各登记一次
+    _sql_constraints = [
+        ('move_line_uniq', 'unique(move_line_id, move_id, product_line_id)', '同一发票行只登记一次！')
+    ]
+
+    @api.model
+    def _get_linked_move_ids(self, move_ids):
+        """返回已加入生产订单的发票ID"""
+        if not move_ids:
+            return set()
+        field = self.env['rich_production.production']._fields['invoice_ids']
+        self.env['rich_production.production'].flush_model(['invoice_ids'])
+        self.env.cr.execute(
+            f'SELECT DISTINCT "{field.column2}" FROM "{field.relation}" WHERE "{field.column2}" = ANY(%s)',
+            [list(move_ids)]
+        )
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _register_changes(self, keys, deleted=False):
+        """登记变更的发票行，重复的键自动合并
+
+        Args:
+            keys (list): [(move_id, move_line_id)]
+            deleted (bool): 发票行即将删除，登记关联的产品行
+        """
+        linked = self._get_linked_move_ids({move_id for move_id, line_id in keys})
+        keys = {(move_id, line_id) for move_id, line_id in keys if move_id in linked}
+        if not keys:
+            return 0
+        if deleted:
+            move_by_line = {line_id: move_id for move_id, line_id in keys}
+            self.env['rich_production.line'].flush_model(['invoice_line_id'])
+            self.env.cr.execute(
+                "SELECT invoice_line_id, id FROM rich_production_line WHERE invoice_line_id = ANY(%s)",
+                [list(move_by_line)]
+            )
+            rows = {(move_by_line[line_id], line_id, product_line_id)
+                    for line_id, product_line_id in self.env.cr.fetchall()}
+        else:
+            rows = {(move_id, line_id, 0) for move_id, line_id in keys}
+        if not rows:
+            return 0
+        move_ids, line_ids, product_line_ids = zip(*rows)
+        self.env.cr.execute("""
+            INSERT INTO rich_production_line_change
+                (move_id, move_line_id, product_line_id, create_uid, create_date, write_uid, write_date)
+            SELECT v.move_id, v.move_line_id, v.product_line_id,
+                   %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC'
+              FROM unnest(%s::int[], %s::int[], %s::int[]) AS v(move_id, move_line_id, product_line_id)
+            ON CONFLICT (move_line_id, move_id, product_line_id) DO NOTHING
+        """, [self.env.uid, self.env.uid, list(move_ids), list(line_ids), list(product_line_ids)])
+        self._schedule_apply()
+        return len(rows)
+
+    @api.model
+    def _schedule_apply(self):
+        """每个事务只在提交前触发一次cron"""
+        precommit = self.env.cr.precommit
+        if precommit.data.get('rich_production.line_change_trigger'):
+            return
+        precommit.data['rich_production.line_change_trigger'] = True
+        precommit.add(self._trigger_apply)
+
+    @api.model
+    def _trigger_apply(self):
+        cron = self.env.ref('rich_production.ir_cron_apply_invoice_line_changes', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=fields.Datetime.now() + timedelta(seconds=SYNC_DELAY_SECONDS))
+            # 提交前的回调在ORM刷新之后运行，触发记录需要自己写入
+            self.env.flush_all()
+
+    @api.model
+    def _apply_changes(self):
+        """取出队列中的所有变更，只对受影响的产品行做增量更新
+
+        Returns:
+            int: 处理的发票行数
+        """
+        self.env.cr.execute(
+            "DELETE FROM rich_production_line_change RETURNING move_id, move_line_id, product_line_id")
+        rows = self.env.cr.fetchall()
+        self.invalidate_model()
+        if not rows:
+            return 0
+
+        Production = self.env['rich_production.production']
+        ProductLine = self.env['rich_production.line']
+        # 已删除的发票行只删除登记时关联的产品行，手动添加的产品行不受影响
+        to_unlink = ProductLine.browse({product_line_id for move_id, line_id, product_line_id in rows
+                                        if product_line_id}).exists()
+        changes = {(move_id, line_id) for move_id, line_id, product_line_id in rows if not product_line_id}
+        if not changes:
+            deleted = Production._apply_product_line_diff({}, {}, to_unlink)[2]
+            _logger.info(f"发票行增量同步: 删除={deleted}")
+            return len(rows)
+
+        changed_line_ids = {line_id for move_id, line_id in changes}
+        move_ids = list({move_id for move_id, line_id in changes})
+
+        # 等待整体同步的订单不需要增量更新
+        productions = Production.search([('invoice_ids', 'in', move_ids), ('needs_line_sync', '=', False)])
+        if not productions:
+            Production._apply_product_line_diff({}, {}, to_unlink)
+            return len(rows)
+
+        # 只处理 invoice_line_ids 中的行，与整体同步一致
+        inv_lines = self.env['account.move.line'].browse(changed_line_ids).exists().filtered(
+            lambda line: line.display_type in ('product', 'line_section', 'line_note'))
+        vals_by_line = Production._prepare_product_line_vals(inv_lines)
+        move_by_line = {line.id: line.move_id.id for line in inv_lines}
+
+        # 复用 (invoice_id, invoice_line_id) 键
+        existing = ProductLine.search([
+            ('production_id', 'in', productions.ids),
+            ('invoice_id', 'in', move_ids),
+            ('invoice_line_id', 'in', list(changed_line_ids)),
+        ])
+        existing.fetch(['production_id', 'invoice_line_id'])
+        existing_lines = {(line.production_id.id, line.invoice_line_id.id): line for line in existing}
+
+        # 发票行已删除、已移出该订单的发票或没有产品时不生成新值，现有的产品行被删除
+        vals_by_key = {}
+        for production in productions:
+            production_moves = set(production.invoice_ids.ids)
+            for line_id in changed_line_ids:
+                move_id = move_by_line.get(line_id)
+                line_vals = vals_by_line.get(line_id)
+                if move_id in production_moves and line_vals:
+                    vals_by_key[(production.id, line_id)] = dict(
+                        line_vals, invoice_id=move_id, production_id=production.id)
+
+        updated, created, deleted = Production._apply_product_line_diff(existing_lines, vals_by_key, to_unlink)
+        _logger.info(f"发票行增量同步: 变更={len(changes)}, 更新={updated}, 创建={created}, 删除={deleted}")
+        return len(rows)
+
+    @api.model
+    def _cron_apply_invoice_line_changes(self):
+        self._apply_changes()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from datetime import date, timedelta
+import logging
+import math
+
+_logger = logging.getLogger(__name__)
+
+# 每天的生产线产能(窗户数)，可通过系统参数 rich_production.daily_capacity 调整
+DEFAULT_DAILY_CAPACITY = 100
+
+# 向后查找可用日期的最大天数
+PLANNING_HORIZON_DAYS = 365
+
+
+class DayBucketIndex:
+    """按天记录已占用的产能
+
+    每个批次的数量平均分到它占用的每一天，增删一个批次只改动它自己的几天，
+    调整单个批次时不需要重新排整个计划。
+    """
+
+    def __init__(self, capacity, loads=None):
+        self.capacity = capacity
+        self.loads = dict(loads or {})
+
+    @classmethod
+    def from_json(cls, capacity, loads):
+        return cls(capacity, {fields.Date.to_date(day): load for day, load in (loads or {}).items()})
+
+    def to_json(self):
+        return {fields.Date.to_string(day): round(load, 2) for day, load in sorted(self.loads.items()) if load > 0.005}
+
+    def days_needed(self, items, duration):
+        """批次占用的天数，数量超过单日产能时延长"""
+        needed = math.ceil(items / self.capacity) if self.capacity > 0 else 1
+        return max(duration or 1, needed, 1)
+
+    def add(self, start, days, items, sign=1):
+        per_day = items / days
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            self.loads[day] = self.loads.get(day, 0) + sign * per_day
+
+    def remove(self, start, days, items):
+        self.add(start, days, items, sign=-1)
+
+    def fits(self, start, days, items):
+        per_day = items / days
+        return all(self.loads.get(start + timedelta(days=offset), 0) + per_day <= self.capacity + 1e-6
+                   for offset in range(days))
+
+    def find_start(self, earliest, days, items):
+        """最早的、每天都放得下的开始日期，找不到时返回None"""
+        for offset in range(PLANNING_HORIZON_DAYS):
+            start = earliest + timedelta(days=offset)
+            if self.fits(start, days, items):
+                return start
+        return None
+
+    def overloaded_days(self):
+        return sorted(day for day, load in self.loads.items() if load > self.capacity + 1e-6)
+
+
+class ProductionScheduler(models.AbstractModel):
+    """按交付日期和每日产能给草稿批次排产
+
+    计划结果只返回给日历预览，确认后才写入批次的开始/结束日期。
+    """
+    _name = 'rich_production.scheduler'
+    _description = 'Production Capacity Scheduler'
+
+    @api.model
+    def _get_daily_capacity(self):
+        capacity = self.env['ir.config_parameter'].sudo().get_param(
+            'rich_production.daily_capacity', DEFAULT_DAILY_CAPACITY)
+        try:
+            return max(int(capacity), 1)
+        except (TypeError, ValueError):
+            return DEFAULT_DAILY_CAPACITY
+
+    @api.model
+    def _get_due_dates(self, productions):
+        """每个批次最早的发票交付日期"""
+        due_dates = {}
+        for production in productions:
+            dates = [d for d in (invoice._get_production_due_date() for invoice in production.invoice_ids) if d]
+            due_dates[production.id] = min(dates) if dates else False
+        return due_dates
+
+    @api.model
+    def _get_days(self, index, production):
+        """批次占用的天数，已有批次和排产的批次使用同一算法"""
+        return index.days_needed(production.total_items, production.duration)
+
+    @api.model
+    def _build_index(self, date_from, exclude_ids):
+        """已确定的批次(进行中和不参与排产的草稿)占用的产能"""
+        index = DayBucketIndex(self._get_daily_capacity())
+        fixed = self.env['rich_production.production'].search([
+            ('state', 'in', ('draft', 'progress')),
+            ('stop_date', '>', date_from),
+            ('id', 'not in', list(exclude_ids)),
+        ])
+        for production in fixed:
+            if not production.total_items:
+                continue
+            index.add(production.start_date, self._get_days(index, production), production.total_items)
+        return index
+
+    def _plan_item(self, production, index, due_date, start):
+        days = self._get_days(index, production)
+        stop = start + timedelta(days=days)
+        return {
+            'id': production.id,
+            'title': production.batch_number or production.batch or production.name,
+            'items': production.total_items,
+            'days': days,
+            'start': fields.Date.to_string(start),
+            'stop': fields.Date.to_string(stop),
+            'current_start': fields.Date.to_string(production.start_date),
+            'due': fields.Date.to_string(due_date) if due_date else False,
+            'late': bool(due_date and stop > due_date),
+        }
+
+    @api.model
+    def propose_schedule(self, production_ids=None, date_from=None):
+        """给草稿批次生成排产计划，不写入数据库
+
+        按交付日期从早到晚依次放入最早有产能的日期。
+
+        Args:
+            production_ids (list): 参与排产的批次，默认为所有有数量的草稿批次
+            date_from (str): 最早开始日期，默认今天
+
+        Returns:
+            dict: {'capacity', 'date_from', 'loads': {日期: 占用}, 'items': [...], 'overloaded': [日期]}
+        """
+        date_from = fields.Date.to_date(date_from) if date_from else fields.Date.context_today(self)
+        Production = self.env['rich_production.production']
+        if production_ids:
+            productions = Production.browse(production_ids).exists()
+        else:
+            productions = Production.search([('state', '=', 'draft'), ('total_items', '>', 0)])
+
+        index = self._build_index(date_from, productions.ids)
+        due_dates = self._get_due_dates(productions)
+        ordered = productions.sorted(
+            lambda p: (due_dates[p.id] or date.max, -p.total_items, p.start_date or date.max, p.id))
+
+        items = []
+        for production in ordered:
+            days = self._get_days(index, production)
+            start = index.find_start(date_from, days, production.total_items) or date_from
+            index.add(start, days, production.total_items)
+            items.append(self._plan_item(production, index, due_dates[production.id], start))
+
+        _logger.info(f"排产预览: 批次={len(items)}, 超期={sum(item['late'] for item in items)}")
+        return {
+            'capacity': index.capacity,
+            'date_from': fields.Date.to_string(date_from),
+            'loads': index.to_json(),
+            'items': items,
+            'overloaded': [fields.Date.to_string(day) for day in index.overloaded_days()],
+        }
+
+    @api.model
+    def reschedule(self, proposal, production_id, start):
+        """在预览中移动一个批次，只更新它占用的几天
+
+        Args:
+            proposal (dict): propose_schedule 返回的计划
+            production_id (int): 移动的批次
+            start (str): 新的开始日期
+
+        Returns:
+            dict: 更新后的计划
+        """
+        index = DayBucketIndex.from_json(proposal['capacity'], proposal['loads'])
+        item = next((item for item in proposal['items'] if item['id'] == production_id), None)
+        if not item:
+            raise UserError("批次不在排产计划中")
+        index.remove(fields.Date.to_date(item['start']), item['days'], item['items'])
+
+        start = fields.Date.to_date(start)
+        index.add(start, item['days'], item['items'])
+        stop = start + timedelta(days=item['days'])
+        due_date = fields.Date.to_date(item['due']) if item['due'] else False
+        item.update({
+            'start': fields.Date.to_string(start),
+            'stop': fields.Date.to_string(stop),
+            'late': bool(due_date and stop > due_date),
+        })
+        proposal.update(
+            loads=index.to_json(),
+            overloaded=[fields.Date.to_string(day) for day in index.overloaded_days()],
+        )
+        return proposal
+
+    @api.model
+    def apply_schedule(self, items):
+        """把预览中的日期写入批次，已完成和已取消的批次不移动
+
+        Args:
+            items (list): [{'id', 'start', 'stop'}]
+        """
+        Production = self.env['rich_production.production']
+        productions = Production.browse([item['id'] for item in items]).exists().filtered(
+            lambda production: production.state in ('draft', 'progress'))
+        by_id = {item['id']: item for item in items}
+        # 日期相同的批次合并为一次写入
+        by_dates = {}
+        for production in productions:
+            item = by_id[production.id]
+            by_dates.setdefault((item['start'], item['stop']), []).append(production.id)
+        for (start, stop), ids in by_dates.items():
+            Production.browse(ids).write({'start_date': start, 'stop_date': stop})
+        _logger.info(f"排产已应用: 批次={len(productions)}")
+        return len(productions)
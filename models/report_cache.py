@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import hashlib
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# 报表格式有改动时修改版本号，旧缓存自动失效
+REPORT_CACHE_VERSION = '1'
+
+# 缓存文件总大小上限(MB)，可通过系统参数 rich_production.report_cache_size_mb 调整
+DEFAULT_CACHE_SIZE_MB = 512
+
+
+class ReportCache(models.Model):
+    """已生成的报表文件缓存
+
+    按生产订单的内容指纹(订单、产品行和计算结果的修改时间)缓存xlsx/pdf附件，
+    内容不变时重复下载直接返回已有文件。
+    """
+    _name = 'rich_production.report.cache'
+    _description = 'Rendered Report Cache'
+    _order = 'last_hit desc, id desc'
+
+    production_id = fields.Many2one('rich_production.production', string='Production',
+                                    required=True, index=True, ondelete='cascade', readonly=True)
+    kind = fields.Char('Kind', required=True, readonly=True, help="xlsx、zip、pdf、pdf:grouped、deca:<格式>:<来源> 或 sheet:<工作表名>")
+    fingerprint = fields.Char('Fingerprint', required=True, readonly=True)
+    attachment_id = fields.Many2one('ir.attachment', string='File', required=True, readonly=True)
+    file_size = fields.Integer('Size', readonly=True)
+    last_hit = fields.Datetime('Last Hit', default=fields.Datetime.now, index=True, readonly=True)
+
+    _sql_constraints = [
+        ('kind_fingerprint_uniq', 'unique(production_id, kind, fingerprint)', '同一内容的报表只缓存一次！')
+    ]
+
+    @api.model
+    def _get_fingerprint(self, production):
+        """订单、产品行、计算结果和锯床数据的修改时间与数量的哈希，任何改动都会得到新的指纹"""
+        self.env['rich_production.production'].flush_model()
+        self.env['rich_production.line'].flush_model()
+        self.env['window.calculation.result'].flush_model()
+        self.env['window.deca.data'].flush_model()
+        self.env.cr.execute("""
+            SELECT p.write_date,
+                   (SELECT ROW(COUNT(*), MAX(l.write_date))::text
+                      FROM rich_production_line l WHERE l.production_id = p.id),
+                   (SELECT ROW(COUNT(*), MAX(r.write_date))::text
+                      FROM window_calculation_result r WHERE r.production_id = p.id),
+                   (SELECT ROW(COUNT(*), MAX(d.write_date))::text
+                      FROM window_deca_data d
+                      JOIN window_calculation_result r ON r.id = d.calculation_id
+                     WHERE r.production_id = p.id)
+              FROM rich_production_production p
+             WHERE p.id = %s
+        """, [production.id])
+        state = self.env.cr.fetchone()
+        return hashlib.sha256(repr((REPORT_CACHE_VERSION, production.id, state)).encode()).hexdigest()[:40]
+
+    @api.model
+    def _get_etag(self, production, kind, fingerprint=None):
+        return f"{fingerprint or self._get_fingerprint(production)}-{kind.replace(':', '-')}"
+
+    @api.model
+    def _get_cached(self, production, kind, fingerprint=None):
+        """按当前内容查找已缓存的附件，不生成
+
+        Returns:
+            ir.attachment: 没有缓存时为空
+        """
+        fingerprint = fingerprint or self._get_fingerprint(production)
+        cached = self.search([
+            ('production_id', '=', production.id),
+            ('kind', '=', kind),
+            ('fingerprint', '=', fingerprint),
+        ], limit=1)
+        return cached.attachment_id.exists()
+
+    @api.model
+    def _get_or_render(self, production, kind, render, fingerprint=None):
+        """返回缓存的附件，没有时调用render生成并缓存
+
+        Args:
+            production: 生产订单
+            kind (str): 报表类型
+            render (callable): 生成并返回 ir.attachment
+
+        Returns:
+            ir.attachment
+        """
+        fingerprint = fingerprint or self._get_fingerprint(production)
+        cached = self.search([
+            ('production_id', '=', production.id),
+            ('kind', '=', kind),
+            ('fingerprint', '=', fingerprint),
+        ], limit=1)
+        if cached and cached.attachment_id.exists():
+            cached.last_hit = fields.Datetime.now()
+            return cached.attachment_id
+
+        attachment = render().sudo()
+        # 同一订单同一类型的旧版本不再需要
+        self.search([('production_id', '=', production.id), ('kind', '=', kind)]).unlink()
+        cache = self.create({
+            'production_id': production.id,
+            'kind': kind,
+            'fingerprint': fingerprint,
+            'attachment_id': attachment.id,
+            'file_size': attachment.file_size,
+        })
+        attachment.write({'res_model': self._name, 'res_id': cache.id})
+        self._evict(keep=cache)
+        return attachment
+
+    @api.model
+    def _get_size_limit(self):
+        limit = self.env['ir.config_parameter'].sudo().get_param(
+            'rich_production.report_cache_size_mb', DEFAULT_CACHE_SIZE_MB)
+        try:
+            return max(int(limit), 0) * 1024 * 1024
+        except (TypeError, ValueError):
+            return DEFAULT_CACHE_SIZE_MB * 1024 * 1024
+
+    @api.model
+    def _evict(self, keep=None):
+        """总大小超过上限时淘汰最久未使用的文件，keep为刚生成、需要返回的缓存"""
+        limit = self._get_size_limit()
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT id FROM (
+                SELECT id, SUM(file_size) OVER (ORDER BY last_hit DESC, id DESC) AS total
+                  FROM rich_production_report_cache
+            ) sized
+             WHERE total > %s
+        """, [limit])
+        expired = self.browse([row[0] for row in self.env.cr.fetchall()]) - (keep or self)
+        if expired:
+            _logger.info(f"报表缓存淘汰: 删除={len(expired)}")
+            expired.unlink()
+        return len(expired)
+
+    @api.autovacuum
+    def _gc_report_cache(self):
+        """删除订单被删除后留下的缓存文件"""
+        self.env.cr.execute("""
+            SELECT a.id FROM ir_attachment a
+             WHERE a.res_model = %s
+               AND NOT EXISTS (SELECT 1 FROM rich_production_report_cache c WHERE c.id = a.res_id)
+        """, [self._name])
+        self.env['ir.attachment'].sudo().browse([row[0] for row in self.env.cr.fetchall()]).unlink()
+        self._evict()
+
+    def unlink(self):
+        attachments = self.attachment_id
+        result = super().unlink()
+        attachments.sudo().unlink()
+        return result
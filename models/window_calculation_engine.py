@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import json
+import logging
+import re
+import zlib
+
+from . import xo_ox_engine
+from .calculation_format import format_calculations
+
+_logger = logging.getLogger(__name__)
+
+# 每次运行最多计算的窗户数，可通过系统参数 rich_production.calc_max_windows 调整
+DEFAULT_MAX_WINDOWS = 2000
+
+# 批量计算的事务级咨询锁，避免cron和手动运行重叠
+CALCULATION_LOCK_KEY = zlib.crc32(b'rich_production.batch_calculation')
+
+# 与 static/src/js/style_registry.js 的 STYLE_ALIASES 保持一致
+STYLE_ALIASES = {
+    'XO': 'xo_ox_window',
+    'OX': 'xo_ox_window',
+    'XOX': 'xox_window',
+    'P': 'picture_window',
+    'PICTURE': 'picture_window',
+    'SH': 'sh_window',
+    'SH-P': 'sh_p_window',
+    'H-PP': 'h_pp_window',
+    'H-PPP': 'h_ppp_windows',
+    'V-PP': 'v_pp_window',
+    'P-XO': 'p_xo_ox_window',
+    'P-OX': 'p_xo_ox_window',
+    'XO-P': 'xo_p_ox_p_window',
+    'OX-P': 'xo_p_ox_p_window',
+    'P-PP': 'p_pp_window',
+    'PP-XO': 'pp_xo_ox_window',
+    'PP-OX': 'pp_xo_ox_window',
+    'PP-XOX': 'pp_xox_window',
+    'PPP-XOX': 'ppp_xox_window',
+    'XOX-PP': 'xox_pp_window',
+    'XOX-PPP': 'xox_ppp_window',
+    'XO-PP': 'xo_pp_window',
+    'OX-PP': 'xo_pp_window',
+    'XO-PP-OX-PP': 'xo_pp_ox_pp_window',
+}
+DEFAULT_CALCULATOR = 'xo_ox_window'
+
+_ALIAS_PATTERNS = [
+    (alias, re.compile(r'(^|[^A-Z])' + re.escape(alias) + r'([^A-Z]|$)'))
+    for alias in sorted(STYLE_ALIASES, key=len, reverse=True)
+]
+
+# 服务端已实现的计算器
+SERVER_CALCULATORS = {
+    xo_ox_engine.STYLE_NAME: xo_ox_engine,
+}
+
+
+def normalize_style(style_name):
+    return re.sub(r'[\s_]+', '-', str(style_name or '').strip().upper())
+
+
+def detect_style(product_name):
+    """从产品名称中识别样式，与预览的 detectStyle 相同"""
+    name = normalize_style(product_name)
+    for alias, pattern in _ALIAS_PATTERNS:
+        if pattern.search(name):
+            return alias
+    return ''
+
+
+class WindowCalculationEngine(models.AbstractModel):
+    _name = 'window.calculation.engine'
+    _description = 'Window Calculation Engine'
+
+    @api.model
+    def _get_calculator_name(self, style):
+        return STYLE_ALIASES.get(normalize_style(style), DEFAULT_CALCULATOR)
+
+    @api.model
+    def _line_style(self, line):
+        """按预览的规则从产品名称得到样式"""
+        product_name = line.product_id.name or ''
+        style = detect_style(product_name)
+        if style:
+            return style
+        for keyword, keyword_style in (('XOX', 'XOX'), ('XO', 'XO'), ('OX', 'OX'),
+                                       ('Picture', 'P'), ('Casement', 'C')):
+            if keyword in product_name:
+                return keyword_style
+        return product_name
+
+    @api.model
+    def _line_window(self, line):
+        """产品行 -> 计算器输入，字段与预览一致"""
+        return {
+            'id': line.id,
+            'style': self._line_style(line),
+            'width': line.width or '',
+            'height': line.height or '',
+            'fh': '',
+            'frame': line.frame or '',
+            'glass': line.glass or '',
+            'argon': 'Yes' if line.argon else '',
+            'grid': line.grid or '',
+            'grid_size': line.grid_size or '',
+            'color': line.color or '',
+        }
+
+    @api.model
+    def _line_info(self, line, item_id):
+        """保存结果用的窗户信息: 计算器输入加上客户、备注和预览中的窗户序号"""
+        invoice = line.invoice_id
+        customer = self.env['rich_production.cutting.list.report']._customer_code(
+            invoice.partner_id.name, invoice.id) if invoice else ''
+        return dict(self._line_window(line), id=item_id, line_id=line.id,
+                    customer=customer, note=line.notes or '')
+
+    @api.model
+    def _is_supported(self, line):
+        """产品行的样式是否有服务端计算器"""
+        return self._get_calculator_name(self._line_style(line)) in SERVER_CALCULATORS
+
+    @api.model
+    def _get_compiled_formulas(self, calculator):
+        formulas = self.env['window.calculation.formula'].sudo().search_read(
+            [('style_name', '=', calculator.STYLE_NAME)],
+            ['formula_type', 'formula_string'],
+            order='sequence, id',
+        )
+        return {
+            formula_type: calculator.compile_formulas(
+                [formula['formula_string'] for formula in formulas if formula['formula_type'] == formula_type])
+            for formula_type in ('nailon', 'other')
+        }
+
+    @api.model
+    def calculate_windows(self, windows):
+        """在服务端计算窗户，结果经过计算缓存
+
+        Args:
+            windows (list): 窗户输入字典列表
+
+        Returns:
+            list: 与输入顺序一致的计算结果，服务端不支持的样式为False
+        """
+        results = [False] * len(windows)
+        by_calculator = {}
+        for index, window in enumerate(windows):
+            calculator = SERVER_CALCULATORS.get(self._get_calculator_name(window.get('style')))
+            if calculator:
+                by_calculator.setdefault(calculator, []).append(index)
+
+        memo = self.env['window.calculation.memo'].sudo()
+        for calculator, indexes in by_calculator.items():
+            formulas = self._get_compiled_formulas(calculator)
+            payloads = memo.compute_batch(
+                [windows[index] for index in indexes],
+                lambda window: calculator.to_json_compatible(calculator.process_window_data(window, formulas)),
+            )
+            for index, payload in zip(indexes, payloads):
+                results[index] = payload
+        return results
+
+    @api.model
+    def _get_max_windows(self):
+        limit = self.env['ir.config_parameter'].sudo().get_param(
+            'rich_production.calc_max_windows', DEFAULT_MAX_WINDOWS)
+        try:
+            return max(int(limit), 1)
+        except (TypeError, ValueError):
+            return DEFAULT_MAX_WINDOWS
+
+    @api.model
+    def _find_pending_productions(self):
+        """进行中、且产品行在上次计算之后有增删改的生产订单
+
+        因不支持的样式跳过的订单，产品行再次变化前不再返回
+
+        Returns:
+            list: [(production_id, 窗户数)]，按开始日期排序
+        """
+        self.env['rich_production.production'].flush_model(
+            ['state', 'last_calculation_date', 'lines_changed_date', 'calculation_skipped_date',
+             'start_date', 'needs_line_sync'])
+        self.env['rich_production.line'].flush_model(['production_id', 'quantity'])
+        self.env.cr.execute("""
+            SELECT p.id, COALESCE(SUM(GREATEST(l.quantity, 1)), 0)
+              FROM rich_production_production p
+              LEFT JOIN rich_production_line l ON l.production_id = p.id
+             WHERE p.state = 'progress'
+               AND NOT COALESCE(p.needs_line_sync, false)
+               AND (p.last_calculation_date IS NULL OR p.lines_changed_date > p.last_calculation_date)
+               AND (p.calculation_skipped_date IS NULL OR p.lines_changed_date > p.calculation_skipped_date)
+             GROUP BY p.id, p.start_date
+             ORDER BY p.start_date, p.id
+        """)
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _acquire_lock(self):
+        self.env.cr.execute("SELECT pg_try_advisory_xact_lock(%s)", [CALCULATION_LOCK_KEY])
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def run_pending(self, max_windows=None):
+        """计算所有待计算的生产订单，可在 odoo-bin shell 中直接调用:
+
+            env['window.calculation.engine'].run_pending()
+            env.cr.commit()
+
+        Args:
+            max_windows (int): 本次最多计算的窗户数，默认读取系统参数
+
+        Returns:
+            dict: {'productions': 已计算订单数, 'windows': 窗户数, 'remaining': 剩余订单数,
+                   'skipped': 含服务端不支持样式、未计算的订单ID}
+        """
+        if not self._acquire_lock():
+            _logger.info("批量计算已在运行，跳过本次")
+            return {'productions': 0, 'windows': 0, 'remaining': 0, 'skipped': [], 'locked': True}
+
+        max_windows = max_windows or self._get_max_windows()
+        pending = self._find_pending_productions()
+
+        # 有服务端不支持的样式的订单跳过，由预览计算并保存
+        productions = self.env['rich_production.production'].browse([production_id for production_id, count in pending])
+        supported = set(productions.filtered(
+            lambda production: all(self._is_supported(line) for line in production.product_line_ids)).ids)
+        skipped = [production_id for production_id, count in pending if production_id not in supported]
+        if skipped:
+            _logger.warning(f"批量计算跳过含服务端不支持样式的订单: {skipped}")
+            # 记录跳过时间，产品行再次变化前不再重新检查
+            self.env.cr.execute(
+                "UPDATE rich_production_production SET calculation_skipped_date = now() AT TIME ZONE 'UTC' "
+                "WHERE id IN %s", [tuple(skipped)])
+            productions.invalidate_recordset(['calculation_skipped_date'])
+        pending = [(production_id, count) for production_id, count in pending if production_id in supported]
+
+        # 至少计算一个订单，避免大订单永远排不上
+        selected = []
+        windows = 0
+        for production_id, window_count in pending:
+            if selected and windows + window_count > max_windows:
+                break
+            selected.append(production_id)
+            windows += window_count
+
+        productions = self.env['rich_production.production'].browse(selected)
+        if productions:
+            productions._calculate_windows()
+        remaining = len(pending) - len(selected)
+        _logger.info(f"批量计算完成: 订单={len(selected)}, 窗户={windows}, 剩余订单={remaining}, 跳过={len(skipped)}")
+        return {'productions': len(selected), 'windows': windows, 'remaining': remaining, 'skipped': skipped}
+
+    @api.model
+    def _cron_calculate_pending(self):
+        result = self.run_pending()
+        # 还有剩余时让cron尽快再次运行
+        self.env['ir.cron']._notify_progress(done=result['productions'], remaining=result['remaining'])
+
+    @api.model
+    def _prepare_result_vals(self, production, line, window, payload):
+        """计算结果按预览的格式整理，与 save_calculation 保存的内容相同
+
+        Returns:
+            tuple: (结果vals, calculation_data, 框架片段vals列表)
+        """
+        result_model = self.env['window.calculation.result']
+        calculation_data = format_calculations(window, production.batch_number or '', payload)
+        vals = {
+            'production_id': production.id,
+            'window_line_id': line.id,
+            'item_id': window.get('id'),
+            'result_json': json.dumps(payload),
+            'calculation_data': json.dumps(calculation_data),
+            'style': window.get('style') or '',
+            'frame_type': calculation_data['frameType'],
+            'width': result_model._safe_float(window.get('width')),
+            'height': result_model._safe_float(window.get('height')),
+            'calculation_date': fields.Datetime.now(),
+            'has_cached_data': True,
+        }
+        frames = [{
+            'material': result_model._safe_str(piece.get('material')),
+            'position': result_model._safe_str(piece.get('position')),
+            'length': result_model._safe_float(piece.get('length')),
+            'qty': result_model._safe_int(piece.get('qty')),
+        } for piece in payload.get('frame') or []]
+        return vals, calculation_data, frames
+
+    @api.model
+    def _save_results(self, entries):
+        """批量创建计算结果，明细数据经过与 save_calculation 相同的 _save_details 写入
+
+        框架片段(材料、位置、长度、数量)另外批量写入，下料单和DECA排料读取这些行
+
+        Args:
+            entries (list): [(production, line, window, payload)]，window 带 _line_info 的字段
+        """
+        prepared = [self._prepare_result_vals(*entry) for entry in entries]
+        result_model = self.env['window.calculation.result'].sudo()
+        results = result_model.create([vals for vals, calculation_data, frames in prepared])
+
+        frame_rows = []
+        for result, (vals, calculation_data, frames) in zip(results, prepared):
+            result_model._save_details(result.id, calculation_data, sudo_inst=result_model)
+            frame_rows.extend(dict(row, calculation_id=result.id) for row in frames)
+        if frame_rows:
+            self.env['window.frame.data'].sudo().create(frame_rows)
+        return results
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import hashlib
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# 参与缓存键的窗户输入字段
+MEMO_INPUT_FIELDS = ('style', 'width', 'height', 'frame', 'glass', 'grid', 'grid_size', 'fh')
+
+# 默认最多保留的缓存条目数，可通过系统参数 rich_production.calculation_memo_limit 调整
+DEFAULT_MEMO_LIMIT = 50000
+
+
+class WindowCalculationMemo(models.Model):
+    _name = 'window.calculation.memo'
+    _description = 'Window Calculation Memo'
+    _order = 'last_hit desc, id desc'
+
+    key = fields.Char('Key', required=True, index=True, readonly=True,
+                      help="规范化输入与公式版本的SHA-256哈希")
+    style_name = fields.Char('Style', index=True, readonly=True)
+    formula_version = fields.Char('Formula Version', index=True, readonly=True)
+    inputs_json = fields.Text('Inputs JSON', readonly=True)
+    payload = fields.Text('Payload', readonly=True)
+    hit_count = fields.Integer('Hits', default=0, readonly=True)
+    last_hit = fields.Datetime('Last Hit', default=fields.Datetime.now, index=True, readonly=True)
+    trusted = fields.Boolean('Server Computed', default=False, readonly=True,
+                             help="服务端计算的结果所有用户共用，浏览器写入的结果只对写入的用户有效")
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', '计算缓存键必须唯一！')
+    ]
+
+    @api.model
+    def _normalize_inputs(self, window):
+        """规范化窗户输入，保证相同的窗户得到相同的缓存键"""
+        window = window or {}
+        normalized = {}
+        for name in MEMO_INPUT_FIELDS:
+            value = window.get(name)
+            if name in ('width', 'height', 'fh'):
+                try:
+                    value = round(float(value), 4) if value not in (None, '', False) else ''
+                except (TypeError, ValueError):
+                    value = str(value).strip()
+            elif name in ('grid', 'grid_size'):
+                # 计算器对格子类型和尺寸不区分大小写
+                value = ' '.join(str(value or '').lower().split())
+            else:
+                value = str(value or '').strip()
+            normalized[name] = value
+        return normalized
+
+    @api.model
+    def _get_formula_version(self):
+        """根据当前公式内容生成版本号，公式有任何改动缓存自动失效"""
+        self.env['window.calculation.formula'].flush_model()
+        self.env.cr.execute("""
+            SELECT md5(COALESCE(string_agg(
+                style_name || ':' || formula_type || ':' || COALESCE(sequence, 0) || ':' || formula_string,
+                '|' ORDER BY id), ''))
+            FROM window_calculation_formula
+        """)
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _make_key(self, normalized, formula_version):
+        raw = json.dumps([normalized, formula_version], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @api.model
+    def lookup_batch(self, windows, formula_version=None, trusted_only=False):
+        """批量查询缓存
+
+        浏览器写入的条目只返回给写入的用户，其他用户只能读到服务端计算的结果
+
+        Args:
+            windows (list): 窗户输入字典列表
+            trusted_only (bool): 只使用服务端计算的结果
+
+        Returns:
+            list: 与输入顺序一致的计算结果，未命中的位置为False
+        """
+        if not windows:
+            return []
+        formula_version = formula_version or self._get_formula_version()
+        keys = [self._make_key(self._normalize_inputs(window), formula_version) for window in windows]
+
+        self.env.cr.execute("""
+            SELECT id, key, payload FROM window_calculation_memo
+             WHERE key = ANY(%s) AND (trusted OR (NOT %s AND create_uid = %s))
+        """, [list(set(keys)), trusted_only, self.env.uid])
+        found = {key: (memo_id, payload) for memo_id, key, payload in self.env.cr.fetchall()}
+
+        results = []
+        hits = {}
+        for key in keys:
+            if key not in found:
+                results.append(False)
+                continue
+            memo_id, payload = found[key]
+            try:
+                results.append(json.loads(payload))
+                hits[memo_id] = hits.get(memo_id, 0) + 1
+            except (TypeError, ValueError):
+                results.append(False)
+
+        if hits:
+            # 一条UPDATE更新所有命中的计数器
+            self.env.cr.execute("""
+                UPDATE window_calculation_memo AS m
+                   SET hit_count = m.hit_count + v.hits,
+                       last_hit = now() AT TIME ZONE 'UTC'
+                  FROM unnest(%s::int[], %s::int[]) AS v(id, hits)
+                 WHERE m.id = v.id
+            """, [list(hits), list(hits.values())])
+            self.invalidate_model(['hit_count', 'last_hit'])
+
+        _logger.info(f"计算缓存查询: 请求={len(keys)}, 命中={sum(hits.values())}")
+        return results
+
+    @api.model
+    def store_batch(self, entries, formula_version=None):
+        """批量写入浏览器计算的结果，只对当前用户有效
+
+        Args:
+            entries (list): [{'window': {...}, 'payload': {...}}, ...]
+
+        Returns:
+            int: 新写入的条目数
+        """
+        return self._store_batch(entries, formula_version=formula_version, trusted=False)
+
+    @api.model
+    def _store_batch(self, entries, formula_version=None, trusted=False):
+        """批量写入缓存，用户没有写权限，所有写入都经过这里
+
+        trusted 为True时覆盖相同键的浏览器结果
+        """
+        if not entries:
+            return 0
+        formula_version = formula_version or self._get_formula_version()
+
+        rows = {}
+        for entry in entries:
+            payload = entry.get('payload')
+            if not payload or (isinstance(payload, dict) and payload.get('error')):
+                continue
+            normalized = self._normalize_inputs(entry.get('window'))
+            key = self._make_key(normalized, formula_version)
+            if key in rows:
+                continue
+            rows[key] = (
+                key,
+                normalized.get('style') or '',
+                formula_version,
+                json.dumps(normalized, sort_keys=True),
+                json.dumps(payload),
+            )
+        if not rows:
+            return 0
+
+        if trusted:
+            # 服务端结果替换浏览器写入的同键条目
+            conflict = """DO UPDATE SET payload = EXCLUDED.payload, trusted = true,
+                                     write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+                           WHERE NOT window_calculation_memo.trusted"""
+        else:
+            # 并发写入相同键时直接忽略，不中断事务
+            conflict = "DO NOTHING"
+        self.env.cr.execute(f"""
+            INSERT INTO window_calculation_memo
+                (key, style_name, formula_version, inputs_json, payload, hit_count, last_hit, trusted,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT v.key, v.style_name, v.formula_version, v.inputs_json, v.payload, 0,
+                   now() AT TIME ZONE 'UTC', %s, %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC'
+              FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::text[], %s::text[])
+                   AS v(key, style_name, formula_version, inputs_json, payload)
+            ON CONFLICT (key) {conflict}
+        """, [trusted, self.env.uid, self.env.uid] + [list(column) for column in zip(*rows.values())])
+        created = self.env.cr.rowcount
+        _logger.info(f"计算缓存写入: 新增={created}")
+
+        self._evict_lru()
+        return created
+
+    @api.model
+    def compute_batch(self, windows, compute):
+        """先查缓存，只对未命中的窗户调用compute并写回缓存
+
+        Args:
+            windows (list): 窗户输入字典列表
+            compute (callable): compute(window) -> 计算结果字典
+
+        Returns:
+            list: 与输入顺序一致的计算结果
+        """
+        formula_version = self._get_formula_version()
+        results = self.lookup_batch(windows, formula_version=formula_version, trusted_only=True)
+        computed = {}
+        misses = []
+        for index, window in enumerate(windows):
+            if results[index]:
+                continue
+            local_key = json.dumps(self._normalize_inputs(window), sort_keys=True)
+            if local_key not in computed:
+                computed[local_key] = compute(window)
+                misses.append({'window': window, 'payload': computed[local_key]})
+            results[index] = json.loads(json.dumps(computed[local_key]))
+        if misses:
+            self._store_batch(misses, formula_version=formula_version, trusted=True)
+        return results
+
+    @api.model
+    def _get_memo_limit(self):
+        limit = self.env['ir.config_parameter'].sudo().get_param(
+            'rich_production.calculation_memo_limit', DEFAULT_MEMO_LIMIT)
+        try:
+            return max(int(limit), 0)
+        except (TypeError, ValueError):
+            return DEFAULT_MEMO_LIMIT
+
+    @api.model
+    def _evict_lru(self):
+        """超过上限时淘汰最久未命中的条目"""
+        limit = self._get_memo_limit()
+        self.env.cr.execute("SELECT COUNT(*) FROM window_calculation_memo")
+        overflow = self.env.cr.fetchone()[0] - limit
+        if overflow <= 0:
+            return 0
+        self.env.cr.execute("""
+            DELETE FROM window_calculation_memo
+             WHERE id IN (
+                SELECT id FROM window_calculation_memo
+                 ORDER BY last_hit ASC NULLS FIRST, id ASC
+                 LIMIT %s
+             )
+        """, [overflow])
+        self.invalidate_model()
+        _logger.info(f"计算缓存淘汰: 删除={self.env.cr.rowcount}")
+        return self.env.cr.rowcount
+
+    @api.autovacuum
+    def _gc_calculation_memo(self):
+        """清理公式版本已过期的缓存并执行LRU淘汰"""
+        self.env.cr.execute(
+            "DELETE FROM window_calculation_memo WHERE formula_version != %s",
+            [self._get_formula_version()]
+        )
+        self.invalidate_model()
+        self._evict_lru()
@@ -9,8 +9,13 @@ class WindowCalculationResult(models.Model):
     _description = 'Window Calculation Result'
     
     name = fields.Char('Name', compute='_compute_name', store=True)
-    production_id = fields.Many2one('window.production', string='Production', ondelete='cascade')
+    production_id = fields.Many2one('rich_production.production', string='Production', ondelete='cascade', index=True)
     result_json = fields.Text('Result JSON')
+    calculation_data = fields.Text('Calculation Data', help="格式化后的计算结果，明细表由此生成")
+    style = fields.Char('Style')
+    frame_type = fields.Char('Frame Type')
+    width = fields.Float('Width')
+    height = fields.Float('Height')
     calculation_date = fields.Datetime('Calculation Date', default=fields.Datetime.now)
     
     frame_ids = fields.One2many('window.frame.data', 'calculation_id', string='Frame Data')
@@ -21,11 +26,33 @@ class WindowCalculationResult(models.Model):
     grid_ids = fields.One2many('window.grid.data', 'calculation_id', string='Grid Data')
     general_info_ids = fields.One2many('window.general.info', 'calculation_id', string='General Info')
     label_ids = fields.One2many('window.label.data', 'calculation_id', string='Label Data')
-    window_line_id = fields.Many2one('window.production.line', string='Window Line')
+    window_line_id = fields.Many2one('rich_production.line', string='Window Line', ondelete='cascade', index=True)
+    item_id = fields.Integer('Item ID', index=True, help="预览中的窗户序号，同一订单内唯一，数量大于1的产品行占多个序号")
     deca_ids = fields.One2many('window.deca.data', 'calculation_id', string='DECA Data')
     
     has_cached_data = fields.Boolean(string='有缓存数据', default=False)
     
+    @api.depends('production_id.name', 'window_line_id.display_name')
+    def _compute_name(self):
+        for result in self:
+            parts = [part for part in (result.production_id.name, result.window_line_id.display_name) if part]
+            result.name = ' - '.join(parts) or '计算结果'
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        results = super().create(vals_list)
+        # 计算结果变化后重新生成进行中订单的下料单文件，批量计算时由调用方统一加入队列
+        if not self.env.context.get('rich_production_defer_artifacts'):
+            results.production_id._enqueue_artifacts()
+        return results
+    
+    def unlink(self):
+        productions = self.production_id
+        result = super().unlink()
+        if not self.env.context.get('rich_production_defer_artifacts'):
+            productions.exists()._enqueue_artifacts()
+        return result
+    
     @api.model
     def create_from_json(self, name, result_data, production_id=None, window_line_id=None):
         """从JSON创建计算结果"""
@@ -379,6 +406,7 @@ class WindowCalculationResult(models.Model):
         return {
             'batch': label_data.get('batch', ''),
             'line_id': label_data.get('lineId', ''),
+            'item_id': label_data.get('id', ''),
             'style': label_data.get('style', ''),
             'color': label_data.get('color', ''),
             'customer': label_data.get('customer', ''),
@@ -477,8 +505,15 @@ class WindowCalculationResult(models.Model):
                     # 继续处理下一条记录，不中断整个过程
     
     @api.model
-    def save_calculation(self, window_id, calculation_data):
-        """保存计算结果"""
+    def save_calculation(self, window_id, calculation_data, production_id=None, item_id=None):
+        """保存计算结果
+
+        Args:
+            window_id (int): 产品行ID
+            calculation_data (dict): 格式化后的计算结果
+            production_id (int): 预览的生产订单，产品行必须属于该订单
+            item_id (int): 预览中的窗户序号，同一订单内按序号更新结果
+        """
         if not window_id:
             return {'error': '没有提供窗户ID'}
             
@@ -487,118 +522,54 @@ class WindowCalculationResult(models.Model):
             data_size = len(json.dumps(calculation_data))
             _logger.info(f"保存窗户ID={window_id}的计算结果，数据大小: {data_size} 字节")
             
-            # 使用sudo()提升权限
-            self_sudo = self.sudo()
-            
-            # 尝试将window_id转换为整数并查找相应的窗户行，但如果找不到也继续处理
-            production_id = False
-            window_line = None
-            width = 0
-            height = 0
-            style = ''
-            
-            try:
-                window_line = self.env['rich_production.line'].sudo().browse(int(window_id))
-                if window_line.exists():
-                    _logger.info(f"找到窗户行: window_id={window_id}")
-                    
-                    # 如果窗户行存在，获取相关信息
-                    if hasattr(window_line, 'production_id') and window_line.production_id:
-                        production_id = window_line.production_id.id
-                        
-                    # 安全获取宽高和风格数据
-                    if hasattr(window_line, 'width'):
-                        try:
-                            width = float(window_line.width) if window_line.width else 0
-                        except (ValueError, TypeError):
-                            width = 0
-                    if hasattr(window_line, 'height'):
-                        try:
-                            height = float(window_line.height) if window_line.height else 0
-                        except (ValueError, TypeError):
-                            height = 0
-                    if hasattr(window_line, 'style'):
-                        style = window_line.style or ''
-                else:
-                    _logger.warning(f"找不到指定的窗户行，但会继续创建计算结果: window_id={window_id}")
-            except Exception as e:
-                _logger.warning(f"查找窗户行时出错，但会继续创建计算结果: {str(e)}, window_id={window_id}")
-            
-            # 创建一个数据副本，以避免修改原始数据
-            save_data = {}
-            if isinstance(calculation_data, dict):
-                save_data = calculation_data.copy()
-                
-                # 从计算数据中获取尺寸和风格信息（如果窗户行不存在）
-                if not window_line or not window_line.exists():
-                    if 'width' in save_data:
-                        width = self._safe_float(save_data.get('width'))
-                    if 'height' in save_data:
-                        height = self._safe_float(save_data.get('height'))
-                    if 'style' in save_data:
-                        style = self._safe_str(save_data.get('style'))
-                
-                # 处理格式化数据 - 如果存在则保存，否则忽略
-                if 'frameData' in save_data:
-                    _logger.info(f"窗户ID={window_id} 包含格式化的frame数据")
-                
-                if 'sashData' in save_data:
-                    _logger.info(f"窗户ID={window_id} 包含格式化的sash数据")
-                
-                if 'screenData' in save_data:
-                    _logger.info(f"窗户ID={window_id} 包含格式化的screen数据")
-                
-                if 'partsData' in save_data:
-                    _logger.info(f"窗户ID={window_id} 包含格式化的parts数据")
-                
-                if 'glassData' in save_data:
-                    _logger.info(f"窗户ID={window_id} 包含格式化的glass数据")
-                
-                if 'gridData' in save_data:
-                    _logger.info(f"窗户ID={window_id} 包含格式化的grid数据")
-            else:
+            if not isinstance(calculation_data, dict):
                 _logger.error(f"窗户ID={window_id} 计算数据不是字典类型: {type(calculation_data)}")
                 return {'error': '计算数据格式不正确', 'window_id': window_id}
             
-            # 转换为JSON保存
-            calculation_json = json.dumps(save_data)
+            # 产品行必须存在并属于预览的订单，避免结果挂到其他订单的产品行上
+            window_line = self.env['rich_production.line'].browse(int(window_id)).exists()
+            if not window_line:
+                _logger.warning(f"找不到指定的窗户行: window_id={window_id}")
+                return {'error': '找不到窗户行', 'window_id': window_id}
+            window_line.check_access('read')
+            if production_id and window_line.production_id.id != int(production_id):
+                _logger.warning(f"窗户行不属于生产订单: window_id={window_id}, production_id={production_id}")
+                return {'error': '窗户行不属于该生产订单', 'window_id': window_id}
+            production_id = window_line.production_id.id
+            
+            # 使用sudo()提升权限
+            self_sudo = self.sudo()
+            window_line = window_line.sudo()
+            save_data = calculation_data.copy()
+            window_info = save_data.get('formattedWindowInfo') or {}
+            vals = {
+                'production_id': production_id,
+                'window_line_id': window_line.id,
+                'item_id': self._safe_int(item_id),
+                'style': self._safe_str(window_info.get('style') or save_data.get('style')),
+                'frame_type': save_data.get('frameType', ''),
+                'width': self._safe_float(window_line.width) or self._safe_float(save_data.get('width')),
+                'height': self._safe_float(window_line.height) or self._safe_float(save_data.get('height')),
+                'calculation_data': json.dumps(save_data),
+                'has_cached_data': True,
+            }
             
-            # 创建或更新计算结果记录 - 使用sudo()提升权限
-            calc_result = self_sudo.search([
-                ('window_line_id', '=', window_id)
-            ], limit=1)
+            # 同一订单内按窗户序号更新，没有序号时按产品行更新
+            if item_id:
+                domain = [('production_id', '=', production_id), ('item_id', '=', vals['item_id'])]
+            else:
+                domain = [('window_line_id', '=', window_line.id)]
+            calc_result = self_sudo.search(domain, limit=1)
             
             if calc_result:
                 _logger.info(f"更新窗户ID={window_id}的现有计算结果记录")
-                calc_result.sudo().write({
-                    'calculation_data': calculation_json,
-                    'has_cached_data': True
-                })
+                calc_result.write(vals)
             else:
-                # 创建新记录
                 _logger.info(f"为窗户ID={window_id}创建新的计算结果记录")
-                calc_result = self_sudo.create({
-                    'name': f'计算结果 {window_id}',
-                    'window_line_id': window_id if window_line and window_line.exists() else False,
-                    'production_id': production_id,
-                    'style': style,
-                    'frame_type': save_data.get('frameType', ''),
-                    'width': width,
-                    'height': height,
-                    'calculation_data': calculation_json,
-                    'has_cached_data': True
-                })
+                calc_result = self_sudo.create(dict(vals, name=f'计算结果 {window_id}'))
             
             # 保存各类明细数据 - 传递sudo实例
-            self._save_general_info(calc_result.id, save_data, sudo_inst=self_sudo)
-            self._save_frame_data(calc_result.id, save_data, sudo_inst=self_sudo)
-            self._save_sash_data(calc_result.id, save_data, sudo_inst=self_sudo)
-            self._save_screen_data(calc_result.id, save_data, sudo_inst=self_sudo)
-            self._save_parts_data(calc_result.id, save_data, sudo_inst=self_sudo)
-            self._save_glass_data(calc_result.id, save_data, sudo_inst=self_sudo)
-            self._save_grid_data(calc_result.id, save_data, sudo_inst=self_sudo)
-            self._save_label_data(calc_result.id, save_data, sudo_inst=self_sudo)
-            self._save_welder_data(calc_result.id, save_data, sudo_inst=self_sudo)
+            self._save_details(calc_result.id, save_data, sudo_inst=self_sudo)
             
             _logger.info(f"窗户ID={window_id}的计算结果保存成功")
             # 所有处理成功后才提交事务，不在函数内提交事务，由调用方决定
@@ -607,6 +578,18 @@ class WindowCalculationResult(models.Model):
             _logger.error(f"保存计算结果错误: {str(e)}, 窗户ID: {window_id}")
             return {'error': str(e), 'window_id': window_id}
         
+    def _save_details(self, calc_id, calculation_data, sudo_inst=None):
+        """保存一个计算结果的全部明细数据，浏览器保存和服务端计算共用"""
+        self._save_general_info(calc_id, calculation_data, sudo_inst=sudo_inst)
+        self._save_frame_data(calc_id, calculation_data, sudo_inst=sudo_inst)
+        self._save_sash_data(calc_id, calculation_data, sudo_inst=sudo_inst)
+        self._save_screen_data(calc_id, calculation_data, sudo_inst=sudo_inst)
+        self._save_parts_data(calc_id, calculation_data, sudo_inst=sudo_inst)
+        self._save_glass_data(calc_id, calculation_data, sudo_inst=sudo_inst)
+        self._save_grid_data(calc_id, calculation_data, sudo_inst=sudo_inst)
+        self._save_label_data(calc_id, calculation_data, sudo_inst=sudo_inst)
+        self._save_welder_data(calc_id, calculation_data, sudo_inst=sudo_inst)
+
     @api.model
     def _safe_float(self, value, default=0.0):
         """安全地将值转换为浮点数"""
@@ -1329,7 +1312,7 @@ class WindowCalculationResult(models.Model):
         # 使用事务处理批量保存
         for item in calculation_data_list:
             try:
-                window_id = item.get('windowId')
+                window_id = item.get('lineId') or item.get('windowId')
                 calculations = item.get('calculations', {})
                 
                 if not window_id or not calculations:
@@ -1342,7 +1325,8 @@ class WindowCalculationResult(models.Model):
                     continue
                 
                 # 保存单个计算结果
-                result = self.save_calculation(window_id, calculations)
+                result = self.save_calculation(window_id, calculations,
+                                               production_id=item.get('productionId'), item_id=item.get('itemId'))
                 
                 if result.get('success'):
                     saved_count += 1
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""XO/OX 窗户服务端计算
+
+static/src/js/window_calculations/xo_ox_window.js 的Python移植，
+不依赖odoo，可以脱离服务器单独加载(见 static/tests/golden/run_engine.py)。
+舍入与字符串格式严格按照JS的行为，保证与预览结果一致。
+"""
+
+import ast
+import math
+import operator
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+STYLE_NAME = 'xo_ox_window'
+
+# 公式中可以赋值的变量
+FORMULA_VARIABLES = (
+    'frameWidth', 'frameHeight', 'sashWidth', 'sashHeight',
+    'screenw', 'screenh', 'mullion', 'mullionA', 'handleA', 'track',
+    'sashglassw', 'sashglassh', 'fixedglassw', 'fixedglassh',
+    'sashgridw', 'sashgridh', 'fixedgridw', 'fixedgridh',
+)
+
+NAN = float('nan')
+
+_JS_FLOAT_RE = re.compile(r'^[+-]?(Infinity|(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?)')
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+_CONST_RE = re.compile(r'const\s+([a-zA-Z0-9_]+)\s*=')
+
+
+def parse_float(value):
+    """JS parseFloat: 解析字符串开头的数字，失败返回NaN"""
+    if isinstance(value, bool) or value is None:
+        return NAN
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _JS_FLOAT_RE.match(str(value).lstrip())
+    if not match:
+        return NAN
+    text = match.group(0)
+    if text.endswith('Infinity'):
+        return -math.inf if text.startswith('-') else math.inf
+    return float(text)
+
+
+def js_round(value, decimals):
+    """Math.round(value * 10^decimals) / 10^decimals，.5 向正无穷舍入"""
+    factor = math.pow(10, decimals)
+    scaled = value * factor
+    if math.isnan(scaled) or math.isinf(scaled):
+        return scaled
+    rounded = math.floor(scaled)
+    if scaled - rounded >= 0.5:
+        rounded += 1
+    return rounded / factor
+
+
+def mm_to_inch(mm, decimals=3):
+    return js_round(mm / 25.4, decimals)
+
+
+def to_fixed(value, digits=2):
+    """parseFloat(value).toFixed(digits)"""
+    number = parse_float(value)
+    if math.isnan(number):
+        return 'NaN'
+    if math.isinf(number):
+        return '-Infinity' if number < 0 else 'Infinity'
+    # toFixed 按double的精确值四舍五入，-0 输出为 0
+    quantum = Decimal(1).scaleb(-digits)
+    return str(Decimal(number or 0.0).quantize(quantum, rounding=ROUND_HALF_UP))
+
+
+def _number(value):
+    return NAN if value is None else value
+
+
+def _js_divide(left, right):
+    if right == 0:
+        if left == 0 or math.isnan(left):
+            return NAN
+        return math.copysign(math.inf, left) * math.copysign(1, right)
+    return left / right
+
+
+_FUNCTIONS = {
+    'round': js_round,
+    'mmToInch': mm_to_inch,
+}
+
+
+def _evaluate(node, context):
+    """只允许四则运算、数字、变量和 round/mmToInch 调用"""
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, context)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+            and not isinstance(node.value, bool):
+        return float(node.value)
+    if isinstance(node, ast.Name):
+        # JS中未定义的变量参与运算得到NaN
+        return _number(context.get(node.id))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left = _evaluate(node.left, context)
+        right = _evaluate(node.right, context)
+        if isinstance(node.op, ast.Div):
+            return _js_divide(left, right)
+        return _BINARY_OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand, context))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+            and node.func.id in _FUNCTIONS and not node.keywords:
+        return _FUNCTIONS[node.func.id](*[_evaluate(arg, context) for arg in node.args])
+    raise ValueError(f"不支持的公式语法: {ast.dump(node)}")
+
+
+def compile_formula(formula_string):
+    """把 'const x = expr;' 编译成 (变量名, 表达式AST)"""
+    code = _CONST_RE.sub(r'\1 =', formula_string or '', count=1).strip().rstrip(';').strip()
+    name, sep, expression = code.partition('=')
+    name = name.strip()
+    if not sep or name not in FORMULA_VARIABLES:
+        raise ValueError(f"无法识别的公式: {formula_string}")
+    return name, ast.parse(expression.strip(), mode='eval')
+
+
+def compile_formulas(formula_strings):
+    """编译公式列表，无法编译的公式跳过(与JS中执行失败时一样)"""
+    compiled = []
+    for formula_string in formula_strings:
+        try:
+            compiled.append(compile_formula(formula_string))
+        except (ValueError, SyntaxError):
+            continue
+    return compiled
+
+
+def run_formulas(compiled, width_mm, height_mm):
+    context = dict.fromkeys(FORMULA_VARIABLES)
+    context.update(widthMm=width_mm, heightMm=height_mm)
+    for name, expression in compiled:
+        try:
+            context[name] = _evaluate(expression, context)
+        except (ValueError, TypeError, OverflowError):
+            continue
+    return context
+
+
+# 玻璃类型 -> [(line, qty, glassType)]，line 1为嵌扇玻璃，line 2为固定玻璃
+GLASS_LAYOUTS = {
+    'Clear/Clear': [(1, 2, 'clear'), (2, 2, 'clear')],
+    'Clear/Low-E270': [(1, 1, 'clear'), (1, 2, 'lowe2'), (2, 1, 'clear'), (2, 1, 'lowe2')],
+    'Clear/Low-E366': [(1, 1, 'clear'), (1, 1, 'lowe3'), (2, 1, 'clear'), (2, 1, 'lowe3')],
+    'OBS/Clear': [(1, 1, 'clear'), (1, 1, 'OBS'), (2, 1, 'clear'), (2, 1, 'OBS')],
+    'OBS/Low-E270': [(1, 1, 'lowe2'), (1, 1, 'OBS'), (2, 1, 'lowe2'), (2, 1, 'OBS')],
+    'OBS/Low-E366': [(1, 1, 'lowe3'), (1, 1, 'OBS'), (2, 1, 'lowe3'), (2, 1, 'OBS')],
+    'Clear/Clear Tempered': [(1, 2, 'clear'), (2, 2, 'clear')],
+    'Clear/Low-E270 Tempered': [(1, 1, 'clear'), (1, 1, 'lowe2'), (2, 1, 'clear'), (2, 1, 'lowe2')],
+    'Clear/Low-E366 Tempered': [(1, 1, 'clear'), (1, 1, 'lowe3'), (2, 1, 'clear'), (2, 1, 'lowe3')],
+    'OBS/Clear Tempered': [(1, 1, 'clear'), (1, 1, 'OBS'), (2, 1, 'clear'), (2, 1, 'OBS')],
+    'OBS/Low-E270 Tempered': [(1, 1, 'lowe2'), (1, 1, 'OBS'), (2, 1, 'lowe2'), (2, 1, 'OBS')],
+    'OBS/Low-E366 Tempered': [(1, 1, 'lowe3'), (1, 1, 'OBS'), (2, 1, 'lowe3'), (2, 1, 'OBS')],
+}
+
+
+def get_glass_list(glass_type, context):
+    layout = GLASS_LAYOUTS.get(glass_type, GLASS_LAYOUTS['Clear/Clear'])
+    tempered = 'T' if glass_type in GLASS_LAYOUTS and glass_type.endswith(' Tempered') else ''
+    sizes = {
+        1: (context['sashglassw'], context['sashglassh']),
+        2: (context['fixedglassw'], context['fixedglassh']),
+    }
+    return [{
+        'line': line,
+        'qty': qty,
+        'glassType': kind,
+        'Tmprd': tempered,
+        'Thickness': '3',
+        'width': to_fixed(sizes[line][0]),
+        'height': to_fixed(sizes[line][1]),
+    } for line, qty, kind in layout]
+
+
+def _grid_count(grid_size, letter):
+    match = re.search(r'(\d+)' + letter, str(grid_size), re.IGNORECASE)
+    return int(match.group(1)) if match else 3
+
+
+def get_grid_list(window, context):
+    grid = window.get('grid') or ''
+    grid = grid.lower() if isinstance(grid, str) else ''
+    sizes = {
+        'sashgridw': context['sashgridw'],
+        'sashgridh': context['sashgridh'],
+        'fixedgridw': context['fixedgridw'],
+        'fixedgridh': context['fixedgridh'],
+    }
+    if grid == 'standard':
+        grid_size = window.get('grid_size')
+        squares_w = _grid_count(grid_size, 'w') if grid_size else 3
+        squares_h = _grid_count(grid_size, 'h') if grid_size else 3
+        counts = {
+            'SashWq': squares_h - 1,
+            'holeW1': _js_divide(_number(sizes['sashgridw']), squares_w / 2),
+            'SashHq': squares_w / 2 - 1,
+            'holeH1': _js_divide(_number(sizes['sashgridh']), squares_h),
+            'FixWq': squares_h - 1,
+            'holeW2': _js_divide(_number(sizes['fixedgridw']), squares_w / 2),
+            'FixHq': squares_w / 2 - 1,
+            'holeH2': 32,
+        }
+    elif grid in ('marginal', 'perimeter'):
+        vertical = 2 if grid == 'marginal' else 1
+        counts = {
+            'SashWq': 2, 'holeW1': 102, 'SashHq': vertical, 'holeH1': 70,
+            'FixWq': 2, 'holeW2': 102, 'FixHq': vertical, 'holeH2': 102,
+        }
+    else:
+        return []
+    return [{
+        'sashgridw': sizes['sashgridw'],
+        'SashWq': counts['SashWq'],
+        'holeW1': counts['holeW1'],
+        'sashgridh': sizes['sashgridh'],
+        'SashHq': counts['SashHq'],
+        'holeH1': counts['holeH1'],
+        'fixedgridw': sizes['fixedgridw'],
+        'FixWq': counts['FixWq'],
+        'holeW2': counts['holeW2'],
+        'fixedgridh': sizes['fixedgridh'],
+        'FixHq': counts['FixHq'],
+        'holeH2': counts['holeH2'],
+    }]
+
+
+def _pieces(rows, context):
+    return [{'material': material, 'position': position, 'length': context[name], 'qty': qty}
+            for material, position, name, qty in rows]
+
+
+NAILON_FRAME = [
+    ('82-10', '--', 'frameWidth', 2),
+    ('82-10', '|', 'frameHeight', 2),
+    ('82-01', '--', 'frameWidth', 2),
+    ('82-01', '|', 'frameHeight', 2),
+]
+
+OTHER_FRAMES = {
+    'Retrofit': [
+        ('82-02', '--', 'frameWidth', 2),
+        ('82-02', '|', 'frameHeight', 2),
+    ],
+    'Block': [
+        ('82-01', '--', 'frameWidth', 2),
+        ('82-01', '|', 'frameHeight', 2),
+        ('82-01', '--', 'frameWidth', 2),
+        ('82-01', '|', 'frameHeight', 2),
+    ],
+    'Block-slope': [
+        ('82-02B', '--', 'frameWidth', 1),
+        ('82-01', '--', 'frameHeight', 1),
+        ('82-01', '|', 'frameHeight', 2),
+    ],
+}
+
+SASH = [
+    ('82-03', '--', 'sashWidth', 2),
+    ('82-03', '|', 'sashHeight', 1),
+    ('82-05', '|', 'sashHeight', 1),
+]
+
+SCREEN = [
+    ('screenw', '--', 'screenw', 2),
+    ('screenh', '|', 'screenh', 2),
+]
+
+PARTS = [
+    ('mullion', '|', 'mullion', 1),
+    ('mullion aluminum', '|', 'mullionA', 1),
+    ('handle aluminum', '|', 'handleA', 1),
+    ('track', '--', 'track', 1),
+]
+
+
+def is_nailon(window):
+    style = window.get('style')
+    frame = window.get('frame')
+    return (isinstance(style, str) and style.strip().lower() == 'nailon') or \
+        (isinstance(frame, str) and frame.strip().lower() == 'nailon')
+
+
+def process_window_data(window, formulas):
+    """计算单个窗户，对应JS的processWindowData
+
+    Args:
+        window (dict): 窗户数据(width, height, frame, glass, grid, grid_size, style)
+        formulas (dict): {'nailon': [已编译公式], 'other': [已编译公式]}
+
+    Returns:
+        dict: 与JS相同结构的计算结果
+    """
+    nailon = is_nailon(window)
+    compiled = formulas.get('nailon' if nailon else 'other') or []
+    if not compiled:
+        result = {'error': '未找到计算公式'}
+        if nailon:
+            result['frameType'] = 'Nailon'
+        return result
+
+    width_mm = parse_float(window.get('width')) * 25.4
+    height_mm = parse_float(window.get('height')) * 25.4
+    context = run_formulas(compiled, width_mm, height_mm)
+
+    frame = window.get('frame')
+    frame_rows = NAILON_FRAME if nailon else OTHER_FRAMES.get(frame, [])
+    return {
+        'frameWidth': context['frameWidth'],
+        'frameHeight': context['frameHeight'],
+        'frame': _pieces(frame_rows, context),
+        'frameType': 'Nailon' if nailon else frame,
+        'sash': _pieces(SASH, context),
+        'screen': _pieces(SCREEN, context),
+        'parts': _pieces(PARTS, context),
+        'glassList': get_glass_list(window.get('glass'), context),
+        'gridList': get_grid_list(window, context),
+    }
+
+
+def to_json_compatible(value):
+    """按JSON.stringify的规则转换: 去掉undefined(None)键，NaN/Infinity变为null，整数值不带小数"""
+    if isinstance(value, dict):
+        return {key: to_json_compatible(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [None if item is None else to_json_compatible(item) for item in value]
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return None
+        if value.is_integer() and abs(value) < 2 ** 53:
+            return int(value)
+    return value
@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
-from . import cutting_list_report 
\ No newline at end of file
+from . import cutting_list_report 
+from . import combined_export
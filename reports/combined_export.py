@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, Command
+from odoo.exceptions import UserError
+import logging
+
+from .cutting_list_report import DECA_HEADERS, ReportData
+
+_logger = logging.getLogger(__name__)
+
+
+class CombinedExport(models.TransientModel):
+    """按日期范围或批次合并导出下料单
+
+    所有订单的数据批量读取，框架片段跨订单一起排料，
+    生成一个Excel工作簿和一个DECA机器文件。
+    """
+    _name = 'rich_production.combined.export'
+    _description = 'Combined Cutting List Export'
+
+    export_by = fields.Selection([
+        ('date', 'Date Range'),
+        ('batch', 'Batches'),
+    ], string='Export By', default='date', required=True)
+    date_from = fields.Date(string='From', default=fields.Date.context_today)
+    date_to = fields.Date(string='To', default=fields.Date.context_today)
+    production_ids = fields.Many2many('rich_production.production', string='Batches')
+    workbook_attachment_id = fields.Many2one('ir.attachment', string='Workbook', readonly=True)
+    deca_attachment_id = fields.Many2one('ir.attachment', string='DECA File', readonly=True)
+    deca_checksum = fields.Text(related='deca_attachment_id.description', string='DECA SHA-256')
+    production_count = fields.Integer(string='Productions', readonly=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('done', 'Done'),
+    ], default='draft')
+
+    @api.model
+    def default_get(self, fields_list):
+        values = super().default_get(fields_list)
+        if self.env.context.get('active_model') == 'rich_production.production':
+            values['export_by'] = 'batch'
+            values['production_ids'] = [Command.set(self.env.context.get('active_ids', []))]
+        return values
+
+    def unlink(self):
+        attachments = self.workbook_attachment_id | self.deca_attachment_id
+        result = super().unlink()
+        attachments.sudo().unlink()
+        return result
+
+    def _get_productions(self):
+        """要导出的订单，按开始日期和批次号排序"""
+        if self.export_by == 'batch':
+            productions = self.production_ids
+        else:
+            if not self.date_from or not self.date_to:
+                raise UserError("请选择日期范围")
+            if self.date_to < self.date_from:
+                raise UserError("结束日期不能早于开始日期")
+            productions = self.env['rich_production.production'].search([
+                ('start_date', '<=', self.date_to),
+                ('stop_date', '>=', self.date_from),
+                ('state', '!=', 'cancel'),
+            ])
+        return productions.sorted(lambda p: (p.start_date, p.batch_number or '', p.id))
+
+    def action_export(self):
+        self.ensure_one()
+        productions = self._get_productions()
+        if not productions:
+            raise UserError("没有需要导出的生产订单")
+
+        Report = self.env['rich_production.cutting.list.report']
+        collected = Report._collect_reports_data(productions)
+        snapshots = [collected[production.id] for production in productions]
+        combined = ReportData(
+            production_id=False,
+            batch_number=', '.join(data.batch_number for data in snapshots if data.batch_number),
+            lines=tuple(line for data in snapshots for line in data.lines),
+            windows=tuple(window for data in snapshots for window in data.windows),
+            welders=tuple(welder for data in snapshots for welder in data.welders),
+        )
+        deca_rows = Report._nest_deca_rows(snapshots)
+
+        if self.export_by == 'date':
+            suffix = f"{self.date_from}_{self.date_to}"
+        else:
+            suffix = fields.Date.to_string(fields.Date.context_today(self))
+        workbook = Report._build_workbook_attachment(
+            f"Cutting_List_{suffix}.xlsx",
+            lambda wb: Report._write_combined_workbook(wb, combined, deca_rows),
+            owner=self)
+
+        deca = Report._write_deca_attachment(f"DECA_{suffix}.csv", 'deca_csv', DECA_HEADERS, deca_rows, owner=self)
+
+        (self.workbook_attachment_id | self.deca_attachment_id).sudo().unlink()
+        self.write({
+            'workbook_attachment_id': workbook.id,
+            'deca_attachment_id': deca.id,
+            'production_count': len(productions),
+            'state': 'done',
+        })
+        _logger.info(f"合并导出完成: 订单={len(productions)}, DECA行={len(deca_rows)}")
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def _download(self, attachment):
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f"/web/content/{attachment.id}?download=true",
+            'target': 'self',
+        }
+
+    def action_download_workbook(self):
+        self.ensure_one()
+        return self._download(self.workbook_attachment_id)
+
+    def action_download_deca(self):
+        self.ensure_one()
+        return self._download(self.deca_attachment_id)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import io
+import logging
+from functools import lru_cache
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, Spacer, PageBreak
+except ImportError:
+    colors = None
+
+_logger = logging.getLogger(__name__)
+
+HEADERS = ['Customer', 'ID', 'Style', 'W', 'H', 'FH', 'Frame', 'Glass', 'Argon', 'Grid', 'Color', 'Note', 'ID']
+GROUPED_HEADERS = ['Customer', 'ID', 'Style', 'W', 'H', 'FH', 'Frame', 'Glass', 'Argon', 'Grid', 'Color', 'Note', 'Qty']
+
+# 固定行高，分页时不需要逐行测量
+ROW_HEIGHT = 14
+HEADER_HEIGHT = 18
+
+
+@lru_cache(maxsize=1)
+def _table_style():
+    """所有分页表格共用同一个样式，样式范围与行数无关"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 1),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+    ])
+
+
+@lru_cache(maxsize=1)
+def _title_style():
+    return ParagraphStyle(
+        'CuttingListTitle',
+        parent=getSampleStyleSheet()['Title'],
+        fontSize=16,
+        alignment=1,  # 居中
+        spaceAfter=12,
+    )
+
+
+def _col_widths():
+    return [2.4*cm, 1*cm, 1.2*cm, 1.2*cm, 1.2*cm, 0.8*cm, 1.8*cm, 1.8*cm, 1.1*cm, 1.2*cm, 1.4*cm, 3*cm, 1*cm]
+
+
+def _line_cells(line):
+    return [
+        line.customer, line.style, line.width, line.height, '', line.frame,
+        line.glass, 'Yes' if line.argon else '', line.grid, line.color, line.notes,
+    ]
+
+
+def iter_rows(lines, grouped=False):
+    """逐行生成表格数据
+
+    Args:
+        lines: ReportLine 元组
+        grouped (bool): 按产品行合并数量，ID显示为范围
+
+    Yields:
+        list: 一行单元格
+    """
+    item_id = 1
+    for line in lines:
+        cells = _line_cells(line)
+        if grouped:
+            last_id = item_id + line.quantity - 1
+            ids = str(item_id) if last_id == item_id else f"{item_id}-{last_id}"
+            yield [cells[0], ids] + cells[1:] + [line.quantity]
+            item_id = last_id + 1
+            continue
+        for i in range(line.quantity):
+            yield [cells[0], item_id] + cells[1:] + [item_id]
+            item_id += 1
+
+
+def _chunks(rows, first_size, size):
+    """按每页行数切分，第一页扣除标题占用的高度"""
+    chunk = []
+    limit = first_size
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= limit:
+            yield chunk
+            chunk = []
+            limit = size
+    if chunk:
+        yield chunk
+
+
+def render_cutting_list_pdf(data, grouped=False):
+    """用ReportLab生成下料单PDF
+
+    每页一个 LongTable，行高固定，按页面高度预先切分行，
+    布局时不需要拆分大表格，行数很多时耗时和内存都随页数线性增长。
+
+    Args:
+        data (ReportData): 报表数据快照
+        grouped (bool): 每个产品行只占一行，显示数量
+
+    Returns:
+        bytes: PDF内容
+    """
+    if colors is None:
+        raise ImportError("reportlab is required to render the cutting list PDF")
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                            leftMargin=1*cm, rightMargin=1*cm,
+                            topMargin=1*cm, bottomMargin=1*cm,
+                            title=f"Cutting List {data.batch_number}")
+
+    title = Paragraph(f"Cutting List - {data.batch_number}", _title_style())
+    spacer = Spacer(1, 0.5*cm)
+    title_height = title.wrap(doc.width, doc.height)[1] + _title_style().spaceAfter + 0.5*cm
+    # 留出一点余量，避免边框和内边距使最后一行溢出到下一页
+    usable = doc.height - HEADER_HEIGHT - 6
+    rows_per_page = max(int(usable // ROW_HEIGHT), 1)
+    first_page_rows = max(int((usable - title_height) // ROW_HEIGHT), 1)
+
+    headers = GROUPED_HEADERS if grouped else HEADERS
+    widths = _col_widths()
+    elements = [title, spacer]
+    pages = 0
+    for chunk in _chunks(iter_rows(data.lines, grouped), first_page_rows, rows_per_page):
+        if pages:
+            elements.append(PageBreak())
+        table = LongTable([headers] + chunk, colWidths=widths,
+                          rowHeights=[HEADER_HEIGHT] + [ROW_HEIGHT] * len(chunk), repeatRows=1)
+        table.setStyle(_table_style())
+        elements.append(table)
+        pages += 1
+    if not pages:
+        table = LongTable([headers, ['No data'] + [''] * (len(headers) - 1)], colWidths=widths, repeatRows=1)
+        table.setStyle(_table_style())
+        elements.append(table)
+
+    doc.build(elements)
+    pdf_content = buffer.getvalue()
+    buffer.close()
+    _logger.info(f"ReportLab生成PDF: 页数={max(pages, 1)}, 合并数量={grouped}, 大小={len(pdf_content)} 字节")
+    return pdf_content
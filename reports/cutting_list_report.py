@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import base64
-import io
 import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import namedtuple
 from datetime import datetime
 
 try:
@@ -13,8 +17,56 @@ except ImportError:
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
+from .cutting_list_pdf import render_cutting_list_pdf
+from .cutting_nesting import DEFAULT_MATERIAL_LENGTH, deca_barcode, nest_pieces
+from .deca_writer import DECA_FORMATS, STORED_DECA_COLUMNS, iter_stored_deca_rows, write_deca_file
+
 _logger = logging.getLogger(__name__)
 
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 单个工作表: 名称 -> (工作表标题, 文件名前缀, 填充方法)
+# 标题为None时填充方法自己创建工作表
+SINGLE_SHEETS = {
+    'general_info': (None, 'General_Info', '_create_general_info_sheet'),
+    'sash_welder': (None, 'Sash_Welder', '_create_sash_welder_sheet'),
+    'frame_data': ('Frame Data', 'Frame_Data', '_setup_frame_data_sheet'),
+    'sash_data': ('Sash Data', 'Sash_Data', '_setup_sash_data_sheet'),
+    'screen_data': ('Screen Data', 'Screen_Data', '_setup_screen_data_sheet'),
+    'parts_data': ('Parts Data', 'Parts_Data', '_setup_parts_data_sheet'),
+    'grid_data': ('Grid Data', 'Grid_Data', '_setup_grid_data_sheet'),
+    'glass_data': ('Glass Data', 'Glass_Data', '_setup_glass_data_sheet'),
+    'deca_data': ('DECA Data', 'DECA_Data', '_setup_deca_data_sheet'),
+}
+
+# 完整下料单包含的工作表
+FULL_WORKBOOK_SHEETS = ('general_info', 'sash_welder', 'deca_data')
+
+# 报表数据快照，所有工作表都从同一份数据生成
+ReportData = namedtuple('ReportData', 'production_id batch_number lines windows welders')
+ReportLine = namedtuple('ReportLine', 'id customer style quantity width height frame glass argon grid color notes')
+ReportWindow = namedtuple('ReportWindow', 'result_id item_id customer style width height frame glass argon grid color frames')
+FramePiece = namedtuple('FramePiece', 'material position length qty')
+WelderRow = namedtuple('WelderRow', 'customer item_id style width height sash_w sash_h pieces')
+
+GENERAL_INFO_FIELDS = ['calculation_id', 'item_id', 'customer', 'style', 'width', 'height',
+                       'frame', 'glass', 'argon', 'grid', 'color']
+
+# 排料用的框架片段，window为所属的 ReportWindow
+DecaPiece = namedtuple('DecaPiece', 'material position length qty batch_number window')
+
+DECA_POSITIONS = {'--': 'TOP+BOTTOM', '|': 'LEFT+RIGHT'}
+
+# 锯床文件的数据来源: 已保存的 window.deca.data，或按当前计算结果重新排料
+DECA_SOURCES = ('stored', 'nested')
+
+# DECA机器文件的列，与下料单预览导出的CSV相同
+DECA_HEADERS = ['Batch No', 'Order No', 'Order Item', 'Material Name', 'Cutting ID', 'Pieces ID', 'Length',
+                'Angles', 'Qty', 'Bin No', 'Cart No', 'Position', 'Label Print', 'Barcode No', 'PO No',
+                'Style', 'Frame', 'Product Size', 'Color', 'Grid', 'Glass', 'Argon', 'Painting',
+                'Product D Balance', 'Shift', 'Ship date', 'Note', 'Customer']
+
+
 class CuttingListReport(models.TransientModel):
     _name = 'rich_production.cutting.list.report'
     _description = 'Cutting List Report'
@@ -22,6 +74,8 @@ class CuttingListReport(models.TransientModel):
     production_id = fields.Many2one('rich_production.production', string='Production', required=True)
     report_file = fields.Binary('Report File', readonly=True)
     report_filename = fields.Char('Report Filename', readonly=True)
+    # 流式生成的Excel文件，保存在文件存储中
+    report_attachment_id = fields.Many2one('ir.attachment', string='Report Attachment', readonly=True)
     state = fields.Selection([
         ('draft', 'Draft'),
         ('done', 'Done'),
@@ -34,42 +88,427 @@ class CuttingListReport(models.TransientModel):
             rec.generate_report()
         return rec
 
-    def generate_report(self):
-        """生成Excel格式的下料单报表"""
-        self.ensure_one()
-        _logger = logging.getLogger(__name__)
-        
+    def unlink(self):
+        # 临时报表被清理时一并删除生成的文件
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name), ('res_id', 'in', self.ids)])
+        result = super().unlink()
+        attachments.unlink()
+        return result
+
+    def _build_workbook_attachment(self, filename, write_sheets, owner=None):
+        """用 constant_memory 模式把工作簿写入临时文件，再保存为附件
+
+        工作表按行顺序写出后即落盘，内存占用与行数无关
+
+        Args:
+            filename (str): 附件文件名
+            write_sheets (callable): 接收workbook并写入工作表
+            owner: 附件所属的记录，默认为当前报表
+
+        Returns:
+            ir.attachment: 生成的附件
+        """
+        if owner is None:
+            self.ensure_one()
         if not xlsxwriter:
             raise UserError(_("You need to install the xlsxwriter Python library."))
-        
-        production = self.production_id
-        
-        # 创建内存中的Excel工作簿
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        
-        # 创建不同的工作表
-        self._create_general_info_sheet(workbook, production)
-        self._create_sash_welder_sheet(workbook, production)
-        
-        # 创建DECA数据工作表
-        deca_worksheet = workbook.add_worksheet('DECA Data')
+
+        fd, path = tempfile.mkstemp(prefix='rich_production_', suffix='.xlsx')
+        os.close(fd)
+        try:
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': tempfile.gettempdir()})
+            try:
+                write_sheets(workbook)
+            finally:
+                workbook.close()
+            return self._store_file_attachment(path, filename, XLSX_MIMETYPE, owner=owner)
+        finally:
+            os.unlink(path)
+
+    def _store_file_attachment(self, path, filename, mimetype, owner=None, description=None):
+        """把磁盘上的文件保存为附件
+
+        通过 ir.attachment 的公开接口保存，存储方式、校验值去重和访问检查都由附件模型处理
+        """
+        owner = self if owner is None else owner
+        with open(path, 'rb') as f:
+            raw = f.read()
+        vals = {
+            'name': filename,
+            'type': 'binary',
+            'raw': raw,
+            'mimetype': mimetype,
+            'res_model': owner._name,
+            'res_id': owner.id,
+        }
+        if description:
+            vals['description'] = description
+        return self.env['ir.attachment'].sudo().create(vals)
+
+    @api.model
+    def _line_style(self, product_name):
+        """从产品名称中提取风格类型，如XO, XOX"""
+        for keyword, style in (('XOX', 'XOX'), ('XO', 'XO'), ('OX', 'OX'), ('Picture', 'P'), ('Casement', 'C')):
+            if keyword in product_name:
+                return style
+        return product_name
+
+    @api.model
+    def _customer_code(self, customer, invoice_id):
+        """客户名称太长时截取前8个字符加发票编号"""
+        if customer and len(customer) > 10:
+            return customer[:8] + str(invoice_id % 100000)
+        return customer or ''
+
+    def _collect_report_data(self, production):
+        """读取单个生产订单的报表数据快照"""
+        return self._collect_reports_data(production)[production.id]
+
+    @api.model
+    def _collect_reports_data(self, productions):
+        """用固定数量的批量查询读取报表需要的全部数据
+
+        产品行、计算结果、常规信息、框架和焊接数据各一次读取，与订单数量无关，
+        结果转换为元组，工作表生成时不再访问数据库
+
+        Returns:
+            dict: {生产ID: ReportData}
+        """
+        ProductLine = self.env['rich_production.line']
+        line_fields = ['production_id', 'product_id', 'invoice_id', 'quantity', 'width', 'height', 'frame',
+                       'glass', 'argon', 'grid', 'color', 'notes']
+        lines = ProductLine.search_fetch([('production_id', 'in', productions.ids)], line_fields)
+        lines.product_id.fetch(['name'])
+        lines.invoice_id.fetch(['partner_id'])
+        lines.invoice_id.partner_id.fetch(['name'])
+
+        report_lines = {production.id: [] for production in productions}
+        for line in lines:
+            try:
+                quantity = int(float(line.quantity or 0))
+            except (ValueError, TypeError) as e:
+                _logger.warning(f"转换产品行ID {line.id} 的数量失败: {e}")
+                quantity = 0
+            invoice = line.invoice_id
+            report_lines[line.production_id.id].append(ReportLine(
+                id=line.id,
+                customer=self._customer_code(invoice.partner_id.name, invoice.id) if invoice else '',
+                style=self._line_style(line.product_id.name or ''),
+                quantity=max(1, quantity),
+                width=line.width or '',
+                height=line.height or '',
+                frame=line.frame or '',
+                glass=line.glass or '',
+                argon=line.argon or False,
+                grid=line.grid or '',
+                color=line.color or '',
+                notes=line.notes or '',
+            ))
+
+        result_productions = {
+            result['id']: result['production_id']
+            for result in self.env['window.calculation.result'].search_read(
+                [('production_id', 'in', productions.ids)], ['production_id'], order='id', load=None)
+        }
+        domain = [('calculation_id', 'in', list(result_productions))]
+        infos = {}
+        for info in self.env['window.general.info'].search_read(domain, GENERAL_INFO_FIELDS, order='id', load=None):
+            infos.setdefault(info['calculation_id'], info)
+        frames = {}
+        for frame in self.env['window.frame.data'].search_read(
+                domain, ['calculation_id', 'material', 'position', 'length', 'qty'], order='id', load=None):
+            frames.setdefault(frame['calculation_id'], []).append(FramePiece(
+                frame['material'] or '', frame['position'] or '', frame['length'] or 0, frame['qty'] or 0))
+        welders = {production.id: [] for production in productions}
+        for welder in self.env['window.welder.data'].search_read(
+                domain, ['calculation_id', 'customer', 'item_id', 'style', 'width', 'height',
+                         'sash_width', 'sash_height', 'pieces'], order='id', load=None):
+            welders[result_productions[welder['calculation_id']]].append(WelderRow(
+                welder['customer'] or '', welder['item_id'] or '', welder['style'] or '',
+                welder['width'] or '', welder['height'] or '',
+                welder['sash_width'] or 0, welder['sash_height'] or 0, welder['pieces'] or 1))
+
+        windows = {production.id: [] for production in productions}
+        for result_id, production_id in result_productions.items():
+            info = infos.get(result_id) or {}
+            windows[production_id].append(ReportWindow(
+                result_id=result_id,
+                item_id=info.get('item_id') or '',
+                customer=info.get('customer') or '',
+                style=info.get('style') or '',
+                width=info.get('width') or 0,
+                height=info.get('height') or 0,
+                frame=info.get('frame') or '',
+                glass=info.get('glass') or '',
+                argon=info.get('argon') or False,
+                grid=info.get('grid') or '',
+                color=info.get('color') or '',
+                frames=tuple(frames.get(result_id, ())),
+            ))
+
+        _logger.info(f"报表数据: 订单={len(productions)}, 产品行={len(lines)}, "
+                     f"计算结果={len(result_productions)}")
+        return {
+            production.id: ReportData(
+                production_id=production.id,
+                batch_number=production.batch_number or '',
+                lines=tuple(report_lines[production.id]),
+                windows=tuple(windows[production.id]),
+                welders=tuple(welders[production.id]),
+            )
+            for production in productions
+        }
+
+    @api.model
+    def _get_material_lengths(self, materials):
+        """材料标准长度，匹配规则与 material.config 的 get_material_length 相同，只查询一次"""
+        configs = self.env['rich_production.material.config'].search_fetch([], ['material_id', 'length'])
+        lengths = {}
+        for material in materials:
+            prefix = material.lower()
+            config = next((c for c in configs if (c.material_id or '').lower().startswith(prefix)), None)
+            lengths[material] = config.length if config else DEFAULT_MATERIAL_LENGTH
+        return lengths
+
+    @api.model
+    def _nest_deca_rows(self, snapshots):
+        """把多个订单的框架片段按材料一起排料
+
+        Args:
+            snapshots (list): ReportData
+
+        Returns:
+            list: DECA行，列与 DECA_HEADERS 相同，按材料、切割ID、片段ID排序
+        """
+        pieces = {}
+        for data in snapshots:
+            for window in data.windows:
+                for frame in window.frames:
+                    if not frame.material or not frame.position or not frame.length:
+                        continue
+                    pieces.setdefault(frame.material, []).append(DecaPiece(
+                        frame.material, DECA_POSITIONS.get(frame.position, frame.position),
+                        frame.length, frame.qty or 1, data.batch_number, window))
+
+        lengths = self._get_material_lengths(list(pieces))
+        rows = []
+        cutting_id = 1
+        for material in sorted(pieces):
+            nested, cutting_id = nest_pieces(pieces[material], lengths[material], cutting_id)
+            for item in nested:
+                piece, window = item.piece, item.piece.window
+                order_item = window.item_id or window.result_id
+                rows.append([
+                    piece.batch_number, piece.batch_number, order_item, material,
+                    item.cutting_id, item.pieces_id, piece.length, '90/90', piece.qty,
+                    item.cutting_id, item.cutting_id, piece.position, '',
+                    deca_barcode(piece.batch_number, order_item, material, item.cutting_id, item.pieces_id), '',
+                    window.style, window.frame, f"{window.width}x{window.height}", window.color,
+                    window.grid, window.glass, 'Yes' if window.argon else 'No',
+                    '', '', '', '', '', window.customer,
+                ])
+        _logger.info(f"排料完成: 材料={len(pieces)}, 片段={len(rows)}, 整料={cutting_id - 1}")
+        return rows
+
+    @api.model
+    def _get_label_barcodes(self, productions):
+        """窗户标签上的条码: 窗户第一个框架片段的DECA barcodeNo
+
+        已保存DECA数据的订单使用保存的条码，与发给锯床的文件一致；其余订单按当前计算结果排料
+
+        Returns:
+            dict: {(production_id, 窗户ID): 条码}
+        """
+        self.env['window.deca.data'].flush_model()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (r.production_id, d.order_item) r.production_id, d.order_item, d.barcode_no
+              FROM window_deca_data d
+              JOIN window_calculation_result r ON r.id = d.calculation_id
+             WHERE r.production_id = ANY(%s) AND d.barcode_no IS NOT NULL
+             ORDER BY r.production_id, d.order_item, d.material_name, d.cutting_id_pieces_id, d.id
+        """, [productions.ids])
+        barcodes = {(production_id, order_item): barcode
+                    for production_id, order_item, barcode in self.env.cr.fetchall()}
+
+        stored = {production_id for production_id, order_item in barcodes}
+        missing = productions.filtered(lambda p: p.id not in stored)
+        if missing:
+            collected = self._collect_reports_data(missing)
+            for production in missing:
+                for row in self._nest_deca_rows([collected[production.id]]):
+                    barcodes.setdefault((production.id, str(row[2])), row[13])
+        return barcodes
+
+    @api.model
+    def _write_combined_workbook(self, workbook, data, deca_rows):
+        """多个订单合并的下料单，DECA数据使用跨订单排料的结果"""
+        self._create_general_info_sheet(workbook, data)
+        self._create_sash_welder_sheet(workbook, data)
+        worksheet = workbook.add_worksheet('DECA Data')
         styles = self._get_workbook_styles(workbook)
-        self._setup_deca_data_sheet(deca_worksheet, styles, production)
-        
-        # 关闭工作簿并获取内容
-        workbook.close()
-        output.seek(0)
-        
-        # 保存报表文件
+        self._setup_nested_deca_sheet(worksheet, styles, data.batch_number, deca_rows)
+
+    @api.model
+    def _setup_nested_deca_sheet(self, worksheet, styles, batch_number, deca_rows):
+        """设置排料后的DECA数据工作表"""
+        worksheet.set_column('A:AB', 12)
+        worksheet.merge_range('A1:AB1', 'DECA Data', styles['title_style'])
+        worksheet.merge_range('A2:B2', 'Batch NO.', styles['batch_style'])
+        worksheet.merge_range('C2:F2', batch_number, styles['batch_style'])
+        for col, header in enumerate(DECA_HEADERS):
+            worksheet.write(3, col, header, styles['header_style'])
+        for row, values in enumerate(deca_rows, 4):
+            for col, value in enumerate(values):
+                worksheet.write(row, col, value, styles['cell_style'])
+
+    @api.model
+    def _write_deca_attachment(self, filename, fmt, columns, rows, owner=None):
+        """把锯床文件写入临时文件再保存为附件
+
+        行逐个编码写出，不在内存中拼接整个文件；sha256校验值保存在附件描述中
+
+        Args:
+            fmt (str): DECA_FORMATS 中的格式名称
+            columns (list): 表头
+            rows: 行的迭代器
+        """
+        fd, path = tempfile.mkstemp(prefix='rich_production_', suffix='.deca')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                checksum = write_deca_file(f, fmt, columns, rows)
+            return self._store_file_attachment(
+                path, filename, DECA_FORMATS[fmt].mimetype, owner=owner, description=checksum)
+        finally:
+            os.unlink(path)
+
+    def _render_deca_file(self, fmt, source):
+        """生成当前订单的锯床文件"""
+        if fmt not in DECA_FORMATS or source not in DECA_SOURCES:
+            raise UserError(_("不支持的DECA文件格式"))
+        production = self.production_id
+        if source == 'stored':
+            self.env.flush_all()
+            columns = [header for column, header in STORED_DECA_COLUMNS]
+            rows = iter_stored_deca_rows(self.env.cr, production.ids)
+        else:
+            columns = DECA_HEADERS
+            rows = self._nest_deca_rows([self._collect_report_data(production)])
+        filename = f"DECA_{production.batch_number or production.id}.{DECA_FORMATS[fmt].extension}"
+        return self._write_deca_attachment(filename, fmt, columns, rows)
+
+    def _write_sheet(self, workbook, sheet_name, data):
+        title, prefix, method = SINGLE_SHEETS[sheet_name]
+        if title is None:
+            getattr(self, method)(workbook, data)
+        else:
+            worksheet = workbook.add_worksheet(title)
+            styles = self._get_workbook_styles(workbook)
+            getattr(self, method)(worksheet, styles, data)
+
+    def _write_sheet_file(self, path, sheet_name, data):
+        """把一个工作表写成单独的xlsx文件"""
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': tempfile.gettempdir()})
+        try:
+            self._write_sheet(workbook, sheet_name, data)
+        finally:
+            workbook.close()
+
+    def _write_full_workbook(self, workbook):
+        data = self._collect_report_data(self.production_id)
+        for sheet_name in FULL_WORKBOOK_SHEETS:
+            self._write_sheet(workbook, sheet_name, data)
+
+    def _get_report_attachment(self, kind, fingerprint=None):
+        """从缓存取报表文件，订单内容有变化时重新生成
+
+        Args:
+            kind (str): 'xlsx'、'zip'、'pdf'、'pdf:grouped'、'deca:<格式>:<来源>' 或 'sheet:<工作表名>'
+        """
+        self.ensure_one()
+        if kind == 'xlsx':
+            render = self._render_full_workbook
+        elif kind == 'zip':
+            render = self._render_sheet_archive
+        elif kind in ('pdf', 'pdf:grouped'):
+            render = lambda: self._render_pdf(grouped=kind == 'pdf:grouped')
+        elif kind.startswith('deca:') and kind.count(':') == 2:
+            fmt, source = kind.split(':')[1:]
+            render = lambda: self._render_deca_file(fmt, source)
+        elif kind.startswith('sheet:'):
+            sheet_name = kind.split(':', 1)[1]
+            render = lambda: self._render_single_sheet(sheet_name)
+        else:
+            raise UserError(_("不支持的报表类型"))
+        return self.env['rich_production.report.cache'].sudo()._get_or_render(
+            self.production_id, kind, render, fingerprint=fingerprint)
+
+    def _render_full_workbook(self):
+        production = self.production_id
         report_name = f"Cutting_List_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return self._build_workbook_attachment(report_name, self._write_full_workbook)
+
+    def _render_pdf(self, grouped=False):
+        """生成PDF附件
+
+        优先使用QWeb报表，失败时使用ReportLab；合并数量模式QWeb模板不支持，直接使用ReportLab
+        """
+        production = self.production_id
+        pdf_content = None
+        if not grouped and self.env.ref('rich_production.action_cutting_list_pdf_report', raise_if_not_found=False):
+            try:
+                pdf_content, _content_type = self.env['ir.actions.report'].sudo()._render_qweb_pdf(
+                    'rich_production.action_cutting_list_pdf_report', [production.id])
+            except Exception as e:
+                _logger.warning(f"使用QWeb生成PDF失败，尝试使用ReportLab: {str(e)}")
+        if pdf_content is None:
+            pdf_content = render_cutting_list_pdf(self._collect_report_data(production), grouped=grouped)
+
+        return self.env['ir.attachment'].sudo().create({
+            'name': f"Cutting_List_{production.batch_number or production.id}.pdf",
+            'type': 'binary',
+            'raw': pdf_content,
+            'mimetype': 'application/pdf',
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+
+    def _render_sheet_archive(self):
+        """每个工作表生成单独的xlsx文件并打包成zip"""
+        if not xlsxwriter:
+            raise UserError(_("You need to install the xlsxwriter Python library."))
+        suffix = self.production_id.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')
+        data = self._collect_report_data(self.production_id)
+
+        tmpdir = tempfile.mkdtemp(prefix='rich_production_')
+        try:
+            paths = {name: os.path.join(tmpdir, f"{prefix}_{suffix}.xlsx")
+                     for name, (title, prefix, method) in SINGLE_SHEETS.items()}
+            for name, path in paths.items():
+                self._write_sheet_file(path, name, data)
+
+            zip_path = os.path.join(tmpdir, 'sheets.zip')
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for path in paths.values():
+                    archive.write(path, os.path.basename(path))
+            return self._store_file_attachment(zip_path, f"Cutting_Sheets_{suffix}.zip", 'application/zip')
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def generate_report(self):
+        """生成Excel格式的下料单报表，内容未变化时使用缓存的文件"""
+        self.ensure_one()
+        _logger = logging.getLogger(__name__)
+        
+        attachment = self._get_report_attachment('xlsx')
         self.write({
-            'report_file': base64.b64encode(output.read()),
-            'report_filename': report_name,
+            'report_attachment_id': attachment.id,
+            'report_file': False,
+            'report_filename': attachment.name,
             'state': 'done'
         })
         
-        _logger.info(f"Excel报表生成完成")
+        _logger.info(f"Excel报表已就绪，大小: {attachment.file_size} 字节")
         
         return {
             'type': 'ir.actions.act_window',
@@ -131,7 +570,7 @@ class CuttingListReport(models.TransientModel):
         
         return styles
     
-    def _create_general_info_sheet(self, workbook, production):
+    def _create_general_info_sheet(self, workbook, data):
         """创建General Information工作表"""
         _logger = logging.getLogger(__name__)
         styles = self._get_workbook_styles(workbook)
@@ -161,7 +600,7 @@ class CuttingListReport(models.TransientModel):
         
         # 添加批次号
         worksheet.merge_range('A2:B2', 'Batch NO.', styles['batch_style'])
-        worksheet.merge_range('C2:F2', production.batch_number or '', styles['batch_style'])
+        worksheet.merge_range('C2:F2', data.batch_number, styles['batch_style'])
         
         # 添加表头
         headers = ['Customer', 'ID', 'Style', 'W', 'H', 'FH', 'Frame', 'Glass', 'Argon', 'Grid', 'Color', 'Note', 'ID']
@@ -172,103 +611,32 @@ class CuttingListReport(models.TransientModel):
         row = 4
         item_id = 1
         
-        # 获取ProductionLine模型定义，用于检查字段
-        ProductionLine = self.env['rich_production.line']
-        has_quantity_field = 'quantity' in ProductionLine._fields
-        
-        _logger.info(f"开始生成Excel报表，生产ID: {production.id}, 产品行数: {len(production.product_line_ids)}")
-        
-        for line in production.product_line_ids:
-            try:
-                # 提取产品类型（Style）- 通常在产品名称中包含，如XO, XOX
-                product_name = ""
-                if line.product_id:
-                    product_name = line.product_id.name or ""
-                
-                style = ""
-                # 尝试从产品名称中提取风格类型
-                if 'XOX' in product_name:
-                    style = 'XOX'
-                elif 'XO' in product_name:
-                    style = 'XO'
-                elif 'OX' in product_name:
-                    style = 'OX'
-                elif 'Picture' in product_name:
-                    style = 'P'
-                elif 'Casement' in product_name:
-                    style = 'C'
-                else:
-                    style = product_name
-                
-                # 获取客户名
-                customer_code = ""
-                if line.invoice_id and line.invoice_id.partner_id:
-                    customer = line.invoice_id.partner_id.name or ""
-                    # 如果客户名称太长，截取前10个字符加编号
-                    if customer and len(customer) > 10:
-                        customer_code = customer[:8] + str(line.invoice_id.id % 100000)
-                    else:
-                        customer_code = customer
-                
-                # 确定产品数量
-                quantity = 1
+        _logger.info(f"开始生成Excel报表，生产ID: {data.production_id}, 产品行数: {len(data.lines)}")
+        
+        for line in data.lines:
+            # 为每个数量创建一行
+            for i in range(line.quantity):
+                # 写入行数据
+                worksheet.write(row, 0, line.customer, styles['cell_style'])       # Customer
+                worksheet.write(row, 1, item_id, styles['cell_style'])             # ID
+                worksheet.write(row, 2, line.style, styles['cell_style'])          # Style
+                worksheet.write(row, 3, line.width, styles['cell_style'])          # W
+                worksheet.write(row, 4, line.height, styles['cell_style'])         # H
+                worksheet.write(row, 5, '', styles['cell_style'])                  # FH - 留空
+                worksheet.write(row, 6, line.frame, styles['cell_style'])          # Frame
+                worksheet.write(row, 7, line.glass, styles['cell_style'])          # Glass
+                worksheet.write(row, 8, 'Yes' if line.argon else '', styles['cell_style']) # Argon
+                worksheet.write(row, 9, line.grid, styles['cell_style'])           # Grid
+                worksheet.write(row, 10, line.color, styles['cell_style'])         # Color
+                worksheet.write(row, 11, line.notes, styles['cell_style'])         # Notes
+                worksheet.write(row, 12, item_id, styles['cell_style'])            # ID再次
                 
-                # 优先使用quantity字段
-                if has_quantity_field and hasattr(line, 'quantity'):
-                    try:
-                        if line.quantity:
-                            quantity = int(float(line.quantity))
-                    except (ValueError, TypeError) as e:
-                        _logger.warning(f"转换产品行ID {line.id} 的数量失败: {e}")
-                
-                # 如果没有quantity字段或值无效，尝试使用product_qty字段
-                if quantity <= 0 and hasattr(line, 'product_qty'):
-                    try:
-                        if line.product_qty:
-                            quantity = int(float(line.product_qty))
-                    except (ValueError, TypeError) as e:
-                        _logger.warning(f"转换产品行ID {line.id} 的product_qty失败: {e}")
-                
-                # 确保数量至少为1
-                quantity = max(1, quantity)
-                _logger.info(f"产品行ID: {line.id}, 产品: {product_name}, 数量: {quantity}")
-                
-                # 安全获取字段值，防止缺少字段导致错误
-                width = getattr(line, 'width', '') or ''
-                height = getattr(line, 'height', '') or ''
-                frame = getattr(line, 'frame', '') or ''
-                glass = getattr(line, 'glass', '') or ''
-                grid = getattr(line, 'grid', '') or ''
-                color = getattr(line, 'color', '') or ''
-                notes = getattr(line, 'notes', '') or ''
-                argon = getattr(line, 'argon', False)
-                
-                # 为每个数量创建一行
-                for i in range(quantity):
-                    # 写入行数据
-                    worksheet.write(row, 0, customer_code, styles['cell_style'])    # Customer
-                    worksheet.write(row, 1, item_id, styles['cell_style'])          # ID
-                    worksheet.write(row, 2, style, styles['cell_style'])            # Style
-                    worksheet.write(row, 3, width, styles['cell_style'])            # W
-                    worksheet.write(row, 4, height, styles['cell_style'])           # H
-                    worksheet.write(row, 5, '', styles['cell_style'])               # FH - 留空
-                    worksheet.write(row, 6, frame, styles['cell_style'])            # Frame
-                    worksheet.write(row, 7, glass, styles['cell_style'])            # Glass
-                    worksheet.write(row, 8, 'Yes' if argon else '', styles['cell_style']) # Argon
-                    worksheet.write(row, 9, grid, styles['cell_style'])             # Grid
-                    worksheet.write(row, 10, color, styles['cell_style'])           # Color
-                    worksheet.write(row, 11, notes, styles['cell_style'])           # Notes
-                    worksheet.write(row, 12, item_id, styles['cell_style'])         # ID再次
-                    
-                    row += 1
-                    item_id += 1
-            except Exception as e:
-                _logger.exception(f"处理产品行ID {line.id} 时出错: {e}")
-                # 继续处理下一行，不中断报表生成
+                row += 1
+                item_id += 1
         
         return worksheet
         
-    def _create_sash_welder_sheet(self, workbook, production):
+    def _create_sash_welder_sheet(self, workbook, data):
         """创建Sash Welder工作表"""
         _logger = logging.getLogger(__name__)
         styles = self._get_workbook_styles(workbook)
@@ -292,82 +660,46 @@ class CuttingListReport(models.TransientModel):
         
         # 添加批次号
         sash_welder_worksheet.merge_range('A2:B2', 'Batch NO.', styles['batch_style'])
-        sash_welder_worksheet.merge_range('C2:F2', production.batch_number or '', styles['batch_style'])
+        sash_welder_worksheet.merge_range('C2:F2', data.batch_number, styles['batch_style'])
         
         # 添加表头
         welder_headers = ['Customer', 'ID', 'Style', 'W', 'H', 'Sash W', 'Sash H', 'Pcs', 'ID']
         for col, header in enumerate(welder_headers):
             sash_welder_worksheet.write(3, col, header, styles['header_style'])
             
-        # 获取焊接器数据
-        welder_rows = []
-        try:
-            # 获取与此生产订单关联的计算结果
-            calculation_results = self.env['window.calculation.result'].search([
-                ('production_id', '=', production.id)
-            ])
+        # 按客户和款式排序
+        welder_rows = sorted(data.welders, key=lambda x: (x.customer, x.style))
+        _logger.info(f"获取到{len(welder_rows)}条焊接器数据")
+        
+        # 写入焊接器数据
+        row = 4
+        for item in welder_rows:
+            sash_welder_worksheet.write(row, 0, item.customer, styles['cell_style'])
+            sash_welder_worksheet.write(row, 1, item.item_id, styles['cell_style'])
+            sash_welder_worksheet.write(row, 2, item.style, styles['cell_style'])
+            sash_welder_worksheet.write(row, 3, item.width, styles['cell_style'])
+            sash_welder_worksheet.write(row, 4, item.height, styles['cell_style'])
             
-            if calculation_results:
-                _logger.info(f"找到{len(calculation_results)}个计算结果记录")
-                
-                # 获取焊接器数据
-                welder_data = []
-                for result in calculation_results:
-                    welder_records = result.welder_ids
-                    if welder_records:
-                        for welder in welder_records:
-                            welder_rows.append({
-                                'customer': welder.customer or '',
-                                'id': welder.item_id or '',
-                                'style': welder.style or '',
-                                'width': welder.width or '',
-                                'height': welder.height or '',
-                                'sash_w': welder.sash_width or 0,
-                                'sash_h': welder.sash_height or 0,
-                                'pieces': welder.pieces or 1,
-                            })
-                            
-                _logger.info(f"获取到{len(welder_rows)}条焊接器数据")
+            # 条件格式：Sash W < 18 使用黄色背景
+            if item.sash_w < 18:
+                sash_welder_worksheet.write(row, 5, item.sash_w, styles['warning_cell_style'])
             else:
-                _logger.warning(f"未找到计算结果记录")
-                
-            # 按客户和款式排序
-            welder_rows.sort(key=lambda x: (x.get('customer', ''), x.get('style', '')))
+                sash_welder_worksheet.write(row, 5, item.sash_w, styles['cell_style'])
             
-            # 写入焊接器数据
-            row = 4
-            for item in welder_rows:
-                sash_welder_worksheet.write(row, 0, item.get('customer', ''), styles['cell_style'])
-                sash_welder_worksheet.write(row, 1, item.get('id', ''), styles['cell_style'])
-                sash_welder_worksheet.write(row, 2, item.get('style', ''), styles['cell_style'])
-                sash_welder_worksheet.write(row, 3, item.get('width', ''), styles['cell_style'])
-                sash_welder_worksheet.write(row, 4, item.get('height', ''), styles['cell_style'])
-                
-                # 条件格式：Sash W < 18 使用黄色背景
-                sash_w = item.get('sash_w', 0)
-                if sash_w < 18:
-                    sash_welder_worksheet.write(row, 5, sash_w, styles['warning_cell_style'])
-                else:
-                    sash_welder_worksheet.write(row, 5, sash_w, styles['cell_style'])
-                
-                # 条件格式：Sash H < 15 或 > 54 使用黄色背景
-                sash_h = item.get('sash_h', 0)
-                if sash_h < 15 or sash_h > 54:
-                    sash_welder_worksheet.write(row, 6, sash_h, styles['warning_cell_style'])
-                else:
-                    sash_welder_worksheet.write(row, 6, sash_h, styles['cell_style'])
-                
-                sash_welder_worksheet.write(row, 7, item.get('pieces', 1), styles['cell_style'])
-                sash_welder_worksheet.write(row, 8, item.get('id', ''), styles['cell_style'])
-                
-                row += 1
-                
-        except Exception as e:
-            _logger.exception(f"生成焊接器表格时出错: {e}")
+            # 条件格式：Sash H < 15 或 > 54 使用黄色背景
+            if item.sash_h < 15 or item.sash_h > 54:
+                sash_welder_worksheet.write(row, 6, item.sash_h, styles['warning_cell_style'])
+            else:
+                sash_welder_worksheet.write(row, 6, item.sash_h, styles['cell_style'])
+            
+            sash_welder_worksheet.write(row, 7, item.pieces, styles['cell_style'])
+            sash_welder_worksheet.write(row, 8, item.item_id, styles['cell_style'])
+            
+            row += 1
             
         return sash_welder_worksheet
     
-    def _setup_deca_data_sheet(self, worksheet, styles, production):
+    def _setup_deca_data_sheet(self, worksheet, styles, data):
         """设置DECA数据工作表的内容"""
         _logger = logging.getLogger(__name__)
         
@@ -406,7 +738,7 @@ class CuttingListReport(models.TransientModel):
         
         # 添加批次号
         worksheet.merge_range('A2:B2', 'Batch NO.', styles['batch_style'])
-        worksheet.merge_range('C2:F2', production.batch_number or '', styles['batch_style'])
+        worksheet.merge_range('C2:F2', data.batch_number, styles['batch_style'])
         
         # 添加表头
         headers = ['Batch No', 'Order No', 'Order Item', 'Material Name', 'Cutting ID Pieces ID', 
@@ -417,168 +749,76 @@ class CuttingListReport(models.TransientModel):
         for col, header in enumerate(headers):
             worksheet.write(3, col, header, styles['header_style'])
             
-        # 获取DECA数据
-        try:
-            # 从计算结果中获取框架数据并转换为DECA数据格式
-            row = 4
-            if production.result_ids:
-                for result in production.result_ids:
-                    if result.frame_ids:
-                        # 获取窗户基本信息
-                        style = ''
-                        color = ''
-                        grid = ''
-                        glass = ''
-                        argon = False
-                        product_size = ''
-                        customer = ''
-                        
-                        if result.general_info_ids:
-                            general_info = result.general_info_ids[0]
-                            style = general_info.style or ''
-                            color = general_info.color or ''
-                            grid = general_info.grid or ''
-                            glass = general_info.glass or ''
-                            argon = general_info.argon or False
-                            customer = general_info.customer or ''
-                            if general_info.width and general_info.height:
-                                product_size = f"{general_info.width}x{general_info.height}"
-                        
-                        # 处理每个框架数据
-                        for frame in result.frame_ids:
-                            # 确定位置
-                            position = 'TOP+BOT'
-                            if frame.position == '|':
-                                position = 'LEFT+RIGHT'
-                            elif frame.position == '--':
-                                position = 'TOP+BOT'
-                            else:
-                                position = frame.position
-                            
-                            # 填充DECA数据行
-                            worksheet.write(row, 0, production.batch_number or '', styles['cell_style'])  # Batch No
-                            worksheet.write(row, 1, production.id or '', styles['cell_style'])  # Order No
-                            worksheet.write(row, 2, frame.item_id or '', styles['cell_style'])  # Order Item
-                            worksheet.write(row, 3, frame.material or '', styles['cell_style'])  # Material Name
-                            worksheet.write(row, 4, '', styles['cell_style'])  # Cutting ID Pieces ID
-                            worksheet.write(row, 5, frame.length or '', styles['cell_style'])  # Length
-                            worksheet.write(row, 6, 'V' if frame.position == '|' else 'H', styles['cell_style'])  # Angles
-                            worksheet.write(row, 7, frame.quantity or 1, styles['cell_style'])  # Qty
-                            worksheet.write(row, 8, production.id or '', styles['cell_style'])  # Bin No
-                            worksheet.write(row, 9, '', styles['cell_style'])  # Cart No
-                            worksheet.write(row, 10, position, styles['cell_style'])  # Position
-                            worksheet.write(row, 11, '', styles['cell_style'])  # Label Print
-                            worksheet.write(row, 12, '', styles['cell_style'])  # Barcode No
-                            worksheet.write(row, 13, '', styles['cell_style'])  # PO No
-                            worksheet.write(row, 14, style, styles['cell_style'])  # Style
-                            worksheet.write(row, 15, frame.material or '', styles['cell_style'])  # Frame
-                            worksheet.write(row, 16, product_size, styles['cell_style'])  # Product Size
-                            worksheet.write(row, 17, color, styles['cell_style'])  # Color
-                            worksheet.write(row, 18, grid, styles['cell_style'])  # Grid
-                            worksheet.write(row, 19, glass, styles['cell_style'])  # Glass
-                            worksheet.write(row, 20, 'Yes' if argon else '', styles['cell_style'])  # Argon
-                            worksheet.write(row, 21, '', styles['cell_style'])  # Painting
-                            worksheet.write(row, 22, '', styles['cell_style'])  # Product Dimensions
-                            worksheet.write(row, 23, '', styles['cell_style'])  # Balance
-                            worksheet.write(row, 24, '', styles['cell_style'])  # Shift
-                            worksheet.write(row, 25, '', styles['cell_style'])  # Ship date
-                            worksheet.write(row, 26, '', styles['cell_style'])  # Note
-                            worksheet.write(row, 27, customer, styles['cell_style'])  # Customer
-                            
-                            row += 1
-        except Exception as e:
-            _logger.exception(f"生成DECA数据表格时出错: {e}")
+        # 从计算结果中获取框架数据并转换为DECA数据格式
+        row = 4
+        for window in data.windows:
+            product_size = f"{window.width}x{window.height}" if window.width and window.height else ''
+            
+            # 处理每个框架数据
+            for frame in window.frames:
+                # 确定位置
+                if frame.position == '|':
+                    position = 'LEFT+RIGHT'
+                elif frame.position == '--':
+                    position = 'TOP+BOT'
+                else:
+                    position = frame.position or 'TOP+BOT'
+                
+                # 填充DECA数据行
+                values = [
+                    data.batch_number,                           # Batch No
+                    data.production_id,                          # Order No
+                    window.item_id,                              # Order Item
+                    frame.material,                              # Material Name
+                    '',                                          # Cutting ID Pieces ID
+                    frame.length or '',                          # Length
+                    'V' if frame.position == '|' else 'H',       # Angles
+                    frame.qty or 1,                              # Qty
+                    data.production_id,                          # Bin No
+                    '',                                          # Cart No
+                    position,                                    # Position
+                    '', '', '',                                  # Label Print, Barcode No, PO No
+                    window.style,                                # Style
+                    frame.material,                              # Frame
+                    product_size,                                # Product Size
+                    window.color,                                # Color
+                    window.grid,                                 # Grid
+                    window.glass,                                # Glass
+                    'Yes' if window.argon else '',               # Argon
+                    '', '', '', '', '', '',                      # Painting ~ Note
+                    window.customer,                             # Customer
+                ]
+                for col, value in enumerate(values):
+                    worksheet.write(row, col, value, styles['cell_style'])
+                row += 1
     
-    def generate_single_sheet_report(self, sheet_name):
-        """生成单个工作表的Excel报表"""
+    def _write_single_sheet(self, workbook, sheet_name):
+        self._write_sheet(workbook, sheet_name, self._collect_report_data(self.production_id))
+
+    def _render_single_sheet(self, sheet_name):
+        if sheet_name not in SINGLE_SHEETS:
+            raise UserError(_("不支持的工作表名称"))
+        prefix = SINGLE_SHEETS[sheet_name][1]
+        filename = f"{prefix}_{self.production_id.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return self._build_workbook_attachment(
+            filename, lambda workbook: self._write_single_sheet(workbook, sheet_name))
+
+    def generate_single_sheet_attachment(self, sheet_name):
+        """生成单个工作表的Excel附件，内容未变化时使用缓存的文件"""
         self.ensure_one()
-        _logger = logging.getLogger(__name__)
-        
-        if not xlsxwriter:
-            raise UserError(_("You need to install the xlsxwriter Python library."))
-        
-        production = self.production_id
-        
-        # 创建内存中的Excel工作簿
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        
-        # 根据要求创建单个工作表
-        if sheet_name == 'general_info':
-            self._create_general_info_sheet(workbook, production)
-            filename = f"General_Info_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        elif sheet_name == 'sash_welder':
-            self._create_sash_welder_sheet(workbook, production)
-            filename = f"Sash_Welder_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        elif sheet_name == 'frame_data':
-            # 创建框架数据工作表
-            worksheet = workbook.add_worksheet('Frame Data')
-            styles = self._get_workbook_styles(workbook)
-            
-            # 设置表头和数据
-            self._setup_frame_data_sheet(worksheet, styles, production)
-            filename = f"Frame_Data_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        elif sheet_name == 'sash_data':
-            # 创建嵌扇数据工作表
-            worksheet = workbook.add_worksheet('Sash Data')
-            styles = self._get_workbook_styles(workbook)
-            
-            # 设置表头和数据
-            self._setup_sash_data_sheet(worksheet, styles, production)
-            filename = f"Sash_Data_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        elif sheet_name == 'screen_data':
-            # 创建纱窗数据工作表
-            worksheet = workbook.add_worksheet('Screen Data')
-            styles = self._get_workbook_styles(workbook)
-            
-            # 设置表头和数据
-            self._setup_screen_data_sheet(worksheet, styles, production)
-            filename = f"Screen_Data_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        elif sheet_name == 'parts_data':
-            # 创建零部件数据工作表
-            worksheet = workbook.add_worksheet('Parts Data')
-            styles = self._get_workbook_styles(workbook)
-            
-            # 设置表头和数据
-            self._setup_parts_data_sheet(worksheet, styles, production)
-            filename = f"Parts_Data_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        elif sheet_name == 'grid_data':
-            # 创建网格数据工作表
-            worksheet = workbook.add_worksheet('Grid Data')
-            styles = self._get_workbook_styles(workbook)
-            
-            # 设置表头和数据
-            self._setup_grid_data_sheet(worksheet, styles, production)
-            filename = f"Grid_Data_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        elif sheet_name == 'glass_data':
-            # 创建玻璃数据工作表
-            worksheet = workbook.add_worksheet('Glass Data')
-            styles = self._get_workbook_styles(workbook)
-            
-            # 设置表头和数据
-            self._setup_glass_data_sheet(worksheet, styles, production)
-            filename = f"Glass_Data_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        elif sheet_name == 'deca_data':
-            # 创建DECA数据工作表
-            worksheet = workbook.add_worksheet('DECA Data')
-            styles = self._get_workbook_styles(workbook)
-            
-            # 设置表头和数据
-            self._setup_deca_data_sheet(worksheet, styles, production)
-            filename = f"DECA_Data_{production.batch_number or datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        else:
+        if sheet_name not in SINGLE_SHEETS:
             raise UserError(_("不支持的工作表名称"))
-        
-        # 关闭工作簿并获取内容
-        workbook.close()
-        output.seek(0)
-        
+        return self._get_report_attachment(f'sheet:{sheet_name}')
+
+    def generate_single_sheet_report(self, sheet_name):
+        """生成单个工作表的Excel报表，返回base64内容"""
+        attachment = self.generate_single_sheet_attachment(sheet_name)
         return {
-            'file_content': base64.b64encode(output.read()),
-            'filename': filename
+            'file_content': base64.b64encode(attachment.raw),
+            'filename': attachment.name
         }
     
-    def _setup_frame_data_sheet(self, worksheet, styles, production):
+    def _setup_frame_data_sheet(self, worksheet, styles, data):
         """设置框架数据工作表的内容"""
         _logger = logging.getLogger(__name__)
         
@@ -594,7 +834,7 @@ class CuttingListReport(models.TransientModel):
         
         # 添加批次号
         worksheet.merge_range('A2:B2', 'Batch NO.', styles['batch_style'])
-        worksheet.merge_range('C2:F2', production.batch_number or '', styles['batch_style'])
+        worksheet.merge_range('C2:F2', data.batch_number, styles['batch_style'])
         
         # 添加表头
         headers = ['Batch', 'Style', '82-02B--', '82-02BPcs', '82-02B|', '82-02B|Pcs', 
@@ -603,65 +843,36 @@ class CuttingListReport(models.TransientModel):
         for col, header in enumerate(headers):
             worksheet.write(3, col, header, styles['header_style'])
             
-        # 获取框架数据
-        try:
-            # 从计算结果中获取框架数据
-            row = 4
-            if production.result_ids:
-                # 收集所有框架数据
-                frame_data = []
-                for result in production.result_ids:
-                    if result.frame_ids:
-                        # 按材料和位置整理框架数据
-                        frame_summary = {}
-                        for frame in result.frame_ids:
-                            key = f"{frame.material}--{frame.position}"
-                            if key not in frame_summary:
-                                frame_summary[key] = {
-                                    'length': 0,
-                                    'quantity': 0
-                                }
-                            frame_summary[key]['length'] += frame.length or 0
-                            frame_summary[key]['quantity'] += frame.quantity or 0
-                        
-                        # 获取窗户风格
-                        style = ''
-                        if result.general_info_ids:
-                            style = result.general_info_ids[0].style or ''
-                        
-                        # 收集颜色信息
-                        color = ''
-                        if result.general_info_ids:
-                            color = result.general_info_ids[0].color or ''
-                        
-                        # 添加到框架数据列表
-                        frame_data.append({
-                            'batch': production.batch_number or '',
-                            'style': style,
-                            '82-02B--': self._get_frame_length(frame_summary, '82-02B', '--'),
-                            '82-02BPcs': self._get_frame_quantity(frame_summary, '82-02B', '--'),
-                            '82-02B|': self._get_frame_length(frame_summary, '82-02B', '|'),
-                            '82-02B|Pcs': self._get_frame_quantity(frame_summary, '82-02B', '|'),
-                            '82-10--': self._get_frame_length(frame_summary, '82-10', '--'),
-                            '82-10Pcs': self._get_frame_quantity(frame_summary, '82-10', '--'),
-                            '82-10|': self._get_frame_length(frame_summary, '82-10', '|'),
-                            '82-10|Pcs': self._get_frame_quantity(frame_summary, '82-10', '|'),
-                            '82-01--': self._get_frame_length(frame_summary, '82-01', '--'),
-                            '82-01Pcs': self._get_frame_quantity(frame_summary, '82-01', '--'),
-                            '82-01|': self._get_frame_length(frame_summary, '82-01', '|'),
-                            '82-01|Pcs': self._get_frame_quantity(frame_summary, '82-01', '|'),
-                            'color': color,
-                            'id': result.id,
-                        })
-                
-                # 将数据写入工作表
-                for item in frame_data:
-                    for col, field in enumerate(headers):
-                        worksheet.write(row, col, item.get(field, ''), styles['cell_style'])
-                    row += 1
-        except Exception as e:
-            _logger.exception(f"生成框架数据表格时出错: {e}")
-    
+        # 从计算结果中获取框架数据
+        row = 4
+        for window in data.windows:
+            if not window.frames:
+                continue
+            # 按材料和位置整理框架数据
+            frame_summary = {}
+            for frame in window.frames:
+                key = f"{frame.material}--{frame.position}"
+                summary = frame_summary.setdefault(key, {'length': 0, 'quantity': 0})
+                summary['length'] += frame.length
+                summary['quantity'] += frame.qty
+            
+            item = {
+                'Batch': data.batch_number,
+                'Style': window.style,
+                'Color': window.color,
+                'ID': window.result_id,
+            }
+            for material in ('82-02B', '82-10', '82-01'):
+                item[f'{material}--'] = self._get_frame_length(frame_summary, material, '--')
+                item[f'{material}Pcs'] = self._get_frame_quantity(frame_summary, material, '--')
+                item[f'{material}|'] = self._get_frame_length(frame_summary, material, '|')
+                item[f'{material}|Pcs'] = self._get_frame_quantity(frame_summary, material, '|')
+            
+            # 将数据写入工作表
+            for col, field in enumerate(headers):
+                worksheet.write(row, col, item.get(field, ''), styles['cell_style'])
+            row += 1
+
     def _get_frame_length(self, frame_summary, material, position):
         """获取指定材料和位置的框架长度"""
         key = f"{material}--{position}"
@@ -676,7 +887,7 @@ class CuttingListReport(models.TransientModel):
             return frame_summary[key]['quantity']
         return 0
     
-    def _setup_sash_data_sheet(self, worksheet, styles, production):
+    def _setup_sash_data_sheet(self, worksheet, styles, data):
         """设置嵌扇数据工作表的内容"""
         _logger = logging.getLogger(__name__)
         
@@ -692,7 +903,7 @@ class CuttingListReport(models.TransientModel):
         
         # 添加批次号
         worksheet.merge_range('A2:B2', 'Batch NO.', styles['batch_style'])
-        worksheet.merge_range('C2:F2', production.batch_number or '', styles['batch_style'])
+        worksheet.merge_range('C2:F2', data.batch_number, styles['batch_style'])
         
         # 添加表头
         headers = ['Customer', 'ID', 'Style', 'H--', 'H--Pcs', 'V|', 'V|Pcs', 'Color']
@@ -707,7 +918,7 @@ class CuttingListReport(models.TransientModel):
         except Exception as e:
             _logger.exception(f"生成嵌扇数据表格时出错: {e}")
     
-    def _setup_screen_data_sheet(self, worksheet, styles, production):
+    def _setup_screen_data_sheet(self, worksheet, styles, data):
         """设置纱窗数据工作表的内容"""
         _logger = logging.getLogger(__name__)
         
@@ -724,7 +935,7 @@ class CuttingListReport(models.TransientModel):
         
         # 添加批次号
         worksheet.merge_range('A2:B2', 'Batch NO.', styles['batch_style'])
-        worksheet.merge_range('C2:F2', production.batch_number or '', styles['batch_style'])
+        worksheet.merge_range('C2:F2', data.batch_number, styles['batch_style'])
         
         # 添加表头
         headers = ['Customer', 'ID', 'Style', 'Screen W', 'Screen W Pcs', 'Screen H', 'Screen H Pcs', 'Color', 'ID']
@@ -738,7 +949,7 @@ class CuttingListReport(models.TransientModel):
         except Exception as e:
             _logger.exception(f"生成纱窗数据表格时出错: {e}")
     
-    def _setup_parts_data_sheet(self, worksheet, styles, production):
+    def _setup_parts_data_sheet(self, worksheet, styles, data):
         """设置零部件数据工作表的内容"""
         _logger = logging.getLogger(__name__)
         
@@ -746,7 +957,7 @@ class CuttingListReport(models.TransientModel):
         # 实现零部件数据表格的设置
         pass
     
-    def _setup_grid_data_sheet(self, worksheet, styles, production):
+    def _setup_grid_data_sheet(self, worksheet, styles, data):
         """设置网格数据工作表的内容"""
         _logger = logging.getLogger(__name__)
         
@@ -754,7 +965,7 @@ class CuttingListReport(models.TransientModel):
         # 实现网格数据表格的设置
         pass
     
-    def _setup_glass_data_sheet(self, worksheet, styles, production):
+    def _setup_glass_data_sheet(self, worksheet, styles, data):
         """设置玻璃数据工作表的内容"""
         _logger = logging.getLogger(__name__)
         
@@ -776,7 +987,7 @@ class CuttingListReport(models.TransientModel):
         
         # 添加批次号
         worksheet.merge_range('A2:B2', 'Batch NO.', styles['batch_style'])
-        worksheet.merge_range('C2:F2', production.batch_number or '', styles['batch_style'])
+        worksheet.merge_range('C2:F2', data.batch_number, styles['batch_style'])
         
         # 添加表头
         headers = ['Customer', 'Style', 'W', 'H', 'FH', 'ID', 'Line #', 'Quantity', 
@@ -794,14 +1005,7 @@ class CuttingListReport(models.TransientModel):
     def action_download_general_info(self):
         """下载General Information工作表"""
         self.ensure_one()
-        result = self.generate_single_sheet_report('general_info')
-        
-        # 保存临时文件
-        attachment = self.env['ir.attachment'].create({
-            'name': result['filename'],
-            'datas': result['file_content'],
-            'type': 'binary',
-        })
+        attachment = self.generate_single_sheet_attachment('general_info')
         
         # 返回下载URL
         return {
@@ -813,14 +1017,7 @@ class CuttingListReport(models.TransientModel):
     def action_download_sash_welder(self):
         """下载Sash Welder工作表"""
         self.ensure_one()
-        result = self.generate_single_sheet_report('sash_welder')
-        
-        # 保存临时文件
-        attachment = self.env['ir.attachment'].create({
-            'name': result['filename'],
-            'datas': result['file_content'],
-            'type': 'binary',
-        })
+        attachment = self.generate_single_sheet_attachment('sash_welder')
         
         # 返回下载URL
         return {
@@ -832,14 +1029,7 @@ class CuttingListReport(models.TransientModel):
     def action_download_deca_data(self):
         """下载DECA Data工作表"""
         self.ensure_one()
-        result = self.generate_single_sheet_report('deca_data')
-        
-        # 保存临时文件
-        attachment = self.env['ir.attachment'].create({
-            'name': result['filename'],
-            'datas': result['file_content'],
-            'type': 'binary',
-        })
+        attachment = self.generate_single_sheet_attachment('deca_data')
         
         # 返回下载URL
         return {
@@ -848,6 +1038,24 @@ class CuttingListReport(models.TransientModel):
             'target': 'self',
         }
 
+    def action_download_all_sheets(self):
+        """下载所有工作表，每个工作表一个文件，打包为zip"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f"/rich_production/download_sheet/{self.id}/all",
+            'target': 'self',
+        }
+
+    def action_download_deca_file(self):
+        """下载锯床导入文件"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f"/rich_production/download_deca/{self.id}",
+            'target': 'self',
+        }
+
     def action_preview_report(self):
         """预览报表"""
         self.ensure_one()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+# 与下料单预览 optimizeCuttingGroups 相同的参数
+END_LOSS = 6        # 每根料两端的损耗
+CUT_LOSS = 4        # 每刀的损耗
+DEFAULT_MATERIAL_LENGTH = 233.0
+
+NestedPiece = namedtuple('NestedPiece', 'piece cutting_id pieces_id actual_length remaining_length '
+                                        'usable_remaining_length cut_count cut_loss')
+
+
+def nest_pieces(pieces, material_length, start_id=1):
+    """把同一种材料的片段排到整根料上
+
+    按数量分组，每组按长度从长到短依次放入当前料，放不下的留给下一根料。
+    超过单根料可用长度的片段单独占一根料。
+
+    Args:
+        pieces: 带 length 和 qty 属性的片段
+        material_length (float): 材料标准长度
+        start_id (int): 第一根料的切割ID
+
+    Returns:
+        tuple: ([NestedPiece], 下一个可用的切割ID)
+    """
+    max_length = material_length - END_LOSS
+    by_qty = {}
+    for piece in pieces:
+        by_qty.setdefault(piece.qty, []).append(piece)
+
+    nested = []
+    cutting_id = start_id
+    for qty in sorted(by_qty):
+        remaining = sorted(by_qty[qty], key=lambda piece: -piece.length)
+        while remaining:
+            bar, used, rest = [], 0, []
+            for piece in remaining:
+                total = used + piece.length + (CUT_LOSS if bar else 0)
+                if total <= max_length:
+                    bar.append(piece)
+                    used = total
+                else:
+                    rest.append(piece)
+            if not bar:
+                bar.append(rest.pop(0))
+            remaining = rest
+
+            cut_loss = CUT_LOSS * (len(bar) - 1)
+            actual_length = sum(piece.length for piece in bar) + cut_loss
+            remaining_length = material_length - actual_length
+            nested.extend(
+                NestedPiece(piece, cutting_id, index, actual_length, remaining_length,
+                            remaining_length - END_LOSS, len(bar), cut_loss)
+                for index, piece in enumerate(bar, 1)
+            )
+            cutting_id += 1
+    return nested, cutting_id
+
+
+def deca_barcode(batch_number, order_item, material, cutting_id, pieces_id):
+    """DECA条码，与下料单预览中的 barcodeNo 相同"""
+    return f"{batch_number}-{order_item}-{material}-{cutting_id}-{pieces_id}"
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import hashlib
+import io
+import uuid
+
+# 文件按块输出的大小
+CHUNK_SIZE = 64 * 1024
+
+# 服务端游标每次从数据库取的行数
+CURSOR_ITERSIZE = 2000
+
+# window.deca.data 导出的列: (数据库字段, 表头)，与下料单的 DECA Data 工作表相同
+STORED_DECA_COLUMNS = [
+    ('batch_no', 'Batch No'),
+    ('order_no', 'Order No'),
+    ('order_item', 'Order Item'),
+    ('material_name', 'Material Name'),
+    ('cutting_id_pieces_id', 'Cutting ID Pieces ID'),
+    ('length', 'Length'),
+    ('angles', 'Angles'),
+    ('qty', 'Qty'),
+    ('bin_no', 'Bin No'),
+    ('cart_no', 'Cart No'),
+    ('position', 'Position'),
+    ('label_print', 'Label Print'),
+    ('barcode_no', 'Barcode No'),
+    ('po_no', 'PO No'),
+    ('style', 'Style'),
+    ('frame', 'Frame'),
+    ('product_size', 'Product Size'),
+    ('color', 'Color'),
+    ('grid', 'Grid'),
+    ('glass', 'Glass'),
+    ('argon', 'Argon'),
+    ('painting', 'Painting'),
+    ('product_dimensions', 'Product Dimensions'),
+    ('balance', 'Balance'),
+    ('shift', 'Shift'),
+    ('ship_date', 'Ship Date'),
+    ('note', 'Note'),
+    ('customer', 'Customer'),
+]
+
+# 锯床文件格式: 名称 -> 格式类
+DECA_FORMATS = {}
+
+
+def register_format(cls):
+    """注册锯床文件格式，其他机器的格式继承 DecaFormat 后用此装饰器注册"""
+    DECA_FORMATS[cls.name] = cls
+    return cls
+
+
+class DecaFormat:
+    """锯床导入文件格式
+
+    子类实现 header 和 row，返回编码后的字节
+    """
+    name = None
+    extension = 'csv'
+    mimetype = 'text/csv'
+    encoding = 'utf-8'
+
+    def header(self, columns):
+        return b''
+
+    def row(self, values):
+        raise NotImplementedError()
+
+    def footer(self):
+        return b''
+
+
+@register_format
+class DecaCsvFormat(DecaFormat):
+    """DECA锯床CSV格式，与下料单预览导出的文件相同: 第一行表头，逗号分隔"""
+    name = 'deca_csv'
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _encode(self, values):
+        self._writer.writerow(values)
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data.encode(self.encoding)
+
+    def header(self, columns):
+        return self._encode(columns)
+
+    def row(self, values):
+        return self._encode(['' if value is None else value for value in values])
+
+
+def get_format(name):
+    if name not in DECA_FORMATS:
+        raise KeyError(name)
+    return DECA_FORMATS[name]
+
+
+def iter_deca_file(fmt, columns, rows, digest=None):
+    """把行编码为锯床文件，按块输出
+
+    Args:
+        fmt (str): 格式名称
+        columns (list): 表头
+        rows: 行的迭代器
+        digest: hashlib对象，输出的同时计算校验值，可以为空
+
+    Yields:
+        bytes: 文件内容块
+    """
+    formatter = get_format(fmt)()
+    parts = [formatter.header(columns)]
+    size = len(parts[0])
+    for values in rows:
+        encoded = formatter.row(values)
+        parts.append(encoded)
+        size += len(encoded)
+        if size >= CHUNK_SIZE:
+            chunk = b''.join(parts)
+            if digest is not None:
+                digest.update(chunk)
+            yield chunk
+            parts, size = [], 0
+    parts.append(formatter.footer())
+    chunk = b''.join(parts)
+    if chunk:
+        if digest is not None:
+            digest.update(chunk)
+        yield chunk
+
+
+def write_deca_file(fileobj, fmt, columns, rows):
+    """把锯床文件写入文件对象
+
+    Returns:
+        str: 文件内容的sha256
+    """
+    digest = hashlib.sha256()
+    for chunk in iter_deca_file(fmt, columns, rows, digest):
+        fileobj.write(chunk)
+    return digest.hexdigest()
+
+
+def iter_named_cursor(cr, prefix, query, params):
+    """用服务端命名游标逐批读取查询结果
+
+    数据库每次只返回 CURSOR_ITERSIZE 行，导出的行数不受内存限制。
+    命名游标是psycopg2的服务端游标，在 cr 的事务中打开，读取期间 cr 不能关闭。
+
+    Yields:
+        tuple: 查询结果的一行
+    """
+    with cr._cnx.cursor(name=f'{prefix}_{uuid.uuid4().hex}') as cursor:
+        cursor.itersize = CURSOR_ITERSIZE
+        cursor.execute(query, params)
+        yield from cursor
+
+
+def iter_stored_deca_rows(cr, production_ids):
+    """逐批读取生产订单的 window.deca.data，调用前需要先把ORM中未写入的数据flush到数据库
+
+    Yields:
+        tuple: 一行，列顺序与 STORED_DECA_COLUMNS 相同
+    """
+    columns = ', '.join(f'd.{column}' for column, header in STORED_DECA_COLUMNS)
+    yield from iter_named_cursor(cr, 'deca_export', f"""
+        SELECT {columns}
+          FROM window_deca_data d
+          JOIN window_calculation_result r ON r.id = d.calculation_id
+         WHERE r.production_id = ANY(%s)
+         ORDER BY r.production_id, d.material_name, d.cutting_id_pieces_id, d.id
+    """, [list(production_ids)])
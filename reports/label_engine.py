@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+import io
+import logging
+import string
+from collections import namedtuple
+from functools import lru_cache
+
+from .deca_writer import CHUNK_SIZE, iter_named_cursor
+
+try:
+    from reportlab.graphics.barcode.code128 import Code128
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+_logger = logging.getLogger(__name__)
+
+# window.label.data 导出的列，batch 为空时使用订单的批次号
+LABEL_COLUMNS = [
+    ('r.production_id', 'production_id'),
+    ("COALESCE(NULLIF(l.batch, ''), p.batch_number)", 'batch'),
+    ('l.item_id', 'item_id'),
+    ('l.line_id', 'line_id'),
+    ('l.customer', 'customer'),
+    ('l.style', 'style'),
+    ('l.width', 'width'),
+    ('l.height', 'height'),
+    ('l.frame', 'frame'),
+    ('l.glass', 'glass'),
+    ('l.argon', 'argon'),
+    ('l.grid', 'grid'),
+    ('l.grid_size', 'grid_size'),
+    ('l.color', 'color'),
+    ('l.po', 'po'),
+]
+
+Label = namedtuple('Label', [name for expression, name in LABEL_COLUMNS] + ['barcode'])
+
+# 4x2英寸热敏标签(203dpi)，数据字段都用 ^FH 输出，字段值中的控制字符按十六进制转义
+DEFAULT_ZPL_TEMPLATE = """^XA
+^CI28
+^PW812
+^LL406
+^FO30,20^A0N,40,40^FH^FD{customer}^FS
+^FO30,70^A0N,30,30^FH^FD{batch}  #{item_id}  {style}^FS
+^FO30,110^A0N,30,30^FH^FD{width} x {height}  {frame}^FS
+^FO30,150^A0N,26,26^FH^FD{glass} {argon} {grid} {grid_size}^FS
+^FO30,190^A0N,26,26^FH^FD{color}  PO {po}^FS
+^FO30,240^BY2^BCN,100,Y,N,N^FH^FD{barcode}^FS
+^XZ
+"""
+
+# 多联PDF标签: A4纸每页列数和行数
+PDF_COLUMNS = 2
+PDF_ROWS = 7
+
+
+def iter_labels(cr, production_ids, barcodes):
+    """用服务端命名游标逐批读取订单的窗户标签
+
+    Args:
+        barcodes (dict): {(production_id, 窗户ID): DECA条码}
+
+    Yields:
+        Label: 一个窗户标签
+    """
+    columns = ', '.join(expression for expression, name in LABEL_COLUMNS)
+    rows = iter_named_cursor(cr, 'label_export', f"""
+        SELECT {columns}
+          FROM window_label_data l
+          JOIN window_calculation_result r ON r.id = l.calculation_id
+          JOIN rich_production_production p ON p.id = r.production_id
+         WHERE r.production_id = ANY(%s)
+         ORDER BY r.production_id, r.id, l.id
+    """, [list(production_ids)])
+    for row in rows:
+        yield Label(*row, barcodes.get((row[0], row[2]), ''))
+
+
+def _format_value(name, value):
+    if name == 'argon':
+        return 'Argon' if value else ''
+    if isinstance(value, float):
+        return f"{value:g}"
+    return '' if value is None or value is False else str(value)
+
+
+def _zpl_escape(value):
+    # ^FH 默认以 _ 为十六进制转义符
+    return value.replace('_', '_5F').replace('^', '_5E').replace('~', '_7E')
+
+
+class ZplTemplate:
+    """编译后的ZPL模板，解析一次，之后每个标签只做字符串拼接"""
+
+    def __init__(self, template):
+        self.parts = []
+        for literal, field, format_spec, conversion in string.Formatter().parse(template):
+            if literal:
+                self.parts.append(literal)
+            if field is not None:
+                if field not in Label._fields:
+                    raise ValueError(f"未知的标签字段: {field}")
+                self.parts.append(Label._fields.index(field))
+
+    def render(self, label):
+        return ''.join(
+            part if isinstance(part, str)
+            else _zpl_escape(_format_value(Label._fields[part], label[part]))
+            for part in self.parts
+        )
+
+
+@lru_cache(maxsize=8)
+def compile_zpl(template):
+    return ZplTemplate(template)
+
+
+def iter_zpl(labels, template=DEFAULT_ZPL_TEMPLATE):
+    """把标签编码为ZPL，按块输出
+
+    Yields:
+        bytes: ZPL内容块
+    """
+    compiled = compile_zpl(template)
+    parts, size = [], 0
+    for label in labels:
+        encoded = compiled.render(label).encode('utf-8')
+        parts.append(encoded)
+        size += len(encoded)
+        if size >= CHUNK_SIZE:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def _label_lines(label):
+    values = {name: _format_value(name, value) for name, value in zip(Label._fields, label)}
+    return [
+        f"{values['batch']}  #{values['item_id']}  {values['style']}",
+        f"{values['width']} x {values['height']}  {values['frame']}",
+        ' '.join(v for v in (values['glass'], values['argon'], values['grid'], values['grid_size']) if v),
+        f"{values['color']}  PO {values['po']}" if values['po'] else values['color'],
+    ]
+
+
+def render_labels_pdf(labels, columns=PDF_COLUMNS, rows=PDF_ROWS):
+    """生成多联标签PDF
+
+    标签边框作为表单对象只绘制一次，每个标签引用它再填入文字和条码
+
+    Returns:
+        tuple: (PDF内容, 标签数)
+    """
+    if canvas is None:
+        raise ImportError("reportlab is required to render labels")
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    page_width, page_height = A4
+    margin = 8 * mm
+    label_width = (page_width - 2 * margin) / columns
+    label_height = (page_height - 2 * margin) / rows
+    padding = 3 * mm
+    barcode_height = label_height * 0.3
+    max_barcode_width = label_width - 2 * padding
+
+    pdf.beginForm('label_frame')
+    pdf.setLineWidth(0.3)
+    pdf.setDash(2, 2)
+    pdf.rect(0, 0, label_width, label_height)
+    pdf.endForm()
+
+    per_page = columns * rows
+    count = 0
+    for label in labels:
+        slot = count % per_page
+        if count and not slot:
+            pdf.showPage()
+        x = margin + (slot % columns) * label_width
+        y = page_height - margin - (slot // columns + 1) * label_height
+
+        pdf.saveState()
+        pdf.translate(x, y)
+        pdf.doForm('label_frame')
+        text_y = label_height - padding - 11
+        pdf.setFont('Helvetica-Bold', 11)
+        pdf.drawString(padding, text_y, _format_value('customer', label.customer))
+        pdf.setFont('Helvetica', 8)
+        for line in _label_lines(label):
+            text_y -= 10
+            pdf.drawString(padding, text_y, line)
+        if label.barcode:
+            barcode = Code128(label.barcode, barHeight=barcode_height, barWidth=0.9,
+                              quiet=0, humanReadable=True, fontSize=7)
+            if barcode.width > max_barcode_width:
+                barcode = Code128(label.barcode, barHeight=barcode_height,
+                                  barWidth=0.9 * max_barcode_width / barcode.width,
+                                  quiet=0, humanReadable=True, fontSize=7)
+            barcode.drawOn(pdf, padding, padding + 8)
+        pdf.restoreState()
+        count += 1
+
+    if not count:
+        pdf.setFont('Helvetica', 12)
+        pdf.drawString(margin, page_height - margin - 12, 'No labels')
+    pdf.save()
+    content = buffer.getvalue()
+    buffer.close()
+    _logger.info(f"生成标签PDF: 标签={count}, 大小={len(content)} 字节")
+    return content, count
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+from .deca_writer import iter_deca_file, iter_named_cursor
+
+# 下料单各数据表的CSV导出: 数据库表、文件名前缀、列 [(SQL表达式, 表头)]
+# 表头与下料单预览导出的CSV相同，预览中计算但没有保存的列不导出
+TableExport = namedtuple('TableExport', 'table title columns')
+
+TABLE_EXPORTS = {
+    'frame': TableExport('window_frame_data', '框架数据', [
+        ('p.batch_number', '批次'),
+        ('d.material', '材料'),
+        ('d.position', '位置'),
+        ('d.length', '长度'),
+        ('d.qty', '数量'),
+        ('d.frame_82_02b', '82-02B'),
+        ('d.frame_82_02b_qty', '数量'),
+        ('d.frame_82_10', '82-10'),
+        ('d.frame_82_10_qty', '数量'),
+        ('d.frame_82_01', '82-01'),
+        ('d.frame_82_01_qty', '数量'),
+        ('d.frame_82_02', '82-02'),
+        ('d.frame_82_02_qty', '数量'),
+        ('d.frame_82_11', '82-11'),
+        ('d.frame_82_11_qty', '数量'),
+    ]),
+    'sash': TableExport('window_sash_data', '嵌扇数据', [
+        ('d.batch', '批次'),
+        ('d.style', '样式'),
+        ('d.sash_82_03', '82-03--'),
+        ('d.sash_82_03_pcs', '数量'),
+        ('d.sash_82_03_vertical', '82-03|'),
+        ('d.sash_82_03_vertical_pcs', '数量'),
+        ('d.sash_82_05_vertical', '82-05|'),
+        ('d.sash_82_05_vertical_pcs', '数量'),
+        ('d.sash_82_04', '82-04--'),
+        ('d.sash_82_04_pcs', '数量'),
+        ('d.sash_82_04_vertical', '82-04|'),
+        ('d.sash_82_04_vertical_pcs', '数量'),
+        ('d.color', '颜色'),
+        ('d.item_id', 'ID'),
+    ]),
+    'screen': TableExport('window_screen_data', '屏幕数据', [
+        ('d.customer', '客户'),
+        ('d.line_id', 'ID'),
+        ('d.style', '样式'),
+        ('d.screenw', '屏幕宽度'),
+        ('d.screenw_pcs', '数量'),
+        ('d.screenh', '屏幕高度'),
+        ('d.screenh_pcs', '数量'),
+        ('d.color', '颜色'),
+        ('d.item_id', 'ID'),
+    ]),
+    'parts': TableExport('window_parts_data', '配件数据', [
+        ('d.batch', '批次'),
+        ('d.line_id', 'ID'),
+        ('d.style', '样式'),
+        ('d.mullion', '窗格条'),
+        ('d.center_alu', '中心铝'),
+        ('d.handle_alu', '把手铝'),
+        ('d.handle_pcs', '数量'),
+        ('d.track', '轨道'),
+        ('d.cover_h', '水平盖板'),
+        ('d.cover_v', '垂直盖板'),
+        ('d.large_mullion', '大窗格条'),
+        ('d.large_mullion_pcs', '数量'),
+        ('d.large_mullion2', '第二大窗格条'),
+        ('d.large_mullion2_pcs', '数量'),
+        ('d.slop', '斜度'),
+        ('d.color', '颜色'),
+        ('d.item_id', 'ID'),
+    ]),
+    'glass': TableExport('window_glass_data', '玻璃数据', [
+        ('p.batch_number', '批次'),
+        ('d.line', '行号'),
+        ('d.qty', '数量'),
+        ('d.glass_type', '玻璃类型'),
+        ('d.tempered', '钢化'),
+        ('d.thickness', '厚度'),
+        ('d.width', '玻璃宽度'),
+        ('d.height', '玻璃高度'),
+    ]),
+    'grid': TableExport('window_grid_data', '网格数据', [
+        ('d.batch', '批次'),
+        ('d.style', '样式'),
+        ('d.grid_w1', 'W1'),
+        ('d.grid_w1_pcs', '数量'),
+        ('d.grid_w1_cut::text', '一刀'),
+        ('d.grid_h1', 'H1'),
+        ('d.grid_h1_pcs', '数量'),
+        ('d.grid_h1_cut::text', '一刀'),
+        ('d.grid_w2', 'W2'),
+        ('d.grid_w2_pcs', '数量'),
+        ('d.grid_w2_cut::text', '一刀'),
+        ('d.grid_h2', 'H2'),
+        ('d.grid_h2_pcs', '数量'),
+        ('d.grid_h2_cut::text', '一刀'),
+        ('d.item_id', 'ID'),
+        ('d.note', '备注'),
+        ('d.color', '颜色'),
+    ]),
+}
+
+
+def iter_table_rows(cr, name, production_ids):
+    """用服务端命名游标逐批读取订单的某个数据表，框架汇总行不导出
+
+    Yields:
+        tuple: 一行，列顺序与 TABLE_EXPORTS[name].columns 相同
+    """
+    export = TABLE_EXPORTS[name]
+    columns = ', '.join(expression for expression, header in export.columns)
+    where = ' AND NOT COALESCE(d.is_summary, false)' if name == 'frame' else ''
+    yield from iter_named_cursor(cr, f'{name}_export', f"""
+        SELECT {columns}
+          FROM {export.table} d
+          JOIN window_calculation_result r ON r.id = d.calculation_id
+          JOIN rich_production_production p ON p.id = r.production_id
+         WHERE r.production_id = ANY(%s){where}
+         ORDER BY r.production_id, r.id, d.id
+    """, [list(production_ids)])
+
+
+def iter_table_csv(cr, name, production_ids):
+    """把数据表逐块编码为CSV，第一块是表头
+
+    Yields:
+        bytes: CSV内容块
+    """
+    headers = [header for expression, header in TABLE_EXPORTS[name].columns]
+    yield from iter_deca_file('deca_csv', headers, iter_table_rows(cr, name, production_ids))
@@ -0,0 +1,74 @@
+/** @odoo-module **/
+
+// 下料单文件后台生成时的等待界面，生成完成后自动下载
+import { Component, onMounted, onWillUnmount, useState, xml } from "@odoo/owl";
+import { registry } from "@web/core/registry";
+import { useService } from "@web/core/utils/hooks";
+
+// 轮询间隔(毫秒)
+const POLL_INTERVAL = 2000;
+
+class ArtifactWait extends Component {
+    setup() {
+        this.actionService = useService("action");
+        this.orm = useService("orm");
+        this.notificationService = useService("notification");
+        const params = (this.props.action && this.props.action.params) || {};
+        this.productionId = params.productionId;
+        this.kind = params.kind;
+        this.state = useState({ status: "pending" });
+        this.timer = null;
+
+        onMounted(() => this._poll());
+        onWillUnmount(() => clearTimeout(this.timer));
+    }
+
+    async _poll() {
+        let result;
+        try {
+            result = await this.orm.call("rich_production.production", "get_artifact_status", [
+                [this.productionId],
+                this.kind,
+            ]);
+        } catch (error) {
+            this.state.status = "failed";
+            return;
+        }
+        this.state.status = result.state;
+        if (result.url) {
+            await this.actionService.doAction({ type: "ir.actions.act_url", url: result.url, target: "self" });
+            this.actionService.doAction({ type: "ir.actions.act_window_close" });
+            return;
+        }
+        if (result.state === "failed") {
+            this.notificationService.add("下料单文件生成失败，请稍后重试", { type: "danger" });
+            return;
+        }
+        this.timer = setTimeout(() => this._poll(), POLL_INTERVAL);
+    }
+
+    async _retry() {
+        this.state.status = "pending";
+        // 失败的订单重新排队
+        await this.orm.call("rich_production.production", "action_download_" + (this.kind === "xlsx" ? "excel" : "pdf"), [
+            [this.productionId],
+        ]);
+        this._poll();
+    }
+}
+
+ArtifactWait.template = xml`
+    <div class="p-4 text-center">
+        <t t-if="state.status === 'failed'">
+            <p class="text-danger">下料单文件生成失败。</p>
+            <button class="btn btn-primary" t-on-click="_retry">重试</button>
+        </t>
+        <t t-else="">
+            <i class="fa fa-spinner fa-spin fa-2x mb-3"/>
+            <p>下料单文件正在后台生成，完成后将自动下载，可以关闭此窗口稍后再下载。</p>
+        </t>
+    </div>
+`;
+ArtifactWait.props = ["*"];
+
+registry.category("actions").add("rich_production.artifact_wait", ArtifactWait);
@@ -0,0 +1,150 @@
+/** @odoo-module **/
+
+// -*- coding: utf-8 -*-
+// Rich Production window calculation worker pool
+import { getCalculators, CALCULATOR_COMMON_PATH } from "./style_registry";
+
+const WORKER_URL = "/rich_production/static/src/js/workers/calculation_worker.js";
+
+// 每块发送给worker的窗户数
+const DEFAULT_CHUNK_SIZE = 25;
+
+/**
+ * Web Worker 池，把窗户计算分块分发到后台线程
+ */
+export class CalculationWorkerPool {
+    /**
+     * 浏览器是否支持Worker
+     * @returns {Boolean}
+     */
+    static isSupported() {
+        return typeof Worker !== "undefined" && typeof TextEncoder !== "undefined";
+    }
+
+    /**
+     * 默认池大小: CPU核数减一，至少1个，最多8个
+     * @returns {Number}
+     */
+    static defaultSize() {
+        const cores = (typeof navigator !== "undefined" && navigator.hardwareConcurrency) || 2;
+        return Math.max(1, Math.min(8, cores - 1));
+    }
+
+    /**
+     * @param {Object} options
+     * @param {Array} options.formulas - window.calculation.formula 记录
+     * @param {Number} options.size - worker数量
+     */
+    constructor({ formulas = [], size = CalculationWorkerPool.defaultSize() } = {}) {
+        this.encoder = new TextEncoder();
+        this.decoder = new TextDecoder();
+        this.workers = [];
+        const calculators = {};
+        for (const calculator of getCalculators()) {
+            calculators[calculator.name] = {
+                path: calculator.path,
+                module: calculator.module,
+                kind: calculator.kind,
+                esm: Boolean(calculator.builtin),
+            };
+        }
+        for (let i = 0; i < size; i++) {
+            const worker = new Worker(WORKER_URL);
+            worker.postMessage({ type: "init", formulas, calculators, commonPath: CALCULATOR_COMMON_PATH });
+            this.workers.push(worker);
+        }
+    }
+
+    /**
+     * 计算所有任务，结果按块回调
+     * @param {Array} tasks - [{index, calculator, window}]
+     * @param {Object} options
+     * @param {Function} options.onResults - 每块完成时调用，参数为 [{task, result, error}]
+     * @param {Function} options.fallback - worker出错时在主线程计算单个任务，返回 {task, result, error}
+     * @param {Number} options.chunkSize - 每块任务数
+     * @returns {Promise} 全部完成后resolve
+     */
+    run(tasks, { onResults = () => {}, fallback = null, chunkSize = DEFAULT_CHUNK_SIZE } = {}) {
+        const chunks = [];
+        for (let i = 0; i < tasks.length; i += chunkSize) {
+            chunks.push(tasks.slice(i, i + chunkSize));
+        }
+        if (!chunks.length) {
+            return Promise.resolve();
+        }
+        const tasksByIndex = new Map(tasks.map((task) => [task.index, task]));
+
+        return new Promise((resolve, reject) => {
+            let nextChunk = 0;
+            let pending = chunks.length;
+            let failed = false;
+
+            const finishChunk = async (results) => {
+                try {
+                    await onResults(results);
+                } catch (error) {
+                    console.error("处理计算结果失败:", error);
+                }
+                pending--;
+                if (pending === 0) {
+                    resolve();
+                }
+            };
+
+            const runOnMainThread = async (chunk) => {
+                if (!fallback) {
+                    failed = true;
+                    reject(new Error("计算worker出错"));
+                    return;
+                }
+                const results = [];
+                for (const task of chunk) {
+                    results.push(await fallback(task));
+                }
+                await finishChunk(results);
+            };
+
+            const dispatch = (worker) => {
+                if (failed || nextChunk >= chunks.length) {
+                    return;
+                }
+                const chunkId = nextChunk++;
+                const chunk = chunks[chunkId];
+                const buffer = this.encoder.encode(JSON.stringify(chunk)).buffer;
+
+                worker.onmessage = async (event) => {
+                    if (event.data.type !== "result" || event.data.chunkId !== chunkId) {
+                        return;
+                    }
+                    const results = JSON.parse(this.decoder.decode(event.data.buffer)).map((item) => ({
+                        task: tasksByIndex.get(item.index),
+                        result: item.result,
+                        error: item.error,
+                    }));
+                    dispatch(worker);
+                    await finishChunk(results);
+                };
+                worker.onerror = async (event) => {
+                    event.preventDefault();
+                    console.warn("计算worker出错，改在主线程计算:", event.message);
+                    await runOnMainThread(chunk);
+                    dispatch(worker);
+                };
+                // 转移ArrayBuffer，避免复制
+                worker.postMessage({ type: "chunk", chunkId, buffer }, [buffer]);
+            };
+
+            this.workers.forEach(dispatch);
+        });
+    }
+
+    /**
+     * 结束所有worker
+     */
+    terminate() {
+        for (const worker of this.workers) {
+            worker.terminate();
+        }
+        this.workers = [];
+    }
+}
@@ -2,13 +2,17 @@
 
 // -*- coding: utf-8 -*-
 // Rich Production cutting list preview
-import { Component, useState, onWillStart, onMounted } from "@odoo/owl";
+import { Component, useState, onWillStart, onMounted, onWillUnmount } from "@odoo/owl";
 import { registry } from "@web/core/registry";
 import { useService } from "@web/core/utils/hooks";
 import { download } from "@web/core/network/download";
-import { processWindowData } from "./window_calculations/xo_ox_window";
+import { detectStyle, getCalculator, getCalculatorInfo } from "./style_registry";
+import { CalculationWorkerPool } from "./calculation_worker_pool";
 import { _t } from "@web/core/l10n/translation";
 
+// 达到该窗户数才使用Worker池，少量窗户在主线程计算更快
+const WORKER_POOL_MIN_WINDOWS = 20;
+
 class CuttingListPreview extends Component {
     setup() {
         // 初始化params对象，确保安全
@@ -62,9 +66,9 @@ class CuttingListPreview extends Component {
         this.actionService = useService("action");
         this.notificationService = useService("notification");
         
-        // 从导入的模块获取窗口计算函数
-        this.XOOXWindowCalculator = { processWindowData };
-        
+        // 窗户数较多时在Web Worker池中计算，首次使用时创建
+        this.workerPool = null;
+
         // 绑定事件处理方法
         this.onDownloadFrameCSV = this.downloadFrameDataCSV.bind(this);
         this.onDownloadSashCSV = this.downloadSashDataCSV.bind(this);
@@ -120,6 +124,13 @@ class CuttingListPreview extends Component {
         onMounted(() => {
             this.loadData();
         });
+
+        onWillUnmount(() => {
+            if (this.workerPool) {
+                this.workerPool.terminate();
+                this.workerPool = null;
+            }
+        });
     }
     
     async loadData() {
@@ -298,8 +309,11 @@ class CuttingListPreview extends Component {
                                     productName = String(line.product_id);
                                 }
                                 
-                                // 尝试从产品名称中提取风格类型
-                                if (productName.includes('XOX')) {
+                                // 尝试从产品名称中提取风格类型，优先匹配已登记的样式
+                                const detectedStyle = detectStyle(productName);
+                                if (detectedStyle) {
+                                    style = detectedStyle;
+                                } else if (productName.includes('XOX')) {
                                     style = 'XOX';
                                 } else if (productName.includes('XO')) {
                                     style = 'XO';
@@ -356,6 +370,8 @@ class CuttingListPreview extends Component {
                             for (let i = 0; i < actualQuantity; i++) {
                                 const lineObj = {
                                     id: itemId,
+                                    // 产品行ID，保存计算结果时使用
+                                    line_id: line.id,
                                     customer: customerCode,
                                     style: style,
                                     width: line.width || '',
@@ -469,161 +485,69 @@ class CuttingListPreview extends Component {
         // 创建一个计算结果数组，用于后续批量保存
         const calculationResults = [];
 
-        // Process each window - 使用for循环而不是forEach以便使用await
-        for (let index = 0; index < this.state.productLines.length; index++) {
-            const window = this.state.productLines[index];
-            try {
-                console.log(`处理窗户 #${index+1}:`, window);
-                
-                // 调用窗户计算函数 - 使用await等待异步结果
-                const calculations = await this.XOOXWindowCalculator.processWindowData(window);
-                
-                console.log(`窗户 #${index+1} 计算结果:`, calculations);
-                
-                // Store calculations for later use
-                window.calculations = calculations;
-                
-                // 确保calculations对象有效
+        // 先查询计算缓存，相同输入的窗户直接复用结果
+        const windows = this.state.productLines;
+        const memoPayloads = await this.lookupCalculationMemo(windows);
+        const memoInputs = windows.map((window) => this.getMemoInputs(window));
+        const localKeys = memoInputs.map((inputs) => JSON.stringify(inputs));
+        const memoMisses = [];
+
+        // 未命中缓存的窗户，同一批次内相同输入只计算一次
+        const computed = {};
+        const tasks = [];
+        const queued = new Set();
+        windows.forEach((window, index) => {
+            if (memoPayloads[index] || queued.has(localKeys[index])) {
+                return;
+            }
+            queued.add(localKeys[index]);
+            tasks.push({
+                index,
+                calculator: getCalculatorInfo(window.style).name,
+                window: JSON.parse(JSON.stringify(window)),
+            });
+        });
+
+        // 按顺序格式化已经算好的窗户，表格随计算结果逐步更新
+        let nextIndex = 0;
+        const flushReadyWindows = async () => {
+            while (nextIndex < windows.length) {
+                const index = nextIndex;
+                let calculations = memoPayloads[index] || null;
                 if (!calculations) {
-                    console.warn(`窗户 #${index+1} 计算结果为空`);
-                    continue;
-                }
-                
-                // Format frame data for display in the frame details table
-                const frameData = this.formatFrameData(window, calculations);
-                console.log(`窗户 #${index+1} 框架数据:`, frameData);
-                if (frameData) {
-                    this.state.frameData.push(frameData);
-                    // 确保calculations对象包含格式化后的frameData
-                    if (!calculations.formattedFrame) {
-                        calculations.formattedFrame = frameData;
-                    }
-                }
-                
-                // Format sash data for display in the sash details table
-                const sashData = this.formatSashData(window, calculations);
-                console.log(`窗户 #${index+1} 嵌扇数据:`, sashData);
-                if (sashData) {
-                    this.state.sashData.push(sashData);
-                    // 确保calculations对象包含格式化后的sashData
-                    if (!calculations.formattedSash) {
-                        calculations.formattedSash = sashData;
-                    }
-                }
-                
-                // Format screen data for display in the screen table
-                const screenData = this.formatScreenData(window, calculations);
-                console.log(`窗户 #${index+1} 屏幕数据:`, screenData);
-                if (screenData) {
-                    this.state.screenData.push(screenData);
-                    // 确保calculations对象包含格式化后的screenData
-                    if (!calculations.formattedScreen) {
-                        calculations.formattedScreen = screenData;
-                    }
-                }
-                
-                // Format parts data for display in the parts table
-                const partsData = this.formatPartsData(window, calculations);
-                console.log(`窗户 #${index+1} 配件数据:`, partsData);
-                if (partsData) {
-                    this.state.partsData.push(partsData);
-                    // 确保calculations对象包含格式化后的partsData
-                    if (!calculations.formattedParts) {
-                        calculations.formattedParts = partsData;
-                    }
-                }
-                
-                // Format glass data for display in the glass table
-                const glassData = this.formatGlassData(window, calculations);
-                console.log(`窗户 #${index+1} 玻璃数据:`, glassData);
-                if (glassData && glassData.length > 0) {
-                    this.state.glassData.push(...glassData);
-                    // 确保calculations对象包含格式化后的glassData
-                    if (!calculations.formattedGlass) {
-                        calculations.formattedGlass = glassData;
+                    const raw = computed[localKeys[index]];
+                    if (raw === undefined) {
+                        break;
                     }
+                    calculations = raw ? JSON.parse(JSON.stringify(raw)) : null;
                 }
-                
-                // Format grid data for display in the grid table
-                const gridData = this.formatGridData(window, calculations);
-                console.log(`窗户 #${index+1} 网格数据:`, gridData);
-                if (gridData) {
-                    this.state.gridData.push(gridData);
-                    // 确保calculations对象包含格式化后的gridData
-                    if (!calculations.formattedGrid) {
-                        calculations.formattedGrid = gridData;
-                    }
-                }
-                
-                // 格式化焊接器数据
-                const welderData = this.formatWelderData(window, calculations);
-                console.log(`窗户 #${index+1} 焊接器数据:`, welderData);
-                if (welderData) {
-                    this.state.welderDataList.push(welderData);
-                    // 确保calculations对象包含格式化后的welderData
-                    if (!calculations.formattedWelder) {
-                        calculations.formattedWelder = welderData;
-                    }
+                nextIndex++;
+                console.log(`窗户 #${index+1} 计算结果:`, calculations);
+                await this.formatWindowCalculations(index, windows[index], calculations, calculationResults);
+            }
+        };
+        let formatting = Promise.resolve();
+        const onResults = (results) => {
+            for (const { task, result, error } of results) {
+                if (error) {
+                    console.error(`处理窗户 #${task.index+1} 时发生错误:`, error);
                 }
-                
-                // 格式化DECA数据
-                const decaData = await this.formatDecaData(window, calculations);
-                console.log(`窗户ID=${index+1} DECA数据:`, decaData);
-                if (decaData && decaData.length > 0) {
-                    this.state.decaData.push(...decaData);
-                    // 确保calculations对象包含格式化后的decaData
-                    if (!calculations.formattedDeca) {
-                        calculations.formattedDeca = decaData;
-                    }
+                computed[localKeys[task.index]] = result || null;
+                if (result && !result.error) {
+                    memoMisses.push({ window: memoInputs[task.index], payload: result });
                 }
-                
-                // 将计算结果添加到数组，以便后续批量保存
-                if (window.id) {
-                    // 添加窗户基本信息
-                    calculations.windowInfo = {
-                        customer: window.customer || '',
-                        style: window.style || '',
-                        width: window.width || 0,
-                        height: window.height || 0,
-                        fh: window.fh || '',
-                        frame: window.frame || '',
-                        glass: window.glass || '',
-                        argon: window.argon || false,
-                        grid: window.grid || '',
-                        grid_size: window.grid_size || '',
-                        color: window.color || '',
-                        note: window.note || '',
-                        item_id: window.id
-                    };
-                    
-                    // 添加格式化的窗户信息，保持与其他formatted*对象一致的格式
-                    calculations.formattedWindowInfo = {
-                        batch: this.state.batchNumber,
-                        customer: window.customer || '',
-                        style: window.style || '',
-                        width: window.width || 0,
-                        height: window.height || 0,
-                        fh: window.fh || '',
-                        id: window.id,
-                        frame: window.frame || '',
-                        glass: window.glass || '',
-                        argon: window.argon || false,
-                        grid: window.grid || '',
-                        grid_size: window.grid_size || '',
-                        color: window.color || '',
-                        note: window.note || ''
-                    };
-                    
-                    calculationResults.push({
-                        windowId: window.id,
-                        calculations: calculations
-                    });
-                }
-            } catch (error) {
-                console.error(`处理窗户 #${index+1} 时发生错误:`, error);
             }
-        }
-        
+            formatting = formatting.then(flushReadyWindows);
+            return formatting;
+        };
+
+        await this.computeWindowTasks(tasks, computed, localKeys, onResults);
+        await formatting;
+        await flushReadyWindows();
+
+        // 把新计算的结果写入缓存
+        await this.storeCalculationMemo(memoMisses);
+
         // 对Glass数据按ID和lineNumber排序
         if (this.state.glassData && this.state.glassData.length > 0) {
             // 先按ID排序，再按lineNumber排序
@@ -654,6 +578,10 @@ class CuttingListPreview extends Component {
                 
                 // 逐个保存每个窗户的计算结果
                 for (const result of calculationResults) {
+                    // 没有产品行的窗户(手动输入的数据)不保存
+                    if (!result.lineId) {
+                        continue;
+                    }
                     try {
                         // 只保存格式化后的数据，减少存储量
                         const calculationData = {
@@ -675,7 +603,7 @@ class CuttingListPreview extends Component {
                         const saveResult = await this.orm.call(
                             'window.calculation.result',
                             'save_calculation',
-                            [result.windowId, calculationData]
+                            [result.lineId, calculationData, this.state.productionId, result.windowId]
                         );
                         console.log(`窗户ID=${result.windowId} 计算结果保存成功:`, saveResult);
                     } catch (saveError) {
@@ -701,6 +629,277 @@ class CuttingListPreview extends Component {
         // console.log('- 网格数据:', this.state.gridData.length, '条', this.state.gridData);
     }
     
+    /**
+     * 把一个窗户的计算结果格式化到各个表格
+     * @param {Number} index - 窗户序号
+     * @param {Object} window - 窗户数据
+     * @param {Object} calculations - 计算结果
+     * @param {Array} calculationResults - 待保存的计算结果
+     */
+    async formatWindowCalculations(index, window, calculations, calculationResults) {
+        try {
+            // Store calculations for later use
+            window.calculations = calculations;
+            
+            // 确保calculations对象有效
+            if (!calculations) {
+                console.warn(`窗户 #${index+1} 计算结果为空`);
+                return;
+            }
+            
+            // Format frame data for display in the frame details table
+            const frameData = this.formatFrameData(window, calculations);
+            console.log(`窗户 #${index+1} 框架数据:`, frameData);
+            if (frameData) {
+                this.state.frameData.push(frameData);
+                // 确保calculations对象包含格式化后的frameData
+                if (!calculations.formattedFrame) {
+                    calculations.formattedFrame = frameData;
+                }
+            }
+            
+            // Format sash data for display in the sash details table
+            const sashData = this.formatSashData(window, calculations);
+            console.log(`窗户 #${index+1} 嵌扇数据:`, sashData);
+            if (sashData) {
+                this.state.sashData.push(sashData);
+                // 确保calculations对象包含格式化后的sashData
+                if (!calculations.formattedSash) {
+                    calculations.formattedSash = sashData;
+                }
+            }
+            
+            // Format screen data for display in the screen table
+            const screenData = this.formatScreenData(window, calculations);
+            console.log(`窗户 #${index+1} 屏幕数据:`, screenData);
+            if (screenData) {
+                this.state.screenData.push(screenData);
+                // 确保calculations对象包含格式化后的screenData
+                if (!calculations.formattedScreen) {
+                    calculations.formattedScreen = screenData;
+                }
+            }
+            
+            // Format parts data for display in the parts table
+            const partsData = this.formatPartsData(window, calculations);
+            console.log(`窗户 #${index+1} 配件数据:`, partsData);
+            if (partsData) {
+                this.state.partsData.push(partsData);
+                // 确保calculations对象包含格式化后的partsData
+                if (!calculations.formattedParts) {
+                    calculations.formattedParts = partsData;
+                }
+            }
+            
+            // Format glass data for display in the glass table
+            const glassData = this.formatGlassData(window, calculations);
+            console.log(`窗户 #${index+1} 玻璃数据:`, glassData);
+            if (glassData && glassData.length > 0) {
+                this.state.glassData.push(...glassData);
+                // 确保calculations对象包含格式化后的glassData
+                if (!calculations.formattedGlass) {
+                    calculations.formattedGlass = glassData;
+                }
+            }
+            
+            // Format grid data for display in the grid table
+            const gridData = this.formatGridData(window, calculations);
+            console.log(`窗户 #${index+1} 网格数据:`, gridData);
+            if (gridData) {
+                this.state.gridData.push(gridData);
+                // 确保calculations对象包含格式化后的gridData
+                if (!calculations.formattedGrid) {
+                    calculations.formattedGrid = gridData;
+                }
+            }
+            
+            // 格式化焊接器数据
+            const welderData = this.formatWelderData(window, calculations);
+            console.log(`窗户 #${index+1} 焊接器数据:`, welderData);
+            if (welderData) {
+                this.state.welderDataList.push(welderData);
+                // 确保calculations对象包含格式化后的welderData
+                if (!calculations.formattedWelder) {
+                    calculations.formattedWelder = welderData;
+                }
+            }
+            
+            // 格式化DECA数据
+            const decaData = await this.formatDecaData(window, calculations);
+            console.log(`窗户ID=${index+1} DECA数据:`, decaData);
+            if (decaData && decaData.length > 0) {
+                this.state.decaData.push(...decaData);
+                // 确保calculations对象包含格式化后的decaData
+                if (!calculations.formattedDeca) {
+                    calculations.formattedDeca = decaData;
+                }
+            }
+            
+            // 将计算结果添加到数组，以便后续批量保存
+            if (window.id) {
+                // 添加窗户基本信息
+                calculations.windowInfo = {
+                    customer: window.customer || '',
+                    style: window.style || '',
+                    width: window.width || 0,
+                    height: window.height || 0,
+                    fh: window.fh || '',
+                    frame: window.frame || '',
+                    glass: window.glass || '',
+                    argon: window.argon || false,
+                    grid: window.grid || '',
+                    grid_size: window.grid_size || '',
+                    color: window.color || '',
+                    note: window.note || '',
+                    item_id: window.id
+                };
+                
+                // 添加格式化的窗户信息，保持与其他formatted*对象一致的格式
+                calculations.formattedWindowInfo = {
+                    batch: this.state.batchNumber,
+                    customer: window.customer || '',
+                    style: window.style || '',
+                    width: window.width || 0,
+                    height: window.height || 0,
+                    fh: window.fh || '',
+                    id: window.id,
+                    frame: window.frame || '',
+                    glass: window.glass || '',
+                    argon: window.argon || false,
+                    grid: window.grid || '',
+                    grid_size: window.grid_size || '',
+                    color: window.color || '',
+                    note: window.note || ''
+                };
+                
+                calculationResults.push({
+                    windowId: window.id,
+                    lineId: window.line_id,
+                    calculations: calculations
+                });
+            }
+        } catch (error) {
+            console.error(`处理窗户 #${index+1} 时发生错误:`, error);
+        }
+    }
+
+    /**
+     * 计算未命中缓存的窗户
+     * 窗户较多且浏览器支持时交给Worker池，否则在主线程逐个计算
+     * @param {Array} tasks - [{index, calculator, window}]
+     * @param {Object} computed - 已完成的计算结果，按本地缓存键
+     * @param {Array} localKeys - 每个窗户的本地缓存键
+     * @param {Function} onResults - 结果回调
+     */
+    async computeWindowTasks(tasks, computed, localKeys, onResults) {
+        if (!tasks.length) {
+            return;
+        }
+        if (tasks.length >= WORKER_POOL_MIN_WINDOWS && CalculationWorkerPool.isSupported()) {
+            try {
+                const pool = await this.getWorkerPool();
+                await pool.run(tasks, {
+                    onResults,
+                    fallback: (task) => this.calculateOnMainThread(task),
+                });
+                return;
+            } catch (error) {
+                console.warn('Worker池计算失败，改在主线程计算:', error);
+            }
+        }
+        for (const task of tasks) {
+            if (computed[localKeys[task.index]] !== undefined) {
+                continue;
+            }
+            await onResults([await this.calculateOnMainThread(task)]);
+        }
+    }
+
+    /**
+     * 在主线程计算单个窗户
+     * @param {Object} task - {index, calculator, window}
+     * @returns {Promise<Object>} {task, result, error}
+     */
+    async calculateOnMainThread(task) {
+        try {
+            const calculate = await getCalculator(task.window.style);
+            return { task, result: await calculate(task.window) };
+        } catch (error) {
+            return { task, error: String((error && error.message) || error) };
+        }
+    }
+
+    /**
+     * 创建Worker池，公式只读取一次并发送给所有worker
+     * @returns {Promise<CalculationWorkerPool>}
+     */
+    async getWorkerPool() {
+        if (!this.workerPool) {
+            const formulas = await this.orm.searchRead(
+                'window.calculation.formula',
+                [],
+                ['style_name', 'formula_type', 'step_name', 'formula_string', 'sequence'],
+                { order: 'sequence, id' }
+            );
+            this.workerPool = new CalculationWorkerPool({ formulas });
+        }
+        return this.workerPool;
+    }
+
+    /**
+     * 提取参与计算缓存键的窗户输入
+     * @param {Object} window - 窗户数据
+     * @returns {Object} 缓存输入
+     */
+    getMemoInputs(window) {
+        return {
+            style: window.style || '',
+            width: window.width || '',
+            height: window.height || '',
+            frame: window.frame || '',
+            glass: window.glass || '',
+            grid: window.grid || '',
+            grid_size: window.grid_size || '',
+            fh: window.fh || '',
+        };
+    }
+
+    /**
+     * 批量查询计算缓存
+     * @param {Array} windows - 窗户数据数组
+     * @returns {Promise<Array>} 与输入顺序一致的缓存结果，未命中为false
+     */
+    async lookupCalculationMemo(windows) {
+        if (!windows || windows.length === 0) {
+            return [];
+        }
+        try {
+            return await this.orm.call(
+                'window.calculation.memo',
+                'lookup_batch',
+                [windows.map((window) => this.getMemoInputs(window))]
+            );
+        } catch (error) {
+            console.warn('查询计算缓存失败，将重新计算:', error);
+            return [];
+        }
+    }
+
+    /**
+     * 批量写入计算缓存
+     * @param {Array} entries - [{window, payload}]
+     */
+    async storeCalculationMemo(entries) {
+        if (!entries || entries.length === 0) {
+            return;
+        }
+        try {
+            await this.orm.call('window.calculation.memo', 'store_batch', [entries]);
+        } catch (error) {
+            console.warn('写入计算缓存失败:', error);
+        }
+    }
+
     /**
      * 格式化框架数据用于表格显示
      * @param {Object} window - 窗户数据
@@ -2039,6 +2238,18 @@ class CuttingListPreview extends Component {
         URL.revokeObjectURL(url);
     }
 
+    /**
+     * 从服务器导出已保存的计算数据CSV，服务端逐批读取数据库并分块传输
+     * @param {String} table - frame、sash、screen、parts、glass 或 grid
+     */
+    downloadStoredCSV(table) {
+        const link = document.createElement('a');
+        link.href = `/rich_production/export_csv/${this.state.productionId}/${table}`;
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+    }
+
     /**
      * 下载焊接器数据为CSV
      */
@@ -2162,6 +2373,11 @@ class CuttingListPreview extends Component {
      */
     downloadFrameDataCSV() {
         if (!this.state.frameData || this.state.frameData.length === 0) {
+            // 当前页面没有计算结果时从服务器导出已保存的数据
+            if (this.state.productionId) {
+                this.downloadStoredCSV('frame');
+                return;
+            }
             console.warn('没有框架数据可下载');
             this.notificationService.add("没有框架数据可下载", { type: "warning" });
             return;
@@ -2216,6 +2432,11 @@ class CuttingListPreview extends Component {
      */
     downloadSashDataCSV() {
         if (!this.state.sashData || this.state.sashData.length === 0) {
+            // 当前页面没有计算结果时从服务器导出已保存的数据
+            if (this.state.productionId) {
+                this.downloadStoredCSV('sash');
+                return;
+            }
             console.warn('没有嵌扇数据可下载');
             this.notificationService.add("没有嵌扇数据可下载", { type: "warning" });
             return;
@@ -2266,6 +2487,11 @@ class CuttingListPreview extends Component {
      */
     downloadScreenDataCSV() {
         if (!this.state.screenData || this.state.screenData.length === 0) {
+            // 当前页面没有计算结果时从服务器导出已保存的数据
+            if (this.state.productionId) {
+                this.downloadStoredCSV('screen');
+                return;
+            }
             console.warn('没有屏幕数据可下载');
             this.notificationService.add("没有屏幕数据可下载", { type: "warning" });
             return;
@@ -2306,6 +2532,11 @@ class CuttingListPreview extends Component {
      */
     downloadPartsDataCSV() {
         if (!this.state.partsData || this.state.partsData.length === 0) {
+            // 当前页面没有计算结果时从服务器导出已保存的数据
+            if (this.state.productionId) {
+                this.downloadStoredCSV('parts');
+                return;
+            }
             console.warn('没有配件数据可下载');
             this.notificationService.add("没有配件数据可下载", { type: "warning" });
             return;
@@ -2362,6 +2593,11 @@ class CuttingListPreview extends Component {
      */
     downloadGlassDataCSV() {
         if (!this.state.glassData || this.state.glassData.length === 0) {
+            // 当前页面没有计算结果时从服务器导出已保存的数据
+            if (this.state.productionId) {
+                this.downloadStoredCSV('glass');
+                return;
+            }
             console.warn('没有玻璃数据可下载');
             this.notificationService.add("没有玻璃数据可下载", { type: "warning" });
             return;
@@ -2416,6 +2652,11 @@ class CuttingListPreview extends Component {
      */
     downloadGridDataCSV() {
         if (!this.state.gridData || this.state.gridData.length === 0) {
+            // 当前页面没有计算结果时从服务器导出已保存的数据
+            if (this.state.productionId) {
+                this.downloadStoredCSV('grid');
+                return;
+            }
             console.warn('没有网格数据可下载');
             this.notificationService.add("没有网格数据可下载", { type: "warning" });
             return;
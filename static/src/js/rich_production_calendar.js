@@ -2,6 +2,7 @@
 import { Component, onWillStart, onMounted, onWillUnmount, useRef, useState, xml } from "@odoo/owl";
 import { registry } from "@web/core/registry";
 import { useService } from "@web/core/utils/hooks";
+import { rpc } from "@web/core/network/rpc";
 
 class FullCalendarView extends Component {
     setup() {
@@ -10,7 +11,8 @@ class FullCalendarView extends Component {
         this.notificationService = useService("notification");
         this.calendarRef = useRef("calendar"); // Ref to the calendar div
         this.calendar = null; // To hold the FullCalendar instance
-        this.state = useState({ events: [] });
+        this.state = useState({ events: [], proposal: null });
+        this.enablePlanning = true; // 只有生产日历提供排产预览
 
         console.log("FullCalendar Owl Component Setup");
 
@@ -26,8 +28,14 @@ class FullCalendarView extends Component {
         });
 
         onMounted(() => {
+            // 事件由events函数按可见日期范围加载
             this._initCalendar();
-            this._loadEvents(); // Load events after calendar is initialized
+            this.calendar?.addEventSource({
+                id: 'heatmap',
+                events: (info, successCallback, failureCallback) => {
+                    this._fetchHeatmap(info).then(successCallback, failureCallback);
+                },
+            });
         });
 
         onWillUnmount(() => {
@@ -62,7 +70,7 @@ class FullCalendarView extends Component {
             locale: 'zh-cn', // 使用中文
             firstDay: 1, // 周一开始
             // 事件处理
-            events: this.state.events,
+            events: this._getEventSource(),
             dayMaxEvents: false, // 不限制每天的事件数量，允许正常显示而非"+更多"
             eventTimeFormat: {
                 hour: '2-digit',
@@ -80,46 +88,70 @@ class FullCalendarView extends Component {
             eventDidMount: (info) => {
                 this._enhanceEventDisplay(info.el, info.event);
             },
+            // 只有排产预览中的事件可以拖动
+            eventDrop: (info) => this._onProposalDrop(info),
             dateClick: (info) => this._createNewProductionOnDate(info.date)
         });
         
         this.calendar.render();
     }
 
-    async _loadEvents() {
+    // 日历切换日期范围时只加载可见范围内的批次
+    _getEventSource() {
+        return (info, successCallback, failureCallback) => {
+            this._fetchEvents(info).then(successCallback, failureCallback);
+        };
+    }
+
+    async _fetchEvents(info) {
         try {
-            // Request minimal fields first to isolate the error
-            const records = await this.orm.searchRead(
-                'rich_production.production',
-                [], // domain
-                // Minimal fields:
-                ['name', 'batch', 'batch_number', 'start_date', 'stop_date']
-            );
+            const { columns, rows } = await rpc('/rich_production/calendar/feed', {
+                start: this._toDateString(info.start),
+                end: this._toDateString(info.end),
+            });
+            const records = rows.map((row) => Object.fromEntries(columns.map((column, index) => [column, row[index]])));
+            const events = this._formatEvents(records);
+            this.state.events = events;
+            console.log(`Loaded ${events.length} events for ${info.startStr} - ${info.endStr}.`);
+            return events;
+        } catch (error) {
+            console.error("Error loading calendar feed:", error);
+            this.notificationService.add("Failed to load events", { type: "danger" });
+            throw error;
+        }
+    }
 
-            // Add defaults for fields used later, even if not fetched initially
-            const formattedRecords = records.map(record => {
+    async _loadEvents() {
+        this.calendar?.refetchEvents();
+    }
+
+    // 每天的负载/容量显示为背景色
+    async _fetchHeatmap(info) {
+        try {
+            const days = await rpc('/rich_production/calendar/heatmap', {
+                start: this._toDateString(info.start),
+                end: this._toDateString(info.end),
+            });
+            return Object.entries(days).map(([day, [items, capacity]]) => {
+                const ratio = capacity ? items / capacity : 0;
+                let color = '#2ecc71'; // 负载低 - 绿色
+                if (capacity ? ratio >= 1 : items > 0) {
+                    color = '#e74c3c'; // 超出容量或没有容量 - 红色
+                } else if (ratio >= 0.75) {
+                    color = '#f1c40f'; // 接近容量 - 黄色
+                }
                 return {
-                    ...record,
-                    customer_id: record.customer_id || null, // Default if not fetched
-                    user_id: record.user_id || null,       // Default if not fetched
-                    state: record.state || 'draft',       // Default if not fetched
-                    notes: record.notes || '',           // Default if not fetched
-                    total_items: record.total_items || 0,
-                    color: record.color || null,
-                    invoice_ids: record.invoice_ids || []
+                    id: `heatmap-${day}`,
+                    title: capacity ? `${Math.round(items)}/${Math.round(capacity)}` : `${Math.round(items)}`,
+                    start: this._toLocalDate(day),
+                    allDay: true,
+                    display: 'background',
+                    backgroundColor: color,
                 };
             });
-
-            const events = this._formatEvents(formattedRecords);
-            this.state.events = events; // Update component state
-            if (this.calendar) {
-                this.calendar.removeAllEvents();
-                this.calendar.addEventSource(events);
-                console.log(`Loaded ${events.length} events via ORM service (Minimal Fields).`);
-            }
         } catch (error) {
-            console.error("Error loading events via ORM service:", error);
-            this.notificationService.add("Failed to load events", { type: "danger" });
+            console.error("Error loading capacity heatmap:", error);
+            return [];
         }
     }
     
@@ -144,8 +176,8 @@ class FullCalendarView extends Component {
 
             const startDate = record.start_date ? createLocalDate(record.start_date) : null;
             const endDate = record.stop_date ? createLocalDate(record.stop_date) : null;
-            const customerName = record.customer_id ? record.customer_id[1] : '';
-            const userName = record.user_id ? record.user_id[1] : '';
+            const customerName = record.customer || '';
+            const userName = record.responsible || '';
 
             if (!startDate) {
                 console.warn(`Record ID ${record.id} has invalid start date: ${record.start_date}`);
@@ -197,7 +229,7 @@ class FullCalendarView extends Component {
     }
 
     _enhanceEventDisplay(eventEl, event) {
-        if (!event.extendedProps) return;
+        if (!event.extendedProps || event.display === 'background') return;
 
         const batch = event.extendedProps.batch;
         const batch_number = event.extendedProps.batch_number;
@@ -302,6 +334,14 @@ class FullCalendarView extends Component {
                 infoContainer.appendChild(stateEl);
             }
             
+            // 排产预览显示交付日期
+            if (event.extendedProps.proposal && event.extendedProps.due) {
+                const dueEl = document.createElement('div');
+                dueEl.className = event.extendedProps.late ? 'fc-event-due fw-bold' : 'fc-event-due';
+                dueEl.textContent = `交期: ${event.extendedProps.due}${event.extendedProps.late ? ' (超期)' : ''}`;
+                infoContainer.appendChild(dueEl);
+            }
+            
             // 将信息容器添加到事件内容中
             if (infoContainer.children.length > 0) {
                 eventContent.appendChild(infoContainer);
@@ -309,6 +349,112 @@ class FullCalendarView extends Component {
         }
     }
 
+    // 日期字符串 <-> 本地日期，避免时区转换问题
+    _toLocalDate(dateString) {
+        const [year, month, day] = dateString.split('-').map((part) => parseInt(part));
+        return new Date(year, month - 1, day);
+    }
+
+    _toDateString(date) {
+        return date.getFullYear() + '-' +
+               String(date.getMonth() + 1).padStart(2, '0') + '-' +
+               String(date.getDate()).padStart(2, '0');
+    }
+
+    async _proposeSchedule() {
+        try {
+            const proposal = await this.orm.call('rich_production.scheduler', 'propose_schedule', []);
+            if (!proposal.items.length) {
+                this.notificationService.add("没有需要排产的草稿批次", { type: "info" });
+                return;
+            }
+            this._showProposal(proposal);
+        } catch (error) {
+            console.error("Error proposing schedule:", error);
+            this.notificationService.add("Failed to propose schedule", { type: "danger" });
+        }
+    }
+
+    _showProposal(proposal) {
+        this.state.proposal = proposal;
+        if (!this.calendar) return;
+        this.calendar.getEventSourceById('proposal')?.remove();
+        this.calendar.addEventSource({ id: 'proposal', events: this._formatProposalEvents(proposal) });
+    }
+
+    _formatProposalEvents(proposal) {
+        const events = proposal.items.map((item) => {
+            const color = item.late ? '#e67e22' : '#9b59b6'; // 超期 - 橙色, 计划 - 紫色
+            return {
+                id: `plan-${item.id}`,
+                title: item.title,
+                start: this._toLocalDate(item.start),
+                end: this._toLocalDate(item.stop),
+                allDay: true,
+                startEditable: true,
+                durationEditable: false,
+                classNames: ['o_rich_proposed'],
+                backgroundColor: color,
+                borderColor: color,
+                extendedProps: {
+                    proposal: true,
+                    record_id: item.id,
+                    total_items: item.items,
+                    due: item.due,
+                    late: item.late,
+                    state: 'draft'
+                }
+            };
+        });
+        // 超出每日产能的日期用背景色标出
+        for (const day of proposal.overloaded) {
+            events.push({
+                start: this._toLocalDate(day),
+                allDay: true,
+                display: 'background',
+                backgroundColor: '#e74c3c'
+            });
+        }
+        return events;
+    }
+
+    async _onProposalDrop(info) {
+        if (!info.event.extendedProps.proposal || !this.state.proposal) {
+            info.revert();
+            return;
+        }
+        try {
+            const proposal = await this.orm.call('rich_production.scheduler', 'reschedule', [
+                this.state.proposal,
+                info.event.extendedProps.record_id,
+                this._toDateString(info.event.start),
+            ]);
+            this._showProposal(proposal);
+        } catch (error) {
+            console.error("Error rescheduling batch:", error);
+            info.revert();
+            this.notificationService.add("Failed to reschedule batch", { type: "danger" });
+        }
+    }
+
+    async _applyProposal() {
+        const items = this.state.proposal.items.map(({ id, start, stop }) => ({ id, start, stop }));
+        try {
+            const count = await this.orm.call('rich_production.scheduler', 'apply_schedule', [items]);
+            this._discardProposal();
+            await this._loadEvents();
+            this.notificationService.add(`已更新 ${count} 个批次的日期`, { type: "success" });
+        } catch (error) {
+            console.error("Error applying schedule:", error);
+            this.notificationService.add("Failed to apply schedule", { type: "danger" });
+        }
+    }
+
+    _discardProposal() {
+        this.state.proposal = null;
+        this.calendar?.getEventSourceById('proposal')?.remove();
+    }
+
     _openEventForm(event) {
         if (!event.extendedProps || !event.extendedProps.record_id) return;
         this.actionService.doAction({
@@ -383,11 +529,22 @@ class FullCalendarView extends Component {
     }
 }
 
-// 更新Production Calendar模板，移除按钮
+// 更新Production Calendar模板，只保留排产预览按钮
 FullCalendarView.template = xml`
     <div class="o_fullcalendar_container d-flex flex-column">
         <div class="text-center my-3">
             <h3 class="text-primary">Production Calendar</h3>
+            <button t-if="enablePlanning and !state.proposal" class="btn btn-secondary btn-sm" t-on-click="_proposeSchedule">排产预览</button>
+        </div>
+        <div t-if="state.proposal" class="alert alert-info d-flex align-items-center mx-4">
+            <span class="flex-grow-1">
+                排产预览: <t t-esc="state.proposal.items.length"/> 个批次,
+                每日产能 <t t-esc="state.proposal.capacity"/>,
+                超期 <t t-esc="state.proposal.items.filter((item) => item.late).length"/> 个,
+                超产能 <t t-esc="state.proposal.overloaded.length"/> 天。拖动紫色批次调整日期。
+            </span>
+            <button class="btn btn-primary btn-sm me-2" t-on-click="_applyProposal">应用</button>
+            <button class="btn btn-secondary btn-sm" t-on-click="_discardProposal">放弃</button>
         </div>
         <div class="o_fullcalendar_view flex-grow-1 overflow-auto px-4" style="height: auto; min-height: calc(100vh - 150px);">
             <div class="fc-calendar-container" t-ref="calendar"></div>
@@ -432,6 +589,11 @@ class ScheduleCalendarView extends FullCalendarView {
         });
     }
     
+    // 发票事件由_loadEvents一次加载
+    _getEventSource() {
+        return this.state.events;
+    }
+    
     // 重写_loadEvents方法，加载所有invoice数据
     async _loadEvents() {
         try {
@@ -688,6 +850,11 @@ class DeliveryCalendarView extends FullCalendarView {
         });
     }
     
+    // 不加载任何数据
+    _getEventSource() {
+        return [];
+    }
+    
     // 重写_loadEvents方法，不加载任何数据
     async _loadEvents() {
         // 空方法，不加载任何数据
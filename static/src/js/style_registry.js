@@ -0,0 +1,201 @@
+/** @odoo-module **/
+
+// -*- coding: utf-8 -*-
+// Rich Production window style calculator registry
+import { loadBundle } from "@web/core/assets";
+import { processWindowData as processXOOXWindowData } from "./window_calculations/xo_ox_window";
+
+const CALCULATOR_PATH = "/rich_production/static/src/js/window_calculations/";
+
+// 旧版计算器共用的模块，首次加载任意旧版计算器前加载
+const COMMON_BUNDLE = "rich_production.window_calculator_common";
+export const CALCULATOR_COMMON_PATH = `${CALCULATOR_PATH}abstract_window.js`;
+
+/**
+ * 样式计算器定义
+ * module: odoo.define 模块名; bundle: 惰性加载的资源包; kind: 'module' 或 'class'
+ */
+const CALCULATORS = {
+    xo_ox_window: { builtin: true },
+    xox_window: {},
+    picture_window: {},
+    sh_window: {},
+    sh_p_window: {},
+    h_pp_window: {},
+    h_ppp_windows: {},
+    v_pp_window: {},
+    p_xo_ox_window: {},
+    xo_p_ox_p_window: {},
+    p_pp_window: {},
+    pp_xo_ox_window: {},
+    pp_xox_window: {},
+    ppp_xox_window: {},
+    xox_pp_window: {},
+    xox_ppp_window: {},
+    xo_pp_window: { kind: "class" },
+    xo_pp_ox_pp_window: { kind: "class" },
+};
+
+for (const [name, calculator] of Object.entries(CALCULATORS)) {
+    calculator.name = name;
+    calculator.path = `${CALCULATOR_PATH}${name}.js`;
+    calculator.module = `rich_production.${name}`;
+    calculator.bundle = `rich_production.window_calculator_${name}`;
+    calculator.kind = calculator.kind || "module";
+}
+
+// 默认计算器，与之前的预览行为一致
+export const DEFAULT_CALCULATOR = "xo_ox_window";
+
+/**
+ * style_name -> 计算器名称
+ * 键为规范化后的样式名称(大写，下划线和空格换成连字符)
+ */
+const STYLE_ALIASES = {
+    "XO": "xo_ox_window",
+    "OX": "xo_ox_window",
+    "XOX": "xox_window",
+    "P": "picture_window",
+    "PICTURE": "picture_window",
+    "SH": "sh_window",
+    "SH-P": "sh_p_window",
+    "H-PP": "h_pp_window",
+    "H-PPP": "h_ppp_windows",
+    "V-PP": "v_pp_window",
+    "P-XO": "p_xo_ox_window",
+    "P-OX": "p_xo_ox_window",
+    "XO-P": "xo_p_ox_p_window",
+    "OX-P": "xo_p_ox_p_window",
+    "P-PP": "p_pp_window",
+    "PP-XO": "pp_xo_ox_window",
+    "PP-OX": "pp_xo_ox_window",
+    "PP-XOX": "pp_xox_window",
+    "PPP-XOX": "ppp_xox_window",
+    "XOX-PP": "xox_pp_window",
+    "XOX-PPP": "xox_ppp_window",
+    "XO-PP": "xo_pp_window",
+    "OX-PP": "xo_pp_window",
+    "XO-PP-OX-PP": "xo_pp_ox_pp_window",
+};
+
+// 按长度从长到短，避免 'XO' 抢先匹配 'XO-PP'
+const ALIASES_BY_LENGTH = Object.keys(STYLE_ALIASES).sort((a, b) => b.length - a.length);
+
+// 已加载的计算器: 名称 -> Promise<processWindowData>
+const loadedCalculators = {
+    xo_ox_window: Promise.resolve(processXOOXWindowData),
+};
+
+/**
+ * 规范化样式名称
+ * @param {string} styleName - 样式名称
+ * @returns {string} 规范化后的名称
+ */
+export function normalizeStyle(styleName) {
+    return String(styleName || "").trim().toUpperCase().replace(/[\s_]+/g, "-");
+}
+
+/**
+ * 从产品名称中识别样式
+ * @param {string} productName - 产品名称
+ * @returns {string} 样式名称，未识别时返回空字符串
+ */
+export function detectStyle(productName) {
+    const name = normalizeStyle(productName);
+    for (const alias of ALIASES_BY_LENGTH) {
+        const escaped = alias.replace(/[-]/g, "\\-");
+        if (new RegExp(`(^|[^A-Z])${escaped}([^A-Z]|$)`).test(name)) {
+            return alias;
+        }
+    }
+    return "";
+}
+
+/**
+ * 获取样式对应的计算器定义
+ * @param {string} styleName - 样式名称
+ * @returns {Object} 计算器定义，未知样式返回默认计算器
+ */
+export function getCalculatorInfo(styleName) {
+    const name = STYLE_ALIASES[normalizeStyle(styleName)] || DEFAULT_CALCULATOR;
+    return CALCULATORS[name];
+}
+
+/**
+ * 所有计算器定义
+ * @returns {Array} 计算器定义数组
+ */
+export function getCalculators() {
+    return Object.values(CALCULATORS);
+}
+
+/**
+ * 把类式计算器包装成 processWindowData
+ */
+function wrapClassCalculator(WindowClass) {
+    return (windowData) => {
+        const instance = new WindowClass(String(windowData.style || "").split("-")[0] || undefined);
+        instance.units = "inches";
+        return instance.calculateDimensions(
+            windowData.width,
+            windowData.height,
+            windowData.frame,
+            /Tempered/.test(windowData.glass || ""),
+            windowData.glass,
+            windowData.grid,
+            windowData.fh || 0
+        );
+    };
+}
+
+async function loadCalculator(calculator) {
+    await loadBundle(COMMON_BUNDLE);
+    await loadBundle(calculator.bundle);
+    const exported = odoo.loader.modules.get(calculator.module);
+    if (!exported) {
+        throw new Error(`计算器模块 ${calculator.module} 未定义`);
+    }
+    if (calculator.kind === "class") {
+        return wrapClassCalculator(exported);
+    }
+    return (windowData) => exported.processWindowData({
+        ...windowData,
+        // P-PP 等组合样式计算器使用的字段名
+        glassType: windowData.glassType || windowData.glass,
+        fixedHeight: windowData.fixedHeight || windowData.fh || 0,
+    });
+}
+
+function getCalculatorByName(name) {
+    const calculator = CALCULATORS[name] || CALCULATORS[DEFAULT_CALCULATOR];
+    if (!loadedCalculators[calculator.name]) {
+        loadedCalculators[calculator.name] = loadCalculator(calculator).catch((error) => {
+            console.error(`加载计算器 ${calculator.name} 失败，使用默认计算器:`, error);
+            return processXOOXWindowData;
+        });
+    }
+    return loadedCalculators[calculator.name];
+}
+
+/**
+ * 获取样式的计算函数，首次使用时才加载对应的资源包
+ * @param {string} styleName - 样式名称
+ * @returns {Promise<Function>} processWindowData
+ */
+export function getCalculator(styleName) {
+    return getCalculatorByName(getCalculatorInfo(styleName).name);
+}
+
+/**
+ * 预加载一组样式的计算器，只加载当前生产中出现的样式
+ * @param {Array} styleNames - 样式名称数组
+ * @returns {Promise<Object>} 计算器名称 -> processWindowData
+ */
+export async function preloadCalculators(styleNames) {
+    const names = [...new Set(styleNames.map((styleName) => getCalculatorInfo(styleName).name))];
+    const calculators = {};
+    await Promise.all(names.map(async (name) => {
+        calculators[name] = await getCalculatorByName(name);
+    }));
+    return calculators;
+}
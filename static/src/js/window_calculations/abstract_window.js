@@ -0,0 +1,66 @@
+/**
+ * Abstract Window
+ * 旧版样式计算器共用的基础模块: 窗口类型处理程序登记和简单的类继承
+ */
+odoo.define('rich_production.abstract_window', [], function (require) {
+    'use strict';
+
+    // 窗口类型 -> processWindowData
+    const windowHandlers = {};
+
+    /**
+     * 登记窗口类型的处理程序
+     * @param {string} windowType - 窗口类型，例如 'P-PP'
+     * @param {Function} handler - processWindowData函数
+     */
+    function registerWindowHandler(windowType, handler) {
+        windowHandlers[windowType] = handler;
+    }
+
+    /**
+     * 获取窗口类型的处理程序
+     * @param {string} windowType - 窗口类型
+     * @returns {Function|undefined} 处理程序
+     */
+    function getWindowHandler(windowType) {
+        return windowHandlers[windowType];
+    }
+
+    /**
+     * 基于原型创建窗口类，init作为构造函数，_super调用父类方法
+     * @param {Object} proto - 类的方法
+     * @returns {Function} 窗口类
+     */
+    function extend(proto) {
+        function Window() {
+            if (typeof this.init === 'function') {
+                this.init.apply(this, arguments);
+            }
+        }
+        Object.keys(proto).forEach((name) => {
+            const method = proto[name];
+            if (typeof method !== 'function') {
+                Window.prototype[name] = method;
+                return;
+            }
+            Window.prototype[name] = function () {
+                // 基类没有实现，_super为空操作
+                const previous = this._super;
+                this._super = function () {};
+                try {
+                    return method.apply(this, arguments);
+                } finally {
+                    this._super = previous;
+                }
+            };
+        });
+        Window.prototype.units = 'inches';
+        return Window;
+    }
+
+    return {
+        extend,
+        registerWindowHandler,
+        getWindowHandler,
+    };
+});
@@ -3,10 +3,10 @@
  * Contains functions for calculating dimensions for P-PP style windows
  * (Single Picture on bottom, Double Picture on top)
  */
-odoo.define('rich_custom.p_pp_window', function (require) {
+odoo.define('rich_production.p_pp_window', ['rich_production.abstract_window'], function (require) {
     'use strict';
 
-    var abstractWindow = require('rich_custom.abstract_window');
+    var abstractWindow = require('rich_production.abstract_window');
 
     /**
      * 精确舍入到指定小数位数 (模拟Application.Round)
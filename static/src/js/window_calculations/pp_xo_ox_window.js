@@ -3,10 +3,10 @@
  * Contains functions for calculating dimensions for PP-XO and PP-OX style windows
  * (Picture-Picture on top, XO or OX on bottom)
  */
-odoo.define('rich_custom.pp_xo_ox_window', function (require) {
+odoo.define('rich_production.pp_xo_ox_window', ['rich_production.abstract_window'], function (require) {
     'use strict';
 
-    var abstractWindow = require('rich_custom.abstract_window');
+    var abstractWindow = require('rich_production.abstract_window');
 
     /**
      * 精确舍入到指定小数位数 (模拟Application.Round)
@@ -1,7 +1,7 @@
-odoo.define('rich_custom.xo_pp_ox_pp_window', function (require) {
+odoo.define('rich_production.xo_pp_ox_pp_window', ['rich_production.abstract_window'], function (require) {
     "use strict";
 
-    var abstractWindow = require('rich_custom.abstract_window');
+    var abstractWindow = require('rich_production.abstract_window');
 
     var XO_PP_OX_PP_Window = abstractWindow.extend({
         init: function() {
@@ -2,10 +2,10 @@
  * XO-PP Window Style Calculations
  * Contains functions for calculating dimensions for XO-PP and OX-PP style windows
  */
-odoo.define('rich_custom.xo_pp_window', function (require) {
+odoo.define('rich_production.xo_pp_window', ['rich_production.abstract_window'], function (require) {
     'use strict';
 
-    var abstractWindow = require('rich_custom.abstract_window');
+    var abstractWindow = require('rich_production.abstract_window');
 
     /**
      * 精确舍入到指定小数位数 (模拟Application.Round)
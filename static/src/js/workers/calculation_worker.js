@@ -0,0 +1,132 @@
+/**
+ * 窗户计算 Web Worker
+ * 独立脚本，不进入资源包。由 calculation_worker_pool.js 创建，
+ * 在后台线程中加载样式计算器并按块计算窗户数据。
+ *
+ * 消息协议:
+ *   init   {formulas, calculators, commonPath}
+ *   chunk  {chunkId, buffer}  buffer 为 [{index, calculator, window}] 的JSON编码(可转移)
+ *   result {chunkId, buffer}  buffer 为 [{index, result, error}] 的JSON编码(可转移)
+ */
+'use strict';
+
+const encoder = new TextEncoder();
+const decoder = new TextDecoder();
+
+let formulas = [];
+let calculatorInfos = {};
+let commonPath = null;
+
+// odoo.define 模块: 名称 -> {deps, factory, exports}
+const definedModules = {};
+const loadedCalculators = {};
+
+self.odoo = {
+    define(name, deps, factory) {
+        definedModules[name] = { deps, factory, exports: undefined, loaded: false };
+    },
+};
+
+function requireModule(name) {
+    const module = definedModules[name];
+    if (!module) {
+        throw new Error(`模块 ${name} 未定义`);
+    }
+    if (!module.loaded) {
+        module.exports = module.factory(requireModule);
+        module.loaded = true;
+    }
+    return module.exports;
+}
+
+/**
+ * 公式查询，替代主线程的rpc调用
+ */
+async function rpc(route, params) {
+    const domain = (params.args && params.args[0]) || [];
+    return formulas
+        .filter((formula) => domain.every(([name, , value]) => formula[name] === value))
+        .sort((a, b) => a.sequence - b.sequence || a.id - b.id);
+}
+
+/**
+ * 加载ES模块形式的计算器(xo_ox_window)，去掉rpc导入并收集导出
+ */
+async function loadEsmCalculator(info) {
+    const response = await fetch(info.path);
+    const source = (await response.text())
+        .replace(/^\s*import\s+\{\s*rpc\s*\}\s+from\s+["']@web\/core\/network\/rpc["'];?\s*$/m, '')
+        .replace(/^\s*export\s*\{([\s\S]*?)\};?\s*$/m, 'module.exports = {$1};');
+    const module = { exports: {} };
+    new Function('rpc', 'module', source)(rpc, module);
+    return module.exports.processWindowData;
+}
+
+function loadLegacyCalculator(info) {
+    if (commonPath && !definedModules['rich_production.abstract_window']) {
+        importScripts(commonPath);
+    }
+    importScripts(info.path);
+    const exported = requireModule(info.module);
+    if (info.kind === 'class') {
+        return (windowData) => {
+            const instance = new exported(String(windowData.style || '').split('-')[0] || undefined);
+            instance.units = 'inches';
+            return instance.calculateDimensions(
+                windowData.width, windowData.height, windowData.frame,
+                /Tempered/.test(windowData.glass || ''), windowData.glass, windowData.grid,
+                windowData.fh || 0
+            );
+        };
+    }
+    return (windowData) => exported.processWindowData({
+        ...windowData,
+        glassType: windowData.glassType || windowData.glass,
+        fixedHeight: windowData.fixedHeight || windowData.fh || 0,
+    });
+}
+
+function getCalculator(name) {
+    if (!loadedCalculators[name]) {
+        const info = calculatorInfos[name];
+        if (!info) {
+            return Promise.reject(new Error(`未知计算器 ${name}`));
+        }
+        loadedCalculators[name] = info.esm
+            ? loadEsmCalculator(info)
+            : Promise.resolve().then(() => loadLegacyCalculator(info));
+    }
+    return loadedCalculators[name];
+}
+
+async function processChunk(tasks) {
+    const results = [];
+    for (const task of tasks) {
+        try {
+            const calculate = await getCalculator(task.calculator);
+            results.push({ index: task.index, result: await calculate(task.window) });
+        } catch (error) {
+            results.push({ index: task.index, error: String((error && error.message) || error) });
+        }
+    }
+    return results;
+}
+
+self.onmessage = async (event) => {
+    const message = event.data;
+    if (message.type === 'init') {
+        formulas = message.formulas || [];
+        calculatorInfos = message.calculators || {};
+        commonPath = message.commonPath || null;
+        // 计算器日志在后台线程中没有意义，且会拖慢计算
+        console.log = () => {};
+        console.info = () => {};
+        return;
+    }
+    if (message.type === 'chunk') {
+        const tasks = JSON.parse(decoder.decode(message.buffer));
+        const results = await processChunk(tasks);
+        const buffer = encoder.encode(JSON.stringify(results)).buffer;
+        self.postMessage({ type: 'result', chunkId: message.chunkId, buffer }, [buffer]);
+    }
+};
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""run_golden.js --server 使用的服务端计算入口
+
+不需要启动odoo: 直接按路径加载 models/xo_ox_engine.py，公式从
+data/window_calculation_formula_data.xml 读取。
+
+    python3 static/tests/golden/run_engine.py --style=xo_ox_window < inputs.json
+"""
+import importlib.util
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+MODULE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+
+def load_engine():
+    path = os.path.join(MODULE_ROOT, 'models', 'xo_ox_engine.py')
+    spec = importlib.util.spec_from_file_location('xo_ox_engine', path)
+    engine = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(engine)
+    return engine
+
+
+def load_formulas(engine):
+    tree = ET.parse(os.path.join(MODULE_ROOT, 'data', 'window_calculation_formula_data.xml'))
+    rows = []
+    for record in tree.iter('record'):
+        if record.get('model') != 'window.calculation.formula':
+            continue
+        values = {field.get('name'): (field.text or '') for field in record.iter('field')}
+        if values.get('style_name') != engine.STYLE_NAME:
+            continue
+        rows.append((int(values.get('sequence') or 10), values['formula_type'], values['formula_string']))
+    rows.sort(key=lambda row: row[0])
+    return {
+        formula_type: engine.compile_formulas([row[2] for row in rows if row[1] == formula_type])
+        for formula_type in ('nailon', 'other')
+    }
+
+
+def main():
+    style = ''
+    for arg in sys.argv[1:]:
+        if arg.startswith('--style='):
+            style = arg[len('--style='):]
+    engine = load_engine()
+    if style != engine.STYLE_NAME:
+        json.dump({'unsupported': True}, sys.stdout)
+        return
+    inputs = json.load(sys.stdin)
+    formulas = load_formulas(engine)
+    start = time.perf_counter()
+    results = [engine.process_window_data(window, formulas) for window in inputs]
+    seconds = time.perf_counter() - start
+    json.dump({'results': engine.to_json_compatible(results), 'seconds': seconds}, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,488 @@
+#!/usr/bin/env node
+/**
+ * 窗户计算器黄金输出回归测试
+ *
+ * 在Node中直接加载 static/src/js/window_calculations 下的计算器，
+ * 用 fixtures/<模块名>.json 中的输入重新计算，与记录的 frame/sash/screen/parts/glass/grid 输出比较，
+ * 并报告每个样式的吞吐量(窗户/秒)。
+ *
+ * 用法:
+ *   node static/tests/golden/run_golden.js                 # 检查全部样式
+ *   node static/tests/golden/run_golden.js --style=sh_window
+ *   node static/tests/golden/run_golden.js --update        # 用当前计算器重新生成期望输出
+ *   node static/tests/golden/run_golden.js --server="python3 static/tests/golden/run_engine.py"
+ *
+ * --server 指定的命令按样式调用一次: `<命令> --style=<模块名>`，
+ * 从stdin读取输入数组(JSON)，向stdout输出 {"results": [...], "seconds": 耗时} 或 {"unsupported": true}。
+ */
+'use strict';
+
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+const { spawnSync } = require('child_process');
+
+const MODULE_ROOT = path.resolve(__dirname, '..', '..', '..');
+const CALCULATOR_DIR = path.join(MODULE_ROOT, 'static', 'src', 'js', 'window_calculations');
+const FORMULA_DATA = path.join(MODULE_ROOT, 'data', 'window_calculation_formula_data.xml');
+const FIXTURE_DIR = path.join(__dirname, 'fixtures');
+
+// 数值比较容差
+const TOLERANCE = 1e-6;
+
+// 计算器目录下的共用模块
+const NON_CALCULATOR_MODULES = ['abstract_window.js'];
+
+// 参与比较的输出部分
+const OUTPUT_PARTS = ['frame', 'sash', 'screen', 'parts', 'glass', 'grid'];
+
+// 扁平windowData中各输出部分的字段前缀，其余非输入字段归入parts
+const FLAT_SECTIONS = [
+    ['frame', /^frame./],
+    ['sash', /^sash/],
+    ['screen', /^screen/],
+    ['glass', /^glass(?!Type$)./],
+    ['grid', /^(grid(?!_size$).|config[A-Z]|lightCount$)/],
+];
+
+// 扁平windowData中回显输入或单位换算的字段，不参与比较
+const FLAT_ECHO_KEYS = /^(isTempered|windowOrientation|windowType)$|Mm$/;
+
+function parseArgs(argv) {
+    const args = { update: false, style: null, server: null, benchMs: 300 };
+    for (const arg of argv) {
+        if (arg === '--update') {
+            args.update = true;
+        } else if (arg.startsWith('--style=')) {
+            args.style = arg.slice('--style='.length);
+        } else if (arg.startsWith('--server=')) {
+            args.server = arg.slice('--server='.length);
+        } else if (arg.startsWith('--bench-ms=')) {
+            args.benchMs = parseInt(arg.slice('--bench-ms='.length), 10) || args.benchMs;
+        }
+    }
+    return args;
+}
+
+/**
+ * 从数据文件中读取公式，替代浏览器中的rpc调用
+ */
+function loadFormulas() {
+    const xml = fs.readFileSync(FORMULA_DATA, 'utf8');
+    const formulas = [];
+    const recordRe = /<record[^>]*model="window\.calculation\.formula"[^>]*>([\s\S]*?)<\/record>/g;
+    const decode = (text) => text
+        .replace(/&lt;/g, '<').replace(/&gt;/g, '>')
+        .replace(/&quot;/g, '"').replace(/&apos;/g, "'").replace(/&amp;/g, '&');
+    let match;
+    let id = 0;
+    while ((match = recordRe.exec(xml)) !== null) {
+        const record = { id: ++id };
+        const fieldRe = /<field name="([^"]+)">([\s\S]*?)<\/field>/g;
+        let field;
+        while ((field = fieldRe.exec(match[1])) !== null) {
+            record[field[1]] = decode(field[2].trim());
+        }
+        record.sequence = parseInt(record.sequence || '10', 10);
+        formulas.push(record);
+    }
+    return formulas;
+}
+
+function makeRpcStub(formulas) {
+    return async function rpc(route, params) {
+        if (route !== '/web/dataset/call_kw' || params.model !== 'window.calculation.formula') {
+            throw new Error(`harness: unsupported rpc ${route}`);
+        }
+        const domain = params.args[0] || [];
+        return formulas
+            .filter((formula) => domain.every(([name, , value]) => formula[name] === value))
+            .sort((a, b) => a.sequence - b.sequence || a.id - b.id);
+    };
+}
+
+/**
+ * 加载一个计算器模块，返回 {kind, exports}
+ * odoo.define 的依赖(rich_production.*)从同一目录加载
+ */
+function loadCalculator(moduleName, formulas, loaded = {}) {
+    const file = path.join(CALCULATOR_DIR, `${moduleName}.js`);
+    let source = fs.readFileSync(file, 'utf8');
+    const sandbox = { console, module: { exports: {} } };
+
+    if (/^\s*export\s*\{/m.test(source)) {
+        // ES模块: 去掉import并把export改为module.exports
+        source = source
+            .replace(/^\s*import\s+\{\s*rpc\s*\}\s+from\s+["']@web\/core\/network\/rpc["'];?\s*$/m, '')
+            .replace(/^\s*export\s*\{([\s\S]*?)\};?\s*$/m, 'module.exports = {$1};');
+        sandbox.rpc = makeRpcStub(formulas);
+        vm.runInNewContext(source, sandbox, { filename: file });
+        return { kind: 'module', exports: sandbox.module.exports };
+    }
+
+    let defined = null;
+    sandbox.odoo = {
+        define(name, deps, factory) {
+            const require = (dep) => {
+                if (!dep.startsWith('rich_production.')) {
+                    throw new Error(`harness: unknown dependency ${dep}`);
+                }
+                const depName = dep.slice('rich_production.'.length);
+                if (!(depName in loaded)) {
+                    loaded[depName] = loadCalculator(depName, formulas, loaded).exports;
+                }
+                return loaded[depName];
+            };
+            defined = factory(require);
+        },
+    };
+    vm.runInNewContext(source, sandbox, { filename: file });
+    if (typeof defined === 'function') {
+        return { kind: 'class', exports: defined };
+    }
+    return { kind: 'module', exports: defined || {} };
+}
+
+/**
+ * 返回统一的调用函数 (input) => Promise<result>
+ */
+function makeRunner(calculator) {
+    if (calculator.kind === 'class') {
+        const WindowClass = calculator.exports;
+        if (typeof WindowClass.prototype.calculateDimensions !== 'function') {
+            return null;
+        }
+        return async (input) => {
+            const instance = new WindowClass();
+            instance.units = 'inches';
+            return instance.calculateDimensions(
+                input.width, input.height, input.frame, /Tempered/.test(input.glass || ''),
+                input.glass, input.grid, input.fixedHeight
+            );
+        };
+    }
+    const calculate = calculator.exports.processWindowData;
+    if (typeof calculate !== 'function') {
+        return null;
+    }
+    return async (input) => calculate(JSON.parse(JSON.stringify(input)));
+}
+
+/**
+ * 默认输入矩阵，覆盖框架、玻璃、格子和固定高度的主要组合
+ */
+function defaultInputs() {
+    const sizes = [[36, 24], [48, 36], [71.5, 59.5]];
+    const frames = ['Nailon', 'Retrofit', 'Block', 'Block-slope'];
+    const glasses = ['Clear/Clear', 'Clear/Low-E270', 'OBS/Clear Tempered'];
+    const grids = [['', ''], ['Standard', '3w x 2h'], ['Marginal', ''], ['Perimeter', '']];
+    const inputs = [];
+    let id = 1;
+    sizes.forEach(([width, height], sizeIndex) => {
+        frames.forEach((frame, frameIndex) => {
+            const glass = glasses[(sizeIndex + frameIndex) % glasses.length];
+            const [grid, gridSize] = grids[(sizeIndex * 2 + frameIndex) % grids.length];
+            const fixedHeight = Math.round(height * 0.4 * 100) / 100;
+            inputs.push({
+                id: id++,
+                customer: 'GOLDEN',
+                style: '',
+                width,
+                height,
+                fh: fixedHeight,
+                fixedHeight,
+                frame,
+                glass,
+                glassType: glass,
+                grid,
+                grid_size: gridSize,
+                argon: 'Yes',
+                color: 'White',
+                quantity: 1,
+                isImperial: true,
+            });
+        });
+    });
+    // 格子专用用例: 每种格子类型配合不同格子尺寸，保证所有样式都有格子输出
+    const gridCases = [['Standard', '2w x 3h'], ['Marginal', '4w x 2h'], ['Perimeter', '2w x 2h'], ['Standard', '']];
+    gridCases.forEach(([grid, gridSize], index) => {
+        const [width, height] = sizes[(index % 2) + 1];
+        const frame = frames[index];
+        const glass = glasses[index % glasses.length];
+        const fixedHeight = Math.round(height * 0.4 * 100) / 100;
+        inputs.push({
+            id: id++,
+            customer: 'GOLDEN',
+            style: '',
+            width,
+            height,
+            fh: fixedHeight,
+            fixedHeight,
+            frame,
+            glass,
+            glassType: glass,
+            grid,
+            grid_size: gridSize,
+            argon: 'Yes',
+            color: 'White',
+            quantity: 1,
+            isImperial: true,
+        });
+    });
+    return inputs;
+}
+
+/**
+ * 从计算结果中提取参与比较的部分
+ */
+function pickOutputs(result, input) {
+    if (!result || typeof result !== 'object') {
+        return { result: result === undefined ? null : result };
+    }
+    const aliases = {
+        frame: ['frame', 'frameList'],
+        sash: ['sash', 'sashList'],
+        screen: ['screen', 'screenList'],
+        parts: ['parts', 'partsList'],
+        glass: ['glassList', 'glass'],
+        grid: ['gridList', 'grid'],
+    };
+    // rich_custom.* 和类式计算器返回带扁平尺寸的windowData，按字段前缀拆成输出部分
+    if (!Array.isArray(result.frame)) {
+        return pickFlatOutputs(result, input || {});
+    }
+    const picked = {};
+    for (const part of OUTPUT_PARTS) {
+        const key = aliases[part].find((name) => result[name] !== undefined);
+        if (key !== undefined) {
+            picked[part] = result[key];
+        }
+    }
+    return normalize(picked);
+}
+
+function pickFlatOutputs(result, input) {
+    const picked = {};
+    for (const [key, value] of Object.entries(result)) {
+        if (key in input || FLAT_ECHO_KEYS.test(key) || value === undefined) {
+            continue;
+        }
+        const section = FLAT_SECTIONS.find(([, pattern]) => pattern.test(key));
+        const part = section ? section[0] : 'parts';
+        picked[part] = picked[part] || {};
+        picked[part][key] = value;
+    }
+    return normalize(picked);
+}
+
+/**
+ * 判断输出中是否有格子结果(非空列表或非零/非"No Grid"的值)
+ */
+function hasGridOutput(output) {
+    const grid = output && output.grid;
+    if (Array.isArray(grid)) {
+        return grid.length > 0;
+    }
+    if (grid && typeof grid === 'object') {
+        return Object.values(grid).some((value) => (
+            Array.isArray(value) ? value.length > 0 : Boolean(value) && value !== 'No Grid'
+        ));
+    }
+    return Boolean(grid);
+}
+
+function normalize(value) {
+    return JSON.parse(JSON.stringify(value === undefined ? null : value));
+}
+
+function diff(expected, actual, where = '') {
+    if (typeof expected === 'number' && typeof actual === 'number') {
+        return Math.abs(expected - actual) <= TOLERANCE ? null : `${where}: ${expected} != ${actual}`;
+    }
+    if (Array.isArray(expected) || Array.isArray(actual)) {
+        if (!Array.isArray(expected) || !Array.isArray(actual) || expected.length !== actual.length) {
+            return `${where}: length/type mismatch`;
+        }
+        for (let i = 0; i < expected.length; i++) {
+            const found = diff(expected[i], actual[i], `${where}[${i}]`);
+            if (found) {
+                return found;
+            }
+        }
+        return null;
+    }
+    if (expected && actual && typeof expected === 'object' && typeof actual === 'object') {
+        const keys = new Set([...Object.keys(expected), ...Object.keys(actual)]);
+        for (const key of keys) {
+            const found = diff(expected[key], actual[key], where ? `${where}.${key}` : key);
+            if (found) {
+                return found;
+            }
+        }
+        return null;
+    }
+    return expected === actual ? null : `${where}: ${JSON.stringify(expected)} != ${JSON.stringify(actual)}`;
+}
+
+/**
+ * 计算器会大量输出日志，执行期间屏蔽console
+ */
+async function quietly(fn) {
+    const saved = {};
+    for (const name of ['log', 'info', 'warn', 'error', 'debug']) {
+        saved[name] = console[name];
+        console[name] = () => {};
+    }
+    try {
+        return await fn();
+    } finally {
+        Object.assign(console, saved);
+    }
+}
+
+async function runCases(run, inputs) {
+    const outputs = [];
+    for (const input of inputs) {
+        try {
+            outputs.push(pickOutputs(await run(input), input));
+        } catch (error) {
+            outputs.push({ error: String(error && error.message || error) });
+        }
+    }
+    return outputs;
+}
+
+async function benchmark(run, inputs, benchMs) {
+    let windows = 0;
+    const start = process.hrtime.bigint();
+    let elapsed = 0;
+    do {
+        for (const input of inputs) {
+            try {
+                await run(input);
+            } catch (error) {
+                // 错误已在正确性检查中报告
+            }
+        }
+        windows += inputs.length;
+        elapsed = Number(process.hrtime.bigint() - start) / 1e9;
+    } while (elapsed * 1000 < benchMs);
+    return windows / elapsed;
+}
+
+function runServer(command, moduleName, inputs) {
+    const proc = spawnSync(`${command} --style=${moduleName}`, {
+        shell: true,
+        input: JSON.stringify(inputs),
+        maxBuffer: 256 * 1024 * 1024,
+        cwd: MODULE_ROOT,
+    });
+    if (proc.status !== 0) {
+        return { error: (proc.stderr || '').toString().trim().split('\n').pop() || `exit ${proc.status}` };
+    }
+    try {
+        return JSON.parse(proc.stdout.toString());
+    } catch (error) {
+        return { error: `invalid engine output: ${error.message}` };
+    }
+}
+
+function compare(fixture, outputs) {
+    const failures = [];
+    fixture.cases.forEach((testCase, index) => {
+        const found = diff(testCase.expected, outputs[index]);
+        if (found) {
+            failures.push(`case ${testCase.input.id}: ${found}`);
+        }
+    });
+    return failures;
+}
+
+function listModules() {
+    return fs.readdirSync(CALCULATOR_DIR)
+        .filter((name) => name.endsWith('.js') && !NON_CALCULATOR_MODULES.includes(name))
+        .map((name) => name.slice(0, -3))
+        .sort();
+}
+
+function pad(value, width) {
+    return String(value).padEnd(width);
+}
+
+async function main() {
+    const args = parseArgs(process.argv.slice(2));
+    const formulas = loadFormulas();
+    const modules = args.style ? [args.style] : listModules();
+    fs.mkdirSync(FIXTURE_DIR, { recursive: true });
+
+    let failed = false;
+    const rows = [];
+    for (const moduleName of modules) {
+        const fixtureFile = path.join(FIXTURE_DIR, `${moduleName}.json`);
+        let fixture = null;
+        if (fs.existsSync(fixtureFile)) {
+            fixture = JSON.parse(fs.readFileSync(fixtureFile, 'utf8'));
+        }
+
+        let run = null;
+        try {
+            run = makeRunner(loadCalculator(moduleName, formulas));
+        } catch (error) {
+            rows.push([moduleName, 'load error', '-', '-', String(error.message)]);
+            failed = true;
+            continue;
+        }
+        if (!run) {
+            rows.push([moduleName, 'no entry point', '-', '-', '']);
+            continue;
+        }
+
+        const inputs = fixture ? fixture.cases.map((testCase) => testCase.input) : defaultInputs();
+        const outputs = await quietly(() => runCases(run, inputs));
+
+        if (args.update || !fixture) {
+            fixture = {
+                module: moduleName,
+                cases: inputs.map((input, index) => ({ input, expected: outputs[index] })),
+            };
+            fs.writeFileSync(fixtureFile, JSON.stringify(fixture, null, 1) + '\n');
+        }
+
+        const failures = compare(fixture, outputs);
+        if (!fixture.cases.some((testCase) => hasGridOutput(testCase.expected))) {
+            failures.push('no grid output in any case');
+        }
+        const rate = await quietly(() => benchmark(run, inputs, args.benchMs));
+        let serverColumn = '-';
+        if (args.server) {
+            const server = runServer(args.server, moduleName, inputs);
+            if (server.unsupported) {
+                serverColumn = 'n/a';
+            } else if (server.error) {
+                serverColumn = `error: ${server.error}`;
+                failed = true;
+            } else {
+                const serverFailures = compare(fixture, server.results.map((result, index) => pickOutputs(result, inputs[index])));
+                const serverRate = server.seconds ? Math.round(inputs.length / server.seconds) : '?';
+                serverColumn = serverFailures.length ? `FAIL ${serverFailures[0]}` : `ok ${serverRate}/s`;
+                failed = failed || serverFailures.length > 0;
+            }
+        }
+        failed = failed || failures.length > 0;
+        rows.push([
+            moduleName,
+            failures.length ? `FAIL (${failures.length}/${inputs.length})` : `ok (${inputs.length})`,
+            `${Math.round(rate)}/s`,
+            serverColumn,
+            failures[0] || '',
+        ]);
+    }
+
+    process.stdout.write(`${pad('style', 22)}${pad('js', 16)}${pad('js rate', 12)}${pad('server', 24)}detail\n`);
+    for (const row of rows) {
+        process.stdout.write(`${pad(row[0], 22)}${pad(row[1], 16)}${pad(row[2], 12)}${pad(row[3], 24)}${row[4]}\n`);
+    }
+    process.exitCode = failed ? 1 : 0;
+}
+
+main();
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSaveCalculation(TransactionCase):
+    """浏览器保存的计算结果只挂到预览订单自己的产品行上"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Result = cls.env['window.calculation.result']
+        product = cls.env['product.product'].create({'name': 'XO Window'})
+        cls.production_a = cls.env['rich_production.production'].create({'name': 'Batch A'})
+        cls.production_b = cls.env['rich_production.production'].create({'name': 'Batch B'})
+        cls.line_a = cls.env['rich_production.line'].create({
+            'production_id': cls.production_a.id, 'product_id': product.id, 'quantity': 2,
+        })
+        cls.line_b = cls.env['rich_production.line'].create({
+            'production_id': cls.production_b.id, 'product_id': product.id, 'quantity': 1,
+        })
+
+    def _calculation(self, style):
+        return {
+            'formattedWindowInfo': {'style': style, 'width': 36, 'height': 48},
+            'frameType': 'Nailon',
+        }
+
+    def test_save_does_not_touch_other_production(self):
+        result_b = self.Result.create({
+            'production_id': self.production_b.id,
+            'window_line_id': self.line_b.id,
+            'item_id': 1,
+            'style': 'XO',
+        })
+        # 预览的窗户序号与另一订单的产品行ID相同
+        saved = self.Result.save_calculation(self.line_a.id, self._calculation('OX'),
+                                             self.production_a.id, self.line_b.id)
+        self.assertTrue(saved.get('success'), saved)
+        saved_result = self.Result.browse(saved['id'])
+        self.assertEqual(saved_result.production_id, self.production_a)
+        self.assertEqual(saved_result.window_line_id, self.line_a)
+        self.assertEqual(result_b.style, 'XO')
+        self.assertEqual(self.Result.search([('production_id', '=', self.production_b.id)]), result_b)
+
+    def test_save_rejects_line_from_other_production(self):
+        saved = self.Result.save_calculation(self.line_b.id, self._calculation('OX'), self.production_a.id, 1)
+        self.assertIn('error', saved)
+        self.assertFalse(self.Result.search([('window_line_id', '=', self.line_b.id)]))
+
+    def test_items_of_one_line_are_saved_separately(self):
+        first = self.Result.save_calculation(self.line_a.id, self._calculation('XO'), self.production_a.id, 1)
+        second = self.Result.save_calculation(self.line_a.id, self._calculation('XO'), self.production_a.id, 2)
+        again = self.Result.save_calculation(self.line_a.id, self._calculation('OX'), self.production_a.id, 2)
+        self.assertNotEqual(first['id'], second['id'])
+        self.assertEqual(second['id'], again['id'])
+        self.assertEqual(self.Result.browse(again['id']).style, 'OX')